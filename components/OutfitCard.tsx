@@ -47,10 +47,10 @@ export default function OutfitCard({ outfit, currentUserId, isSaved: initialIsSa
     }
   }
   
-  // Combine main image with additional images
+  // Combine main image with additional images (resized variants have a width and are not gallery images)
   const allImages = [
     outfit.image_url,
-    ...(outfit.outfit_images?.sort((a, b) => a.display_order - b.display_order).map(img => img.image_url) || [])
+    ...(outfit.outfit_images?.filter(img => !img.width).sort((a, b) => a.display_order - b.display_order).map(img => img.image_url) || [])
   ]
   
   const nextImage = () => {
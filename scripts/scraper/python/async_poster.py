@@ -0,0 +1,411 @@
+"""
+Async posting engine for the Zalando scrapers
+Creates posts concurrently by talking to Supabase Storage and PostgREST over httpx
+"""
+
+import asyncio
+from typing import List, Dict, Optional, Tuple, Callable, Awaitable
+
+import httpx
+
+from post_rows import outfit_row, clothing_piece_rows, image_variant_rows
+from rate_limiter import HostRateLimiter, get_rate_limiter
+from dedup_index import DedupIndex
+from image_store import KnownImages, content_hash, content_path, public_url, sniff_image_type
+from image_transcode import Transcoder
+from bulk_writer import BulkWriter
+from http_cache import HttpCache, CachingTransport
+from http_transport import build_async_client
+from metrics import get_metrics
+from image_transfer import (RESUMABLE_BYTES, AsyncBufferPool, AsyncFileWindow, spool_response_async,
+                            upload_resumable_async)
+from run_journal import RunJournal
+from product_details import gallery_urls
+from image_hashes import NearDuplicateIndex, LINK
+from posting import PostBookkeeping
+from watermarks import Watermarks
+
+
+class AsyncPoster(PostBookkeeping):
+    def __init__(
+        self,
+        supabase_url: str,
+        supabase_key: str,
+        bot_user_id: str,
+        headers: Dict = None,
+        rate_limiter: HostRateLimiter = None,
+        dedup: DedupIndex = None,
+        transcoder: Transcoder = None,
+        writer: BulkWriter = None,
+        http_cache: HttpCache = None,
+        journal: RunJournal = None,
+        near_dups: NearDuplicateIndex = None,
+        watermarks: Watermarks = None,
+        concurrency: int = 8,
+        storage_concurrency: int = 4,
+        rest_concurrency: int = 8,
+        timeout: float = 30.0
+    ):
+        """
+        Args:
+            supabase_url: Project URL (NEXT_PUBLIC_SUPABASE_URL)
+            supabase_key: Service role key
+            bot_user_id: Profile id the posts are created for
+            headers: Extra headers for image downloads (User-Agent, ...)
+            rate_limiter: Per-host limiter (defaults to the process-wide one)
+            dedup: Index updated with every product successfully posted
+            transcoder: Process pool producing resized variants (None uploads originals)
+            writer: Batched writer; when set, rows are inserted per batch instead of per product
+            http_cache: On-disk cache for image downloads (None always downloads)
+            journal: Run journal; steps already checkpointed are skipped and outfits get its ids
+            near_dups: Perceptual-hash index; near-duplicates of posted images are skipped or linked
+            watermarks: Listing watermarks; products are marked seen once posted or skipped
+            concurrency: Workers taking products from the queue (maximum number of products in flight)
+            storage_concurrency: Maximum concurrent Storage uploads
+            rest_concurrency: Maximum concurrent PostgREST calls
+            timeout: Per-request timeout in seconds
+        """
+        self.supabase_url = supabase_url.rstrip('/')
+        self.bot_user_id = bot_user_id
+        self.download_headers = headers or {}
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.dedup = dedup
+        self.transcoder = transcoder
+        self.writer = writer
+        self.http_cache = http_cache
+        self.journal = journal
+        self.near_dups = near_dups
+        self.watermarks = watermarks
+        self.known_images = KnownImages(self.supabase_url)
+        self.metrics = get_metrics()
+        self.timeout = timeout
+        self.supabase_key = supabase_key
+        self.auth_headers = {
+            'apikey': supabase_key,
+            'Authorization': f"Bearer {supabase_key}"
+        }
+
+        self.concurrency = max(1, concurrency)
+        self.storage_slots = asyncio.Semaphore(max(1, storage_concurrency))
+        self.rest_slots = asyncio.Semaphore(max(1, rest_concurrency))
+
+        # Chunk buffers for streamed transfers: one per download or upload that can be in flight
+        self.buffers = AsyncBufferPool(self.concurrency + max(1, storage_concurrency))
+
+    async def store(self, client: httpx.AsyncClient, data: bytes, content_type: str, extension: str) -> str:
+        """Upload bytes under their content hash unless already stored, returns the public URL"""
+        path = content_path(content_hash(data), extension)
+        url = public_url(self.supabase_url, path)
+
+        if self.known_images.get(path):
+            self.metrics.count('images_reused', source='local')
+            return url
+
+        async with self.storage_slots:
+            existing = await self.rate_limiter.request_async(client, 'HEAD', url)
+            if existing.status_code != 200:
+                with self.metrics.timer('storage_upload'):
+                    upload = await self.rate_limiter.request_async(
+                        client,
+                        'POST',
+                        f"{self.supabase_url}/storage/v1/object/outfits/{path}",
+                        content=data,
+                        headers={**self.auth_headers, 'content-type': content_type},
+                        # Content-addressed: a replay that reaches an existing object gets 409, handled below
+                        idempotent=True
+                    )
+                # 409 / "Duplicate": stored concurrently by another product or run
+                if upload.status_code != 409 and 'Duplicate' not in upload.text:
+                    upload.raise_for_status()
+            else:
+                self.metrics.count('images_reused', source='storage')
+
+        self.known_images.add(path, url)
+        return url
+
+    async def transfer(self, client: httpx.AsyncClient, image_url: str) -> str:
+        """Stream an image from the CDN into Storage without holding it in memory (see ImageStore.transfer)"""
+        known = self.known_images.source(image_url)
+        if known:
+            self.metrics.count('images_reused', source='source_url')
+            return known
+
+        with self.metrics.timer('image_download'):
+            # Not cached: CachingTransport would read the whole body to store it
+            response = await self.rate_limiter.request_async(client, 'GET', image_url, stream=True,
+                                                             headers=self.download_headers, extensions={'cache': False})
+            if response.is_error:
+                await response.aclose()
+                response.raise_for_status()
+            image = await spool_response_async(response, self.buffers)
+
+        try:
+            path = content_path(image.digest, image.extension)
+            url = public_url(self.supabase_url, path)
+            if self.known_images.get(path):
+                self.metrics.count('images_reused', source='local')
+            else:
+                await self.upload_file(client, path, image)
+                self.known_images.add(path, url)
+        finally:
+            image.discard()
+
+        self.known_images.add_source(image_url, path)
+        return url
+
+    async def upload_file(self, client: httpx.AsyncClient, path: str, image):
+        """Upload a spooled image unless already in the bucket, resumably if it is large"""
+        async with self.storage_slots:
+            existing = await self.rate_limiter.request_async(client, 'HEAD', public_url(self.supabase_url, path))
+            if existing.status_code == 200:
+                self.metrics.count('images_reused', source='storage')
+                return
+
+            with self.metrics.timer('storage_upload'):
+                if image.size >= RESUMABLE_BYTES:
+                    await upload_resumable_async(client, self.rate_limiter, self.supabase_url, self.supabase_key,
+                                                 'outfits', path, image, self.buffers)
+                    return
+                upload = await self.rate_limiter.request_async(
+                    client,
+                    'POST',
+                    f"{self.supabase_url}/storage/v1/object/outfits/{path}",
+                    content=AsyncFileWindow(image.path, 0, image.size, self.buffers),
+                    headers={**self.auth_headers, 'content-type': image.content_type,
+                             'content-length': str(image.size)},
+                    idempotent=True
+                )
+            if upload.status_code != 409 and 'Duplicate' not in upload.text:
+                upload.raise_for_status()
+
+    async def download(self, client: httpx.AsyncClient, image_url: str) -> bytes:
+        with self.metrics.timer('image_download'):
+            response = await self.rate_limiter.request_async(client, 'GET', image_url, headers=self.download_headers)
+            response.raise_for_status()
+        return response.content
+
+    async def upload_image(self, client: httpx.AsyncClient, image_url: str, transcode: bool = True,
+                           data: bytes = None) -> List[Dict]:
+        """Download an image (unless `data` is given) and upload it, or with `transcode` its variants, largest first"""
+        try:
+            if data is None and (not self.transcoder or not transcode):
+                with self.metrics.timer('image_transfer'):
+                    return [{'width': None, 'image_url': await self.transfer(client, image_url)}]
+
+            if data is None:
+                data = await self.download(client, image_url)
+
+            if not self.transcoder or not transcode:
+                content_type, extension = sniff_image_type(data)
+                return [{'width': None, 'image_url': await self.store(client, data, content_type, extension)}]
+
+            with self.metrics.timer('transcode'):
+                variants = await self.transcoder.transcode_async(data)
+            urls = await asyncio.gather(*(
+                self.store(client, variant['data'], variant['content_type'], variant['extension'])
+                for variant in variants
+            ))
+            return [{'width': variant['width'], 'image_url': url} for variant, url in zip(variants, urls)]
+
+        except Exception as e:
+            print(f"      ❌ Error uploading image: {e}")
+            return []
+
+    async def insert(self, client: httpx.AsyncClient, table: str, rows, upsert: bool = False) -> List[Dict]:
+        """Insert rows through PostgREST and return the created records (`upsert` skips ids already present)"""
+        prefer = 'return=representation,resolution=ignore-duplicates' if upsert else 'return=representation'
+        async with self.rest_slots:
+            with self.metrics.timer('db_insert', table=table):
+                response = await self.rate_limiter.request_async(
+                    client,
+                    'POST',
+                    f"{self.supabase_url}/rest/v1/{table}" + ('?on_conflict=id' if upsert else ''),
+                    json=rows,
+                    headers={**self.auth_headers, 'Prefer': prefer},
+                    # Only an upsert of explicit ids can be replayed without inserting twice
+                    idempotent=upsert
+                )
+        response.raise_for_status()
+        return response.json()
+
+    async def prepare(self, client: httpx.AsyncClient, product: Dict) -> Tuple[Optional[str], List[Dict]]:
+        """
+        (outfit id if already posted in this run, uploaded variants), skipping checkpointed steps
+
+        A near-duplicate of a posted image returns that post's outfit id after
+        skipping or linking the product (see image_hashes.py).
+        """
+        posted, variants = self.resume(product)
+        if posted or variants:
+            return posted, variants
+
+        data = None
+        if self.near_dups:
+            try:
+                data = await self.download(client, product['image_url'])
+                with self.metrics.timer('image_hash'):
+                    image_hash = await asyncio.to_thread(self.near_dups.hash, data)
+            except Exception as e:
+                print(f"      ❌ Error hashing image: {e}")
+                return None, []
+
+            match = self.match_near_duplicate(product, image_hash)
+            if match:
+                return await self.near_duplicate(client, product, *match), []
+
+        variants = await self.upload_image(client, product['image_url'], data=data)
+        if variants:
+            # Other gallery images of an enriched product, as originals
+            gallery = await asyncio.gather(*(
+                self.upload_image(client, image_url, transcode=False) for image_url in gallery_urls(product)
+            ))
+            variants += [{**uploaded[0], 'display_order': order}
+                         for order, uploaded in enumerate(gallery, 1) if uploaded]
+        self.image_uploaded(product, variants)
+        return None, variants
+
+    async def near_duplicate(self, client: httpx.AsyncClient, product: Dict, key: str, outfit_id: Optional[str],
+                             distance: int) -> Optional[str]:
+        """Skip a near-duplicate product or add its clothing pieces to the existing post (None while that is in flight)"""
+        action = self.near_duplicate_action(key, outfit_id, distance)
+        if not action:
+            return None
+
+        if action == LINK:
+            try:
+                await self.insert(client, 'clothing_pieces', clothing_piece_rows(product, outfit_id), upsert=True)
+            except Exception as e:
+                print(f"      ❌ Error linking near-duplicate: {e}")
+                self.failed(product, e)
+                return None
+
+        return self.near_duplicate_done(product, key, outfit_id, distance)
+
+    async def create_post(self, client: httpx.AsyncClient, product: Dict) -> Optional[str]:
+        """Create a post from product data"""
+        try:
+            posted, variants = await self.prepare(client, product)
+            if posted or not variants:
+                return posted
+
+            outfit_id = self.journal.outfit_id(product) if self.journal else None
+            outfits = await self.insert(client, 'outfits',
+                                        outfit_row(product, self.bot_user_id, variants[0]['image_url'], outfit_id),
+                                        upsert=bool(outfit_id))
+            if not outfits and not outfit_id:
+                return None
+
+            outfit_id = outfit_id or outfits[0]['id']
+            await self.insert(client, 'clothing_pieces', clothing_piece_rows(product, outfit_id), upsert=True)
+
+            variant_rows = image_variant_rows(outfit_id, variants[1:])
+            if variant_rows:
+                await self.insert(client, 'outfit_images', variant_rows, upsert=True)
+
+            self.posted(product, outfit_id)
+            print(f"   ✅ Post created: {outfit_id} ({product['brand']} - {product['name']})")
+            return outfit_id
+
+        except Exception as e:
+            print(f"   ❌ Error creating post: {e}")
+            self.failed(product, e)
+            return None
+
+    async def run_workers(self, products: List[Dict], handle: Callable[[Dict], Awaitable]) -> List:
+        """
+        await handle(product) for every product on `concurrency` workers, results in product order
+
+        The workers take products from one shared queue, so only `concurrency`
+        coroutines exist at a time however many products there are.
+        """
+        queue = iter(enumerate(products))
+        results = [None] * len(products)
+
+        async def worker():
+            for index, product in queue:
+                results[index] = await handle(product)
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(products)))))
+        return results
+
+    async def create_posts_batched(self, client: httpx.AsyncClient, products: List[Dict]) -> List[Optional[str]]:
+        """Upload images concurrently and hand full batches to the BulkWriter"""
+        pending = []
+        flushes = []
+        done = []
+
+        async def upload(product: Dict):
+            posted, variants = await self.prepare(client, product)
+
+            if posted or not variants:
+                done.append(posted)
+                return
+
+            pending.append((product, variants))
+            if len(pending) >= self.writer.batch_size:
+                batch = pending[:]
+                pending.clear()
+                # The writer is synchronous: run each batch in a worker thread
+                flushes.append(asyncio.ensure_future(asyncio.to_thread(self.writer.write, batch)))
+
+        await self.run_workers(products, upload)
+        if pending:
+            flushes.append(asyncio.ensure_future(asyncio.to_thread(self.writer.write, pending)))
+
+        batches = await asyncio.gather(*flushes)
+        return [outfit_id for batch in batches for outfit_id in batch] + done
+
+    async def create_posts(self, products: List[Dict]) -> Tuple[int, int]:
+        """Create all posts, `concurrency` at a time, returns (success, errors)"""
+        # With a cache, image GETs are served or revalidated locally before reaching the metered pools
+        wrap = (lambda transport: CachingTransport(self.http_cache, transport=transport)) if self.http_cache else None
+        async with build_async_client(self.timeout, wrap) as client:
+            if self.writer:
+                results = await self.create_posts_batched(client, products)
+            else:
+                results = await self.run_workers(products, lambda product: self.create_post(client, product))
+
+        success = sum(1 for result in results if result)
+        return success, len(results) - success
+
+
+def run_async_posts(
+    supabase_url: str,
+    supabase_key: str,
+    bot_user_id: str,
+    products: List[Dict],
+    headers: Dict = None,
+    rate_limiter: HostRateLimiter = None,
+    dedup: DedupIndex = None,
+    transcoder: Transcoder = None,
+    writer: BulkWriter = None,
+    http_cache: HttpCache = None,
+    journal: RunJournal = None,
+    near_dups: NearDuplicateIndex = None,
+    watermarks: Watermarks = None,
+    concurrency: int = 8,
+    storage_concurrency: int = 4,
+    rest_concurrency: int = 8
+) -> Tuple[int, int]:
+    """Synchronous entry point used by the scrapers' create_posts"""
+    async def _run():
+        poster = AsyncPoster(
+            supabase_url,
+            supabase_key,
+            bot_user_id,
+            headers=headers,
+            rate_limiter=rate_limiter,
+            dedup=dedup,
+            transcoder=transcoder,
+            writer=writer,
+            http_cache=http_cache,
+            journal=journal,
+            near_dups=near_dups,
+            watermarks=watermarks,
+            concurrency=concurrency,
+            storage_concurrency=storage_concurrency,
+            rest_concurrency=rest_concurrency
+        )
+        return await poster.create_posts(products)
+
+    return asyncio.run(_run())
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Catalog snapshot benchmark
+Writes synthetic snapshots of increasing size (a base run, then runs where
+some prices drop, some products come back in stock and some are new), and
+times writing them, their size on disk and the diff of the newest one
+
+    python benchmarks/bench_catalog.py --rows 10000 100000 300000
+    python benchmarks/bench_catalog.py --json
+"""
+
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from catalog_snapshots import NEW_ITEM, PRICE_DROP, RESTOCK, SnapshotWriter, diff_latest
+
+BATCH = 84
+
+
+def product(i: int, price: float, sizes) -> Dict:
+    return {
+        'product_url': f"https://www.zalando.fr/marque-article-{i}-ab{i:07d}-a{i % 100:02d}.html",
+        'brand': f"Marque {i % 300}",
+        'name': f"Article {i}",
+        'price': f"{price:.2f} €".replace('.', ','),
+        'sizes': sizes,
+    }
+
+
+def write_runs(directory: Path, rows: int, runs: int, seed: int) -> Dict:
+    """`runs` snapshots of `rows` products each; each run drops 5% of prices, restocks 1%, adds 2%"""
+    rng = random.Random(seed)
+    prices = {i: round(rng.uniform(10, 200), 2) for i in range(rows)}
+    sold_out = set(rng.sample(range(rows), rows // 50))
+    first = 0
+    write_seconds = 0.0
+
+    for run in range(runs):
+        if run:
+            for i in rng.sample(range(first, first + rows), rows // 20):
+                prices[i] = round(prices[i] * rng.uniform(0.5, 0.95), 2)
+            sold_out -= set(rng.sample(sorted(sold_out), min(len(sold_out), rows // 100)))
+            first += rows // 50
+            for i in range(first + rows - rows // 50, first + rows):
+                prices[i] = round(rng.uniform(10, 200), 2)
+
+        writer = SnapshotWriter(f"bench{run:03d}", directory)
+        start = time.perf_counter()
+        ids = list(range(first, first + rows))
+        for offset in range(0, rows, BATCH):
+            writer.record([product(i, prices[i], [] if i in sold_out else ['S', 'M', 'L'])
+                           for i in ids[offset:offset + BATCH]], 'mode-femme')
+        writer.file.close()
+        write_seconds += time.perf_counter() - start
+        # Writers name files after the second they start in
+        time.sleep(1.01)
+
+    return {'write_rows_per_second': int(rows * runs / write_seconds),
+            'mb_per_snapshot': round(writer.path.stat().st_size / 1024 / 1024, 2)}
+
+
+def bench(rows: int, runs: int) -> Dict:
+    directory = Path(tempfile.mkdtemp())
+    written = write_runs(directory, rows, runs, seed=rows)
+
+    start = time.perf_counter()
+    result = diff_latest(directory)
+    elapsed = time.perf_counter() - start
+
+    changes = result['changes']
+    return {
+        'rows': rows,
+        'snapshots': runs,
+        **written,
+        'diff_seconds': round(elapsed, 2),
+        'price_drops': sum(change.kind == PRICE_DROP for change in changes),
+        'restocks': sum(change.kind == RESTOCK for change in changes),
+        'new_items': sum(change.kind == NEW_ITEM for change in changes),
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark catalog snapshot writes and diffs')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 300000], help='Products per snapshot')
+    parser.add_argument('--runs', type=int, default=3, help='Snapshots written (the newest is diffed against the others)')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON lines')
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        result = bench(rows, args.runs)
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print(f"🗂️  {rows} rows x{args.runs}: diff in {result['diff_seconds']}s "
+                  f"({result['price_drops']} drops, {result['restocks']} restocks, {result['new_items']} new), "
+                  f"{result['mb_per_snapshot']} MB per snapshot, {result['write_rows_per_second']} rows/s written")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Offline end-to-end benchmark
+Runs the requests and Selenium scrapers against a local stand-in for Zalando
+and Supabase (see supabase_standin.py): listing extraction, image upload and
+post creation at several batch sizes, without any network access.
+
+Each configuration runs in its own process so peak RSS is per configuration.
+Results are JSON lines; pass a previous run with --compare to spot regressions.
+
+    python benchmarks/bench_e2e.py --limit 100 --batch-sizes 1 10 50
+    python benchmarks/bench_e2e.py --json > results.jsonl
+    python benchmarks/bench_e2e.py --compare results.jsonl
+"""
+
+import contextlib
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+from supabase_standin import Fixtures, StandIn, make_fixtures
+
+DEFAULT_FIXTURES = BENCH_DIR / 'fixtures'
+SCRAPERS = ['requests', 'selenium']
+
+# Shape-valid service key for the stand-in (never sent anywhere else)
+FAKE_KEY = 'eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.standin'
+
+
+class StageTimer:
+    """Collects per-call latencies by wrapping callables"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+
+    def wrap(self, stage, fn):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.samples[stage if isinstance(stage, str) else stage(*args, **kwargs)].append(
+                    time.perf_counter() - start)
+        return timed
+
+    def summary(self) -> Dict[str, Dict]:
+        def percentile(values, q):
+            return sorted(values)[min(len(values) - 1, int(q * len(values)))]
+
+        return {stage: {
+            'count': len(values),
+            'p50_ms': round(statistics.median(values) * 1000, 3),
+            'p95_ms': round(percentile(values, 0.95) * 1000, 3),
+        } for stage, values in sorted(self.samples.items())}
+
+
+class ReplayDriver:
+    """Just enough of a WebDriver to replay fixture pages through load_listing()"""
+
+    REVEAL = 24
+    MARKERS = {
+        'article[data-testid="product-card"]': b'data-testid="product-card"',
+        '.cat_articleCard': b'cat_articleCard',
+        'article': b'<article',
+    }
+
+    def __init__(self, session):
+        self.session = session
+        self.page_source = ''
+        self.html = b''
+        self.visible = 0
+
+    def get(self, url: str):
+        self.html = self.session.get(url, timeout=30).content
+        self.page_source = self.html.decode('utf-8')
+        self.visible = self.REVEAL
+
+    def find_elements(self, by, selector: str) -> list:
+        return [object()] * min(self.visible, self.html.count(self.MARKERS.get(selector, b'\0')))
+
+    def find_element(self, by, selector: str):
+        from selenium.common.exceptions import NoSuchElementException
+
+        elements = self.find_elements(by, selector)
+        if not elements:
+            raise NoSuchElementException(selector)
+        return elements[0]
+
+    def execute_script(self, script: str, *args):
+        # Every scroll lazy-loads the next cards
+        self.visible += self.REVEAL
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_one(scraper_name: str, batch_size: int, standin_url: str, limit: int, pages: int, cards: int) -> Dict:
+    """One configuration, in this process (called in a child by main)"""
+    os.environ['NEXT_PUBLIC_SUPABASE_URL'] = standin_url
+    os.environ['SUPABASE_SERVICE_ROLE_KEY'] = FAKE_KEY
+
+    import bulk_writer
+    from image_store import KnownImages
+
+    timer = StageTimer()
+    workdir = Path(tempfile.mkdtemp(prefix='bench-e2e-'))
+
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        if scraper_name == 'requests':
+            import zalando_scraper as module
+            scraper = module.ZalandoScraper(dedup=False, cache_size_mb=0)
+        else:
+            import zalando_selenium as module
+            scraper = module.ZalandoSeleniumScraper(dedup=False, cache_size_mb=0)
+
+        # Everything goes to the stand-in, unthrottled: the benchmark measures the code, not the politeness
+        scraper.base_url = f"{standin_url}/zalando"
+        scraper.rate_limiter.rates['127.0.0.1'] = (1e6, 1000000)
+        scraper.image_store.known = KnownImages(standin_url, workdir / 'images.sqlite')
+        scraper.init_bot_user()
+
+        module.parse_listing = timer.wrap('parse', module.parse_listing)
+        scraper.session.request = timer.wrap(
+            lambda method, url, *a, **kw: 'fetch_listing' if '/zalando/' in url else 'fetch_image',
+            scraper.session.request
+        )
+        scraper.upload_image_variants = timer.wrap('upload_image', scraper.upload_image_variants)
+        scraper.create_post = timer.wrap('create_post', scraper.create_post)
+        write_batch = bulk_writer.BulkWriter._write_batch
+        bulk_writer.BulkWriter._write_batch = timer.wrap('write_batch', write_batch)
+
+        start = time.perf_counter()
+        if scraper_name == 'requests':
+            products = scraper.scrape_category('mode-femme', {}, limit)
+        else:
+            driver = ReplayDriver(scraper.session)
+            scrape_page = timer.wrap('listing_page', scraper.scrape_page)
+            products = []
+            for page in range(1, pages + 1):
+                products.extend(scrape_page(driver, scraper.build_category_url('mode-femme', {}, page), cards))
+            products = scraper._select_products(products, limit)
+        extract_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        scraper.create_posts(products, batch_size=batch_size)
+        post_seconds = time.perf_counter() - start
+
+    return {
+        'scraper': scraper_name,
+        'batch_size': batch_size,
+        'products': len(products),
+        'extract_seconds': round(extract_seconds, 3),
+        'extract_products_per_second': round(len(products) / extract_seconds, 1) if extract_seconds else None,
+        'post_seconds': round(post_seconds, 3),
+        'post_products_per_second': round(len(products) / post_seconds, 1) if post_seconds else None,
+        'stages': timer.summary(),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def compare(results: List[Dict], baseline_path: Path):
+    baseline = {}
+    for line in baseline_path.read_text().splitlines():
+        if line.strip():
+            record = json.loads(line)
+            baseline[(record['scraper'], record['batch_size'])] = record
+
+    print("\n📈 Compared with", baseline_path)
+    for result in results:
+        before = baseline.get((result['scraper'], result['batch_size']))
+        if not before:
+            continue
+        for metric in ('extract_products_per_second', 'post_products_per_second', 'peak_rss_mb'):
+            if before.get(metric) and result.get(metric):
+                change = (result[metric] - before[metric]) / before[metric] * 100
+                print(f"   {result['scraper']:>8} batch {result['batch_size']:>3} {metric}: "
+                      f"{before[metric]} -> {result[metric]} ({change:+.1f}%)")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Offline end-to-end benchmark of the Zalando scrapers')
+    parser.add_argument('--fixtures', type=Path, default=DEFAULT_FIXTURES,
+                        help='Fixtures directory (pages/ and images/), generated if missing')
+    parser.add_argument('--pages', type=int, default=3, help='Listing pages in generated fixtures')
+    parser.add_argument('--cards', type=int, default=48, help='Products per generated page')
+    parser.add_argument('--limit', type=int, default=100, help='Products extracted and posted per run')
+    parser.add_argument('--scrapers', nargs='+', choices=SCRAPERS, default=SCRAPERS, help='Scrapers to run')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 10, 50], help='Insert batch sizes to test')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Simulated round trip of the stand-in')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON lines')
+    parser.add_argument('--output', type=Path, help='Also write the JSON lines to this file')
+    parser.add_argument('--compare', type=Path, help='Previous JSON lines to compare with')
+    parser.add_argument('--run-one', nargs=2, metavar=('SCRAPER', 'BATCH_SIZE'), help=argparse.SUPPRESS)
+    parser.add_argument('--standin', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        scraper_name, batch_size = args.run_one
+        print(json.dumps(run_one(scraper_name, int(batch_size), args.standin, args.limit, args.pages, args.cards)))
+        return
+
+    if not (args.fixtures / 'pages').exists():
+        print(f"🧪 Generating fixtures in {args.fixtures}")
+        make_fixtures(args.fixtures, args.pages, args.cards)
+
+    fixtures = Fixtures(args.fixtures)
+    standin = StandIn(fixtures, latency=args.latency_ms / 1000).start()
+    pages = len(fixtures.pages)
+    cards = max(page.count(b'data-testid="product-card"') for page in fixtures.pages) or args.cards
+
+    results = []
+    try:
+        for scraper_name in args.scrapers:
+            for batch_size in args.batch_sizes:
+                child = subprocess.run(
+                    [sys.executable, __file__, '--run-one', scraper_name, str(batch_size), '--standin', standin.url,
+                     '--limit', str(args.limit), '--pages', str(pages), '--cards', str(cards)],
+                    capture_output=True, text=True
+                )
+                if child.returncode != 0:
+                    print(f"❌ {scraper_name} batch {batch_size} failed:\n{child.stderr}")
+                    continue
+
+                result = json.loads(child.stdout.strip().splitlines()[-1])
+                results.append(result)
+                if args.json:
+                    print(json.dumps(result))
+                else:
+                    stages = ', '.join(f"{stage} p50 {values['p50_ms']} / p95 {values['p95_ms']} ms"
+                                       for stage, values in result['stages'].items())
+                    print(f"⚙️  {scraper_name} batch {batch_size}: {result['products']} products, "
+                          f"extract {result['extract_products_per_second']}/s, "
+                          f"post {result['post_products_per_second']}/s, "
+                          f"peak RSS {result['peak_rss_mb']} MB\n   {stages}")
+    finally:
+        standin.stop()
+
+    if args.output:
+        args.output.write_text(''.join(json.dumps(result) + '\n' for result in results))
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate index benchmark
+Measures perceptual hashing per image and lookup latency against indexes of
+increasing size, plus how far a re-encoded, resized copy of an image lands
+from the original
+
+    python benchmarks/bench_hashes.py --sizes 10000 100000 500000
+    python benchmarks/bench_hashes.py --json
+"""
+
+import io
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from image_hashes import HASHES, NearDuplicateIndex, hamming_distances
+
+
+def packshots(count: int, width: int = 762, height: int = 1100):
+    """Packshot-like JPEGs: random coloured shapes on a white background"""
+    rng = np.random.default_rng(count)
+    images = []
+    for _ in range(count):
+        image = Image.new('RGB', (width, height), 'white')
+        draw = ImageDraw.Draw(image)
+        for _ in range(6):
+            x, y = rng.integers(0, width), rng.integers(0, height)
+            w, h = rng.integers(80, width // 2), rng.integers(80, height // 2)
+            colour = tuple(int(c) for c in rng.integers(0, 230, size=3))
+            (draw.ellipse if rng.random() < 0.5 else draw.rectangle)([x - w, y - h, x + w, y + h], fill=colour)
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=90)
+        images.append(buffer.getvalue())
+    return images
+
+
+def variant(data: bytes) -> bytes:
+    """The same picture as another merchant would serve it: smaller, recompressed"""
+    image = Image.open(io.BytesIO(data))
+    buffer = io.BytesIO()
+    image.resize((image.width * 2 // 3, image.height * 2 // 3)).save(buffer, 'JPEG', quality=70)
+    return buffer.getvalue()
+
+
+def bench_hash(kind: str, count: int) -> Dict:
+    images = packshots(count)
+    hash_image = HASHES[kind]
+
+    start = time.perf_counter()
+    hashes = [hash_image(data) for data in images]
+    elapsed = time.perf_counter() - start
+
+    same = [bin(h ^ hash_image(variant(data))).count('1') for h, data in zip(hashes, images)]
+    other = [bin(a ^ b).count('1') for i, a in enumerate(hashes) for b in hashes[i + 1:]]
+    return {
+        'hash': kind,
+        'images': count,
+        'ms_per_image': round(elapsed / count * 1000, 2),
+        'variant_distance_max': max(same),
+        'other_distance_min': min(other),
+    }
+
+
+def bench_lookup(size: int, lookups: int) -> Dict:
+    rng = np.random.default_rng(size)
+    hashes = rng.integers(0, np.iinfo(np.uint64).max, size=size, dtype=np.uint64, endpoint=True)
+    queries = [int(value) for value in rng.integers(0, np.iinfo(np.uint64).max, size=lookups, dtype=np.uint64)]
+
+    start = time.perf_counter()
+    for query in queries:
+        int(np.argmin(hamming_distances(hashes, query)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        'hashes': size,
+        'lookups': lookups,
+        'ms_per_lookup': round(elapsed / lookups * 1000, 3),
+        'index_mb': round(hashes.nbytes / 1024 / 1024, 1),
+    }
+
+
+def bench_index(size: int) -> Dict:
+    """Load time of an index with `size` hashes from its .npy snapshot"""
+    with tempfile.TemporaryDirectory() as directory:
+        index = NearDuplicateIndex(directory=Path(directory))
+        rng = np.random.default_rng(0)
+        for i, value in enumerate(rng.integers(0, 1 << 63, size=size)):
+            index.add(int(value), {'product_url': f"https://www.zalando.fr/article-{i}.html"})
+        index.close()
+
+        start = time.perf_counter()
+        loaded = NearDuplicateIndex(directory=Path(directory))
+        elapsed = time.perf_counter() - start
+        loaded.close()
+
+    return {'hashes': loaded.size, 'load_seconds': round(elapsed, 3)}
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark perceptual hashing and near-duplicate lookups')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 500000], help='Index sizes to search')
+    parser.add_argument('--lookups', type=int, default=200, help='Lookups per index size')
+    parser.add_argument('--images', type=int, default=24, help='Synthetic images hashed per hash function')
+    parser.add_argument('--load', type=int, default=5000, help='Hashes written then reloaded from disk (0 skips)')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON lines')
+    args = parser.parse_args()
+
+    results = [bench_hash(kind, args.images) for kind in HASHES]
+    results += [bench_lookup(size, args.lookups) for size in args.sizes]
+    if args.load:
+        results.append(bench_index(args.load))
+
+    for result in results:
+        if args.json:
+            print(json.dumps(result))
+        elif 'hash' in result:
+            print(f"🪞 {result['hash']}: {result['ms_per_image']} ms/image, resized copy ≤ "
+                  f"{result['variant_distance_max']} bits, other images ≥ {result['other_distance_min']} bits")
+        elif 'lookups' in result:
+            print(f"🔎 {result['hashes']} hashes ({result['index_mb']} MB): {result['ms_per_lookup']} ms/lookup")
+        else:
+            print(f"💾 {result['hashes']} hashes loaded in {result['load_seconds']} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Listing parser benchmark
+Measures parse time and peak memory per page for the embedded-JSON path and
+the BeautifulSoup product-card path. The synthetic product pages are parsed
+first and checked against what they hold (sizes and price of the page's own
+product, not of its "similar items").
+
+    python benchmarks/bench_parse.py --cards 84 --repeat 20
+    python benchmarks/bench_parse.py --pages ~/zalando-pages --json
+"""
+
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from listing_parser import extract_cards, extract_embedded
+
+PATHS = {
+    'json': extract_embedded,
+    'dom': extract_cards,
+}
+
+
+def synthetic_page(cards: int, start: int = 0) -> bytes:
+    """Listing page with both an ld+json ItemList and the matching product cards (products start..start+cards)"""
+    items = []
+    markup = []
+    for i in range(start, start + cards):
+        url = f"/marque-article-{i}-{'ab' * 4}{i:04d}.html"
+        image = f"https://img01.ztat.net/article/spp-media-p1/{i:032x}/packshot.jpg?imwidth=300"
+        items.append({
+            '@type': 'ListItem',
+            'position': i + 1,
+            'item': {
+                '@type': 'Product',
+                'name': f"T-shirt imprimé {i}",
+                'brand': {'@type': 'Brand', 'name': 'Marque'},
+                'sku': f"MA{i:07d}",
+                'url': url,
+                'image': image,
+                'offers': {'@type': 'Offer', 'price': f"{19 + i % 30}.99", 'priceCurrency': 'EUR'},
+            },
+        })
+        markup.append(
+            f'<article data-testid="product-card" class="_0xLoFW _78xIQ-">'
+            f'<div class="_5qdMrS"><a href="{url}" class="_LM JT3_zV"><img src="{image}" alt=""/></a></div>'
+            f'<header><h2 class="cat_brandName">Marque</h2><h3 class="cat_articleName">T-shirt imprimé {i}</h3></header>'
+            f'<section><p class="cat_price"><span data-testid="price">{19 + i % 30},99 €</span></p></section>'
+            + '<div class="filler">' + '<span class="x"></span>' * 40 + '</div>'
+            '</article>'
+        )
+
+    ld_json = json.dumps({'@context': 'https://schema.org', '@type': 'ItemList', 'itemListElement': items})
+    page = (
+        '<!DOCTYPE html><html><head><title>Mode femme</title>'
+        '<script type="application/ld+json">' + ld_json + '</script>'
+        + '<script>var tracking = {};</script>' * 20 +
+        '</head><body><div id="app">' + ''.join(markup) + '</div></body></html>'
+    )
+    return page.encode('utf-8')
+
+
+SIZES = ['XS', 'S', 'M', 'L', 'XL']
+
+
+def synthetic_sizes(i: int) -> List[str]:
+    """Sizes in stock of synthetic product `i`: every seventh product is sold out, the others miss one size"""
+    return [] if i % 7 == 6 else [size for n, size in enumerate(SIZES) if n != i % 5]
+
+
+def synthetic_product_page(i: int, images: int = 4) -> bytes:
+    """
+    Product page of synthetic product `i`: ld+json Product with per-size
+    offers, gallery and breadcrumb, then "similar items" with sizes and prices
+    of their own (which must not be read as the product's)
+    """
+    ld_json = json.dumps({
+        '@context': 'https://schema.org',
+        '@type': 'Product',
+        'name': f"T-shirt imprimé {i}",
+        'brand': {'@type': 'Brand', 'name': 'Marque'},
+        'sku': f"MA{i:07d}",
+        'image': [f"https://img01.ztat.net/article/spp-media-p1/{i:032x}/packshot.jpg?imwidth=1800"] + [
+            f"https://img01.ztat.net/article/spp-media-p1/{i:028x}{n:04x}/photo.jpg?imwidth=1800" for n in range(1, images)
+        ],
+        'offers': [{
+            '@type': 'Offer',
+            'size': size,
+            'price': f"{19 + i % 30}.99",
+            'priceCurrency': 'EUR',
+            'availability': 'https://schema.org/' + ('InStock' if size in synthetic_sizes(i) else 'OutOfStock'),
+        } for size in SIZES],
+    })
+    breadcrumb = json.dumps({
+        '@context': 'https://schema.org',
+        '@type': 'BreadcrumbList',
+        'itemListElement': [{'@type': 'ListItem', 'position': n + 1, 'name': name}
+                            for n, name in enumerate(['Femme', 'Vêtements', 'T-shirts', f"T-shirt imprimé {i}"])],
+    })
+    similar = json.dumps({'recommendations': [{
+        'sku': f"SI{i:05d}{n:02d}",
+        'name': f"Article similaire {n}",
+        'brand_name': 'Autre',
+        'media': [{'path': f"spp-media-p1/{n:032x}/packshot.jpg"}],
+        'price': {'amount': '89.99', 'currency': 'EUR'},
+        'priceCurrency': 'EUR',
+        'sizes': [{'size': size, 'stock': 10} for size in ('XXL', '3XL', '38')],
+    } for n in range(3)]})
+    page = (
+        '<!DOCTYPE html><html><head><title>T-shirt imprimé</title>'
+        '<script type="application/ld+json">' + ld_json + '</script>'
+        '<script type="application/ld+json">' + breadcrumb + '</script>'
+        + '<script>var tracking = {};</script>' * 20 +
+        '</head><body><div id="app">' + '<div class="filler"></div>' * 200 + '</div>'
+        '<script type="application/json" id="similar-items">' + similar + '</script></body></html>'
+    )
+    return page.encode('utf-8')
+
+
+def check_product_pages(count: int = 14) -> List[str]:
+    """Differences between parse_product_page and what the synthetic product pages hold (empty if none)"""
+    from product_details import parse_product_page
+
+    errors = []
+    for i in range(count):
+        details = parse_product_page(synthetic_product_page(i))
+        expected = {'sizes': synthetic_sizes(i), 'price_value': 19 + i % 30 + 0.99}
+        for key, value in expected.items():
+            if details[key] != value:
+                errors.append(f"product page {i}: {key} {details[key]!r}, expected {value!r}")
+    return errors
+
+
+def load_pages(directory: Path) -> List[bytes]:
+    return [path.read_bytes() for path in sorted(directory.iterdir()) if path.suffix.lower() in {'.html', '.htm'}]
+
+
+def measure(parse: Callable[[bytes], List[Dict]], pages: List[bytes], repeat: int) -> Dict:
+    timings = []
+    for _ in range(repeat):
+        for html in pages:
+            start = time.perf_counter()
+            parse(html)
+            timings.append(time.perf_counter() - start)
+
+    peaks = []
+    products = 0
+    for html in pages:
+        tracemalloc.start()
+        products += len(parse(html))
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    return {
+        'pages': len(pages),
+        'products': products,
+        'ms_per_page': round(statistics.median(timings) * 1000, 2),
+        'peak_kb_per_page': round(statistics.mean(peaks) / 1024, 1),
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark the listing page parsers')
+    parser.add_argument('--pages', type=Path, help='Directory of saved listing pages (default: a synthetic page)')
+    parser.add_argument('--cards', type=int, default=84, help='Products on the synthetic page')
+    parser.add_argument('--repeat', type=int, default=10, help='Timed passes over the pages')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON lines')
+    args = parser.parse_args()
+
+    errors = check_product_pages()
+    if errors:
+        print("❌ Product page parser check failed:\n   " + "\n   ".join(errors))
+        sys.exit(1)
+
+    pages = load_pages(args.pages) if args.pages else [synthetic_page(args.cards)]
+    if not pages:
+        print("❌ No pages to parse")
+        sys.exit(1)
+
+    for name, parse in PATHS.items():
+        result = {'path': name, **measure(parse, pages, args.repeat)}
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print(f"⚙️  {name:>4}: {result['ms_per_page']} ms/page, {result['peak_kb_per_page']} KB peak/page, "
+                  f"{result['products']} products from {result['pages']} page(s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Job queue scaling benchmark
+Enqueues listing pages of distinct products, then lets 1, 2, 4... worker
+processes (queue_worker.py) post them against the local Supabase stand-in.
+Throughput should grow with the workers until the host budget is used up:
+--rate sets the stand-in host's requests per second, shared by all workers.
+
+    python benchmarks/bench_queue.py --workers 1 2 4 --pages 16 --latency 0.03
+    python benchmarks/bench_queue.py --workers 1 2 4 8 --rate 40
+"""
+
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+from supabase_standin import Fixtures, StandIn, make_fixtures
+
+# Shape-valid service key for the stand-in (never sent anywhere else)
+FAKE_KEY = 'eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.standin'
+
+
+def run_worker(options: Dict, standin_url: str, rate: float, directory: Path) -> Dict:
+    """One worker process, pointed at the stand-in instead of Zalando"""
+    os.environ['NEXT_PUBLIC_SUPABASE_URL'] = standin_url
+    os.environ['SUPABASE_SERVICE_ROLE_KEY'] = FAKE_KEY
+
+    import queue_worker
+    import zalando_scraper
+    from image_store import KnownImages
+
+    scraper_init = zalando_scraper.ZalandoScraper.__init__
+
+    def init(scraper, *args, **kwargs):
+        scraper_init(scraper, *args, **kwargs)
+        scraper.base_url = f"{standin_url}/zalando"
+        scraper.rate_limiter.rates['127.0.0.1'] = (rate, max(1, int(rate)))
+        # Images transferred by an earlier benchmark must not be skipped
+        scraper.image_store.known = KnownImages(standin_url, directory / f"images-{os.getpid()}.sqlite")
+
+    zalando_scraper.ZalandoScraper.__init__ = init
+    with contextlib.redirect_stdout(sys.stderr):
+        return queue_worker.work(options)
+
+
+def bench(workers: int, pages: int, cards: int, latency: float, rate: float) -> Dict:
+    from job_queue import JobQueue
+
+    directory = Path(tempfile.mkdtemp())
+    make_fixtures(directory / 'fixtures', pages=pages, cards=cards, images=4)
+    standin = StandIn(Fixtures(directory / 'fixtures'), latency=latency).start()
+    queue = JobQueue(directory / 'queue.sqlite')
+    queue.enqueue('bench', ['mode-femme'], {}, pages)
+
+    # No dedup index (it outlives the benchmark): the queue's claims keep each product to one post
+    options = {'queue': str(queue.path), 'batch': 'bench', 'lease': 60.0, 'poll': 0.2, 'dry_run': False,
+               'no_dedup': True, 'cache_size': 0, 'batch_size': 1, 'enrich': False, 'enrich_workers': 1,
+               'metrics_dir': None}
+    try:
+        start = time.perf_counter()
+        children = [subprocess.Popen([sys.executable, __file__, '--run-worker', json.dumps(options),
+                                      '--standin', standin.url, '--rate', str(rate), '--dir', str(directory)],
+                                     stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+                    for _ in range(workers)]
+        results = [json.loads(child.communicate()[0].strip().splitlines()[-1]) for child in children]
+        elapsed = time.perf_counter() - start
+    finally:
+        standin.stop()
+
+    posted = sum(result['posted'] for result in results)
+    return {
+        'workers': workers,
+        'pages': pages,
+        'posted': posted,
+        'seconds': round(elapsed, 2),
+        'products_per_second': round(posted / elapsed, 1),
+        'outfits_in_db': standin.rows.get('outfits', 0),
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark queue throughput as worker processes are added')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help='Worker processes to compare')
+    parser.add_argument('--pages', type=int, default=16, help='Listing pages enqueued')
+    parser.add_argument('--cards', type=int, default=12, help='Products per page')
+    parser.add_argument('--latency', type=float, default=0.03, help='Seconds added to every stand-in response')
+    parser.add_argument('--rate', type=float, default=1e6, help='Requests per second allowed to the stand-in host')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON lines')
+    parser.add_argument('--run-worker', help=argparse.SUPPRESS)
+    parser.add_argument('--standin', help=argparse.SUPPRESS)
+    parser.add_argument('--dir', type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_worker:
+        print(json.dumps(run_worker(json.loads(args.run_worker), args.standin, args.rate, args.dir)))
+        return
+
+    baseline = None
+    for workers in args.workers:
+        result = bench(workers, args.pages, args.cards, args.latency, args.rate)
+        baseline = baseline or result['products_per_second']
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print(f"👷 {workers} worker(s): {result['posted']} posts in {result['seconds']}s, "
+                  f"{result['products_per_second']} products/s (x{result['products_per_second'] / baseline:.1f})")
+
+
+if __name__ == '__main__':
+    main()
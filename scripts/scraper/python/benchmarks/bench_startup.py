@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark
+Measures cold start of the scraper CLIs in fresh interpreters: module import,
+`--help`, and building a dry-run scraper, plus which heavy dependencies each
+one ends up loading
+
+    python benchmarks/bench_startup.py --repeat 10
+    python benchmarks/bench_startup.py --json
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+
+HEAVY_MODULES = ['supabase', 'httpx', 'requests', 'bs4', 'lxml', 'PIL', 'numpy', 'selenium', 'webdriver_manager']
+
+REPORT = f"import sys, json; print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+
+CASES = {
+    'import zalando_scraper': ['-c', f"import zalando_scraper; {REPORT}"],
+    'import zalando_selenium': ['-c', f"import zalando_selenium; {REPORT}"],
+    'zalando_scraper.py --help': ['zalando_scraper.py', '--help'],
+    'zalando_selenium.py --help': ['zalando_selenium.py', '--help'],
+    'dry-run scraper': ['-c', "import zalando_scraper; "
+                              "zalando_scraper.ZalandoScraper(dedup=False, cache_size_mb=0, dry_run=True); " + REPORT],
+}
+
+
+def run(args: List[str], repeat: int) -> Dict:
+    timings = []
+    loaded = None
+    # No credentials: startup must not depend on them
+    env = {key: value for key, value in os.environ.items() if not key.startswith(('NEXT_PUBLIC_SUPABASE', 'SUPABASE'))}
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, *args], cwd=ROOT, env=env, capture_output=True, text=True)
+        timings.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else f"exit {result.returncode}")
+        if result.stdout.startswith('['):
+            loaded = json.loads(result.stdout.splitlines()[-1])
+
+    return {
+        'median_ms': round(statistics.median(timings) * 1000, 1),
+        'min_ms': round(min(timings) * 1000, 1),
+        'heavy_modules': loaded,
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark the scrapers\' cold start')
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters per case')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON lines')
+    args = parser.parse_args()
+
+    baseline = run(['-c', 'pass'], args.repeat)
+    if not args.json:
+        print(f"🐍 Empty interpreter: {baseline['median_ms']} ms")
+
+    for name, case in CASES.items():
+        result = {'case': name, **run(case, args.repeat)}
+        if args.json:
+            print(json.dumps(result))
+        else:
+            heavy = '' if result['heavy_modules'] is None else f", loads {', '.join(result['heavy_modules']) or 'nothing heavy'}"
+            print(f"🚀 {name}: {result['median_ms']} ms (min {result['min_ms']} ms){heavy}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Tail latency and outage benchmark
+Downloads images from the stand-in CDN through the scraper's rate limiter in
+two scenarios, with and without the protections of resilience.py:
+
+- tail: a small fraction of responses is slow; hedging re-sends requests
+  still unanswered at their endpoint's p95
+- outage: the CDN hangs then fails for a while; the circuit breaker pauses
+  downloads instead of letting each one burn its timeout, and resumes them
+  once the CDN is back
+
+    python benchmarks/bench_tail.py --images 400 --slow 0.02 1.0
+    python benchmarks/bench_tail.py --outage 6 --hang 1.0 --json
+"""
+
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+from supabase_standin import Fixtures, StandIn, make_fixtures
+
+DEFAULT_FIXTURES = BENCH_DIR / 'fixtures'
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def hedge_count() -> float:
+    from metrics import get_metrics
+
+    return sum(value for (name, _), value in get_metrics().counters.items() if name == 'hedged_requests')
+
+
+def fresh_scraper(standin: StandIn):
+    """Scraper pointed at the stand-in, with new latency statistics and breakers"""
+    os.environ['NEXT_PUBLIC_SUPABASE_URL'] = standin.url
+    from rate_limiter import HostRateLimiter
+    import zalando_scraper
+
+    scraper = zalando_scraper.ZalandoScraper(dedup=False, cache_size_mb=0, dry_run=True)
+    scraper.rate_limiter = HostRateLimiter(rates={'127.0.0.1': (1e6, 1_000_000)})
+    return scraper
+
+
+def bench_tail(standin: StandIn, images: int, slow, hedge: bool, workers: int) -> Dict:
+    scraper = fresh_scraper(standin)
+    if not hedge:
+        scraper.rate_limiter.latency.min_samples = sys.maxsize
+    standin.slow = tuple(slow)
+    hedges_before = hedge_count()
+
+    def download(i: int) -> float:
+        start = time.perf_counter()
+        scraper.download_image(f"{standin.url}/ztat/article/tail-{hedge}-{i}.jpg")
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        latencies = list(pool.map(download, range(images)))
+    elapsed = time.perf_counter() - start
+    standin.slow = None
+
+    return {
+        'scenario': 'tail',
+        'hedging': hedge,
+        'images': images,
+        'seconds': round(elapsed, 2),
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+        'max_ms': round(max(latencies) * 1000, 1),
+        'hedges': hedge_count() - hedges_before,
+    }
+
+
+def bench_outage(standin: StandIn, images: int, outage: float, hang: float, breaker: bool, workers: int) -> Dict:
+    scraper = fresh_scraper(standin)
+    cdn = scraper.rate_limiter.breaker(f"{standin.url}/ztat/")
+    cdn.cooldown = cdn.base_cooldown = 1.0
+    if not breaker:
+        cdn.threshold = sys.maxsize
+
+    standin.down['/ztat/'] = hang
+    threading.Timer(outage, lambda: standin.down.pop('/ztat/', None)).start()
+    failed = []
+
+    def download(i: int):
+        try:
+            scraper.download_image(f"{standin.url}/ztat/article/down-{breaker}-{i}.jpg")
+        except Exception:
+            failed.append(i)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(download, range(images)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        'scenario': 'outage',
+        'breaker': breaker,
+        'images': images,
+        'outage_seconds': outage,
+        'seconds': round(elapsed, 2),
+        'failed': len(failed),
+        # Each failed download hung on the down CDN
+        'seconds_hung': round(len(failed) * hang, 1),
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark hedged requests and circuit breakers against the stand-in')
+    parser.add_argument('--fixtures', type=Path, default=DEFAULT_FIXTURES,
+                        help='Fixtures directory (pages/ and images/), generated if missing')
+    parser.add_argument('--images', type=int, default=400, help='Images downloaded per run')
+    parser.add_argument('--workers', type=int, default=4, help='Downloads in flight')
+    parser.add_argument('--slow', type=float, nargs=2, default=[0.02, 1.0], metavar=('FRACTION', 'SECONDS'),
+                        help='Fraction of responses delayed, and by how much (tail scenario)')
+    parser.add_argument('--outage', type=float, default=6.0, help='Seconds the CDN is down (outage scenario)')
+    parser.add_argument('--hang', type=float, default=1.0, help='Seconds each request to the down CDN hangs')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON lines')
+    args = parser.parse_args()
+
+    if not (args.fixtures / 'pages').exists():
+        print(f"🧪 Generating fixtures in {args.fixtures}")
+        make_fixtures(args.fixtures)
+
+    standin = StandIn(Fixtures(args.fixtures)).start()
+    results = []
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            for hedge in (False, True):
+                results.append(bench_tail(standin, args.images, args.slow, hedge, args.workers))
+            for breaker in (False, True):
+                results.append(bench_outage(standin, args.images // 4, args.outage, args.hang, breaker, args.workers))
+    finally:
+        standin.stop()
+
+    for result in results:
+        if args.json:
+            print(json.dumps(result))
+        elif result['scenario'] == 'tail':
+            print(f"🐢 tail, hedging {'on' if result['hedging'] else 'off'}: p50 {result['p50_ms']} ms, "
+                  f"p99 {result['p99_ms']} ms, max {result['max_ms']} ms, {result['hedges']:.0f} hedges, "
+                  f"{result['seconds']}s in total")
+        else:
+            print(f"⛔ {result['outage_seconds']}s outage, breaker {'on' if result['breaker'] else 'off'}: "
+                  f"{result['failed']}/{result['images']} downloads failed, {result['seconds_hung']}s spent hanging, "
+                  f"{result['seconds']}s in total")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Transcoding benchmark
+Measures images per second (total and per core) for the process-pool transcoder
+
+    python benchmarks/bench_transcode.py --count 48 --workers 1 2 4
+    python benchmarks/bench_transcode.py --images ~/zalando-samples --json
+"""
+
+import io
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIL import Image
+
+from image_transcode import Transcoder, transcode
+
+
+def synthetic_images(count: int, width: int = 1800, height: int = 2600) -> List[bytes]:
+    """Product-photo sized JPEGs with enough detail to make the encoder work"""
+    images = []
+    for i in range(count):
+        image = Image.effect_noise((width, height), 40 + i % 20).convert('RGB')
+        image = Image.blend(image, Image.linear_gradient('L').resize((width, height)).convert('RGB'), 0.5)
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=90)
+        images.append(buffer.getvalue())
+    return images
+
+
+def load_images(directory: Path) -> List[bytes]:
+    extensions = {'.jpg', '.jpeg', '.png', '.webp'}
+    return [path.read_bytes() for path in sorted(directory.iterdir()) if path.suffix.lower() in extensions]
+
+
+def run(images: List[bytes], workers: int, image_format: str) -> dict:
+    with Transcoder(workers=workers, image_format=image_format) as transcoder:
+        # Warm the pool so process start-up is not measured
+        list(transcoder.map(images[:workers]))
+
+        start = time.perf_counter()
+        results = list(transcoder.map(images))
+        elapsed = time.perf_counter() - start
+
+    bytes_in = sum(len(data) for data in images)
+    bytes_out = sum(len(variant['data']) for variants in results for variant in variants)
+
+    return {
+        'workers': workers,
+        'format': image_format,
+        'images': len(images),
+        'seconds': round(elapsed, 3),
+        'images_per_second': round(len(images) / elapsed, 2),
+        'images_per_second_per_core': round(len(images) / elapsed / workers, 2),
+        'bytes_in': bytes_in,
+        'bytes_out': bytes_out,
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark the image transcoding stage')
+    parser.add_argument('--images', type=Path, help='Directory of sample images (default: synthetic JPEGs)')
+    parser.add_argument('--count', type=int, default=24, help='Number of synthetic images')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count() or 1], help='Pool sizes to test')
+    parser.add_argument('--format', choices=['webp', 'jpeg'], default='webp', help='Output format')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON lines')
+    args = parser.parse_args()
+
+    images = load_images(args.images) if args.images else synthetic_images(args.count)
+    if not images:
+        print("❌ No images to transcode")
+        sys.exit(1)
+
+    # Sanity check in-process before timing the pool
+    transcode(images[0], image_format=args.format)
+
+    for workers in sorted(set(args.workers)):
+        result = run(images, workers, args.format)
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print(f"⚙️  {workers} worker(s): {result['images_per_second']} img/s "
+                  f"({result['images_per_second_per_core']} img/s/core), "
+                  f"{result['bytes_in'] // 1024} KB -> {result['bytes_out'] // 1024} KB")
+
+
+if __name__ == '__main__':
+    main()
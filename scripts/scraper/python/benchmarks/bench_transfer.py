@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Image transfer memory benchmark
+Copies images of increasing size from the stand-in CDN to its Storage, one
+at a time and concurrently, either streamed (ImageStore.transfer) or read
+whole into memory first (download + put, as before streaming).
+
+Each configuration runs in its own process so peak RSS is per configuration;
+the RSS growth over the process baseline is what the transfers cost.
+
+    python benchmarks/bench_transfer.py --sizes-mb 1 10 40 --concurrency 1 8
+    python benchmarks/bench_transfer.py --json
+"""
+
+import contextlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+from supabase_standin import Fixtures, StandIn, make_fixtures
+
+DEFAULT_FIXTURES = BENCH_DIR / 'fixtures'
+MODES = ['stream', 'memory']
+
+# Shape-valid service key for the stand-in (never sent anywhere else)
+FAKE_KEY = 'eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.standin'
+
+
+def peak_rss_mb() -> float:
+    """Peak RSS of this process (VmHWM: ru_maxrss keeps the parent's peak across exec on Linux)"""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_one(mode: str, size_mb: float, concurrency: int, images: int, standin_url: str) -> Dict:
+    """Transfer `images` images of `size_mb` in this process and report peak RSS growth"""
+    os.environ['NEXT_PUBLIC_SUPABASE_URL'] = standin_url
+    os.environ['SUPABASE_SERVICE_ROLE_KEY'] = FAKE_KEY
+
+    import zalando_scraper
+    from image_store import KnownImages
+
+    scraper = zalando_scraper.ZalandoScraper(dedup=False, cache_size_mb=0)
+    scraper.rate_limiter.rates['127.0.0.1'] = (1e6, 1_000_000)
+    scraper.image_store.known = KnownImages(standin_url, Path(tempfile.mkdtemp()) / 'images.sqlite')
+    size = int(size_mb * 1024 * 1024)
+    urls = [f"{standin_url}/ztat/large/{size}/{mode}-{concurrency}-{i}.jpg" for i in range(images)]
+
+    def transfer(url: str) -> str:
+        if mode == 'stream':
+            return scraper.image_store.transfer(url)
+        return scraper.image_store.put(scraper.download_image(url))
+
+    # Warm up imports, the client and the connection pool before taking the baseline
+    with contextlib.redirect_stdout(sys.stderr):
+        transfer(f"{standin_url}/ztat/large/1024/warmup-{mode}-{concurrency}.jpg")
+    baseline = peak_rss_mb()
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stderr), ThreadPoolExecutor(concurrency) as pool:
+        stored = list(pool.map(transfer, urls))
+    elapsed = time.perf_counter() - start
+
+    return {
+        'mode': mode,
+        'image_mb': size_mb,
+        'concurrency': concurrency,
+        'images': len(stored),
+        'seconds': round(elapsed, 2),
+        'mb_per_second': round(size_mb * len(stored) / elapsed, 1),
+        'baseline_rss_mb': round(baseline, 1),
+        'rss_growth_mb': round(peak_rss_mb() - baseline, 1),
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark memory use of image transfers to Storage')
+    parser.add_argument('--fixtures', type=Path, default=DEFAULT_FIXTURES,
+                        help='Fixtures directory (pages/ and images/), generated if missing')
+    parser.add_argument('--sizes-mb', type=float, nargs='+', default=[1, 10, 40], help='Image sizes to transfer')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8], help='Transfers in flight')
+    parser.add_argument('--images', type=int, default=8, help='Images transferred per configuration')
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES, help='Transfer paths to compare')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON lines')
+    parser.add_argument('--run-one', nargs=3, metavar=('MODE', 'SIZE_MB', 'CONCURRENCY'), help=argparse.SUPPRESS)
+    parser.add_argument('--standin', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        mode, size_mb, concurrency = args.run_one
+        print(json.dumps(run_one(mode, float(size_mb), int(concurrency), args.images, args.standin)))
+        return
+
+    if not (args.fixtures / 'pages').exists():
+        print(f"🧪 Generating fixtures in {args.fixtures}")
+        make_fixtures(args.fixtures)
+
+    standin = StandIn(Fixtures(args.fixtures)).start()
+    try:
+        for size_mb in args.sizes_mb:
+            for concurrency in args.concurrency:
+                for mode in args.modes:
+                    child = subprocess.run(
+                        [sys.executable, __file__, '--run-one', mode, str(size_mb), str(concurrency),
+                         '--images', str(args.images), '--standin', standin.url],
+                        capture_output=True, text=True
+                    )
+                    # The stand-in keeps uploads in memory: drop them between configurations
+                    standin.objects.clear()
+                    standin.uploads.clear()
+                    if child.returncode != 0:
+                        print(f"❌ {mode} {size_mb} MB x{concurrency} failed:\n{child.stderr}")
+                        continue
+
+                    result = json.loads(child.stdout.strip().splitlines()[-1])
+                    if args.json:
+                        print(json.dumps(result))
+                    else:
+                        print(f"📦 {mode} {size_mb} MB x{concurrency}: {result['mb_per_second']} MB/s, "
+                              f"RSS +{result['rss_growth_mb']} MB (baseline {result['baseline_rss_mb']} MB)")
+    finally:
+        standin.stop()
+
+
+if __name__ == '__main__':
+    main()
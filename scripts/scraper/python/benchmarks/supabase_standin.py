@@ -0,0 +1,294 @@
+"""
+Local stand-in for Zalando and Supabase used by the offline benchmarks
+Serves saved listing pages and images from a fixtures directory, plus the
+PostgREST and Storage endpoints the scrapers call, on one loopback port
+
+Fixtures layout (generated by make_fixtures when missing):
+
+    fixtures/pages/page-001.html ...   listing pages, served as ?p=1, ?p=2, ...
+    fixtures/images/*.jpg              product images, served for every CDN URL
+
+CDN URLs under /ztat/large/<bytes>/ get a unique image of that size, streamed
+without being built in memory. Storage accepts plain uploads and resumable
+(TUS) ones; `fail_patches` makes that many resumable chunks fail halfway.
+
+Tail latency and outages can be injected: `slow` = (fraction, seconds)
+delays that fraction of responses, and each path prefix in `down` (e.g.
+'/ztat/') hangs for its number of seconds then answers 504.
+
+Product pages (/<slug>-<n>.html, as linked from the listings) are generated
+on the fly by bench_parse.synthetic_product_page.
+"""
+
+import base64
+import hashlib
+import io
+import json
+import random
+import re
+import socket
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+BOT_USER_ID = '00000000-0000-4000-8000-000000000001'
+
+# Image hosts rewritten to the stand-in when pages are served
+CDN_PATTERN = re.compile(rb'https?://img\d*\.ztat\.net/')
+
+# Synthetic product URLs end with the product number, e.g. /marque-article-12-abababab0012.html
+PRODUCT_PATH = re.compile(r'-(\d+)-[a-z]+\d+\.html$')
+
+
+def make_fixtures(directory: Path, pages: int = 3, cards: int = 48, images: int = 12):
+    """Write synthetic listing pages and product-photo sized JPEGs"""
+    from PIL import Image
+    from bench_parse import synthetic_page
+
+    (directory / 'pages').mkdir(parents=True, exist_ok=True)
+    (directory / 'images').mkdir(parents=True, exist_ok=True)
+
+    for page in range(pages):
+        (directory / 'pages' / f"page-{page + 1:03d}.html").write_bytes(synthetic_page(cards, start=page * cards))
+
+    for i in range(images):
+        image = Image.effect_noise((762, 1100), 30 + i).convert('RGB')
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=85)
+        (directory / 'images' / f"image-{i:03d}.jpg").write_bytes(buffer.getvalue())
+
+
+class Fixtures:
+    def __init__(self, directory: Path):
+        self.pages: List[bytes] = [path.read_bytes() for path in sorted((directory / 'pages').glob('*.htm*'))]
+        self.images: List[bytes] = [path.read_bytes() for path in sorted((directory / 'images').iterdir())]
+        if not self.pages or not self.images:
+            raise ValueError(f"No pages or images in {directory}")
+
+    def image(self, path: str) -> bytes:
+        """A fixture image made unique per URL (bytes after the JPEG end marker are ignored by decoders)"""
+        digest = hashlib.sha256(path.encode()).digest()
+        return self.images[digest[0] % len(self.images)] + digest
+
+    def large_image(self, path: str, size: int):
+        """Chunks of a `size`-byte image unique to `path`: a fixture JPEG padded with per-URL bytes"""
+        head = self.image(path)[:size]
+        yield head
+        block = hashlib.sha256(path.encode()).digest() * 2048
+        remaining = size - len(head)
+        while remaining > 0:
+            yield block[:remaining]
+            remaining -= len(block)
+
+
+class StandIn:
+    def __init__(self, fixtures: Fixtures, latency: float = 0.0):
+        """
+        Args:
+            fixtures: Pages and images to replay
+            latency: Seconds added to every response (simulated round trip)
+        """
+        self.fixtures = fixtures
+        self.latency = latency
+        self.objects: Dict[str, bytes] = {}
+        self.uploads: Dict[str, Dict] = {}
+        self.fail_patches = 0
+        self.slow: Optional[Tuple[float, float]] = None
+        self.down: Dict[str, float] = {}
+        self.random = random.Random(0)
+        self.rows: Dict[str, int] = {}
+        self.ids: Dict[str, set] = {}
+        self.requests: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def start(self) -> 'StandIn':
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count(self, route: str):
+        with self.lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+
+    def _handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                # Headers and body are written separately: do not let Nagle + delayed ACK add 40 ms
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def log_message(self, *args):
+                pass
+
+            def reply(self, status: int, body: bytes = b'', content_type: str = 'application/json',
+                      headers: Dict[str, str] = None):
+                if standin.latency:
+                    time.sleep(standin.latency)
+                path = urlparse(self.path).path
+                hang = next((seconds for prefix, seconds in standin.down.items() if path.startswith(prefix)), None)
+                if hang is not None:
+                    time.sleep(hang)
+                    status, body, content_type = 504, b'{}', 'application/json'
+                elif standin.slow:
+                    fraction, seconds = standin.slow
+                    with standin.lock:
+                        slow = standin.random.random() < fraction
+                    if slow:
+                        time.sleep(seconds)
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                if self.command != 'HEAD':
+                    self.wfile.write(body)
+
+            def body(self) -> bytes:
+                return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+            def do_GET(self):
+                # postgrest-py sends `{}` with selects: drain it or it corrupts the next keep-alive request
+                self.body()
+                parsed = urlparse(self.path)
+
+                if parsed.path.startswith('/zalando/'):
+                    standin.count('listing')
+                    page = int(parse_qs(parsed.query).get('p', ['1'])[0])
+                    if page > len(standin.fixtures.pages):
+                        return self.reply(404, b'', 'text/html')
+                    html = CDN_PATTERN.sub(f"{standin.url}/ztat/".encode(), standin.fixtures.pages[page - 1])
+                    return self.reply(200, html, 'text/html; charset=utf-8')
+
+                product = PRODUCT_PATH.search(parsed.path)
+                if product:
+                    from bench_parse import synthetic_product_page
+
+                    standin.count('product_page')
+                    html = CDN_PATTERN.sub(f"{standin.url}/ztat/".encode(), synthetic_product_page(int(product.group(1))))
+                    return self.reply(200, html, 'text/html; charset=utf-8')
+
+                if parsed.path.startswith('/ztat/large/'):
+                    standin.count('image')
+                    size = int(parsed.path.split('/')[3])
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'image/jpeg')
+                    self.send_header('Content-Length', str(size))
+                    self.end_headers()
+                    for chunk in standin.fixtures.large_image(parsed.path, size):
+                        self.wfile.write(chunk)
+                    return
+
+                if parsed.path.startswith('/ztat/'):
+                    standin.count('image')
+                    return self.reply(200, standin.fixtures.image(parsed.path), 'image/jpeg')
+
+                if parsed.path.startswith('/rest/v1/profiles'):
+                    standin.count('rest_select')
+                    return self.reply(200, json.dumps([{'id': BOT_USER_ID}]).encode())
+
+                if parsed.path.startswith('/rest/v1/'):
+                    standin.count('rest_select')
+                    return self.reply(200, b'[]')
+
+                if parsed.path.startswith('/storage/v1/object/public/'):
+                    data = standin.objects.get(parsed.path.split('/public/', 1)[1])
+                    return self.reply(200, data, 'image/jpeg') if data is not None else self.reply(404, b'{}')
+
+                self.reply(404, b'{}')
+
+            def do_HEAD(self):
+                self.body()
+                standin.count('storage_head')
+                path = urlparse(self.path).path
+                if path.startswith('/storage/v1/object/public/') and path.split('/public/', 1)[1] in standin.objects:
+                    return self.reply(200, b'', 'image/jpeg')
+                upload = standin.uploads.get(path.rsplit('/', 1)[-1])
+                if path.startswith('/storage/v1/upload/resumable/') and upload:
+                    return self.reply(200, headers={'Upload-Offset': str(len(upload['data'])),
+                                                    'Upload-Length': str(upload['length']), 'Tus-Resumable': '1.0.0'})
+                self.reply(404)
+
+            def do_POST(self):
+                path = urlparse(self.path).path
+                data = self.body()
+
+                if path.startswith('/rest/v1/'):
+                    table = path.rsplit('/', 1)[-1]
+                    standin.count(f"insert_{table}")
+                    rows = json.loads(data or b'[]')
+                    rows = [{'id': str(uuid.uuid4()), **row} for row in (rows if isinstance(rows, list) else [rows])]
+                    with standin.lock:
+                        ids = standin.ids.setdefault(table, set())
+                        if 'resolution=ignore-duplicates' in self.headers.get('Prefer', ''):
+                            # Upsert replay: rows whose id is already there are skipped, not returned
+                            rows = [row for row in rows if row['id'] not in ids]
+                        ids.update(row['id'] for row in rows)
+                        standin.rows[table] = standin.rows.get(table, 0) + len(rows)
+                    return self.reply(201, json.dumps(rows).encode())
+
+                if path == '/storage/v1/upload/resumable':
+                    standin.count('storage_upload')
+                    metadata = dict(item.split(' ', 1) for item in self.headers['Upload-Metadata'].split(','))
+                    key = '/'.join(base64.b64decode(metadata[name]).decode() for name in ('bucketName', 'objectName'))
+                    if key in standin.objects:
+                        return self.reply(409, b'{"error": "Duplicate"}')
+                    upload_id = uuid.uuid4().hex
+                    with standin.lock:
+                        standin.uploads[upload_id] = {'key': key, 'length': int(self.headers['Upload-Length']),
+                                                      'data': bytearray()}
+                    return self.reply(201, headers={'Location': f"/storage/v1/upload/resumable/{upload_id}",
+                                                    'Tus-Resumable': '1.0.0'})
+
+                if path.startswith('/storage/v1/object/'):
+                    standin.count('storage_upload')
+                    key = path.split('/storage/v1/object/', 1)[1]
+                    with standin.lock:
+                        standin.objects[key] = data
+                    return self.reply(200, json.dumps({'Key': key}).encode())
+
+                self.reply(404, b'{}')
+
+            def do_PATCH(self):
+                upload = standin.uploads.get(urlparse(self.path).path.rsplit('/', 1)[-1])
+                data = self.body()
+                standin.count('storage_patch')
+                if not upload:
+                    return self.reply(404, b'{}')
+                if int(self.headers['Upload-Offset']) != len(upload['data']):
+                    return self.reply(409, b'{"error": "Offset mismatch"}')
+
+                with standin.lock:
+                    failing = standin.fail_patches > 0
+                    standin.fail_patches -= failing
+                if failing:
+                    # Connection lost mid-chunk: the server keeps what it received
+                    upload['data'] += data[:len(data) // 2]
+                    return self.reply(500, b'{}')
+
+                upload['data'] += data
+                if len(upload['data']) >= upload['length']:
+                    with standin.lock:
+                        standin.objects[upload['key']] = bytes(upload['data'])
+                self.reply(204, headers={'Upload-Offset': str(len(upload['data'])), 'Tus-Resumable': '1.0.0'})
+
+            def do_DELETE(self):
+                self.body()
+                standin.count('rest_delete')
+                self.reply(204)
+
+        return Handler
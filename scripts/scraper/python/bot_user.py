@@ -0,0 +1,72 @@
+"""
+Bot user bootstrap for the Zalando scrapers
+Posts are created for the InFit_Official profile. Its id is cached per
+Supabase project in .cache/bot_user.json, so a run does not query `profiles`
+(or even build a Supabase client) just to find it; a cached id is checked
+against the database again once it is older than REVALIDATE_SECONDS.
+"""
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+from dedup_index import CACHE_DIR
+
+DEFAULT_PATH = CACHE_DIR / 'bot_user.json'
+BOT_USERNAME = 'InFit_Official'
+
+# Cached ids older than this are looked up again before use
+REVALIDATE_SECONDS = 7 * 24 * 3600
+
+
+def _load(path: Path) -> dict:
+    try:
+        return json.loads(Path(path).read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def cached_bot_user(supabase_url: str, path: Path = DEFAULT_PATH) -> Optional[str]:
+    """Bot user id cached for a Supabase project, None if unknown or due for a check"""
+    entry = _load(path).get(supabase_url)
+    if not entry or time.time() - entry.get('checked_at', 0) > REVALIDATE_SECONDS:
+        return None
+    return entry.get('id')
+
+
+def remember_bot_user(supabase_url: str, user_id: str, path: Path = DEFAULT_PATH):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    entries = _load(path)
+    entries[supabase_url] = {'id': user_id, 'checked_at': time.time()}
+
+    tmp_path = path.with_suffix('.tmp')
+    tmp_path.write_text(json.dumps(entries, indent=2))
+    os.replace(tmp_path, path)
+
+
+def find_or_create_bot_user(supabase) -> Tuple[str, bool]:
+    """(bot user id, whether it had to be created) from the database"""
+    result = supabase.table('profiles').select('id').eq('username', BOT_USERNAME).execute()
+    if result.data:
+        return result.data[0]['id'], False
+
+    # Create bot user
+    auth_result = supabase.auth.admin.create_user({
+        'email': 'bot@infit.app',
+        'email_confirm': True,
+        'user_metadata': {
+            'username': BOT_USERNAME
+        }
+    })
+    user_id = auth_result.user.id
+
+    # Create profile
+    supabase.table('profiles').insert({
+        'id': user_id,
+        'username': BOT_USERNAME,
+        'height': 180
+    }).execute()
+    return user_id, True
@@ -0,0 +1,176 @@
+"""
+Batched Supabase writer for scraped posts
+Inserts the `outfits` rows of a whole batch in one request, then every
+`clothing_pieces` (and `outfit_images`) row of the batch in one more request
+(upserts on their derived ids, so writing the same rows twice is harmless)
+"""
+
+import threading
+from collections import defaultdict, deque
+from typing import List, Dict, Optional, Tuple
+
+from post_rows import outfit_row, clothing_piece_rows, image_variant_rows
+from metrics import get_metrics
+from posting import PostBookkeeping
+
+# (product, uploaded image variants largest first) as returned by upload_image_variants
+Prepared = Tuple[Dict, List[Dict]]
+
+
+class BulkWriter(PostBookkeeping):
+    def __init__(self, supabase, supabase_url: str, bot_user_id: str, rate_limiter, batch_size: int = 50,
+                 dedup=None, journal=None, near_dups=None, watermarks=None):
+        """
+        Args:
+            supabase: Supabase client
+            supabase_url: Project URL (rate limiter key)
+            bot_user_id: Profile id the posts are created for
+            rate_limiter: HostRateLimiter shared with the scraper
+            batch_size: Products per batch
+            dedup: Optional DedupIndex updated with every product written
+            journal: Optional RunJournal; outfits then get the journal's ids, so a replayed batch is upserted
+            near_dups: Optional NearDuplicateIndex told the outfit id of every product written
+            watermarks: Optional Watermarks marking every product written as seen on its listing
+        """
+        self.supabase = supabase
+        self.supabase_url = supabase_url
+        self.bot_user_id = bot_user_id
+        self.rate_limiter = rate_limiter
+        self.batch_size = max(1, batch_size)
+        self.dedup = dedup
+        self.journal = journal
+        self.near_dups = near_dups
+        self.watermarks = watermarks
+        self.pending: List[Prepared] = []
+        self.lock = threading.Lock()
+        self.metrics = get_metrics()
+
+    def add(self, product: Dict, variants: List[Dict]) -> List[Optional[str]]:
+        """Queue a prepared product, writing the batch once it is full (returns its outfit ids)"""
+        with self.lock:
+            self.pending.append((product, variants))
+            if len(self.pending) < self.batch_size:
+                return []
+            batch, self.pending = self.pending, []
+
+        return self.write(batch)
+
+    def flush(self) -> List[Optional[str]]:
+        """Write whatever is still queued"""
+        with self.lock:
+            batch, self.pending = self.pending, []
+
+        return self.write(batch)
+
+    def write(self, batch: List[Prepared]) -> List[Optional[str]]:
+        """
+        Write a batch, returning one outfit id (or None) per product
+
+        A failed batch is rolled back and split in two until the failing
+        products are isolated, so one bad row does not sink its neighbours.
+        """
+        if not batch:
+            return []
+
+        try:
+            with self.metrics.timer('db_batch_insert', rows=len(batch)):
+                return self._write_batch(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                product = batch[0][0]
+                print(f"   ❌ Error creating post ({product['brand']} - {product['name']}): {e}")
+                self.failed(product, e)
+                return [None]
+
+            print(f"   ⚠️  Batch of {len(batch)} failed ({e}), splitting")
+            middle = len(batch) // 2
+            return self.write(batch[:middle]) + self.write(batch[middle:])
+
+    def _write_batch(self, batch: List[Prepared]) -> List[str]:
+        journal_ids = [self.journal.outfit_id(product) for product, _ in batch] if self.journal else [None] * len(batch)
+        rows = [
+            outfit_row(product, self.bot_user_id, variants[0]['image_url'], outfit_id)
+            for (product, variants), outfit_id in zip(batch, journal_ids)
+        ]
+
+        with self.rate_limiter.guard(self.supabase_url):
+            if self.journal:
+                # Ids known up front: outfits already written by an interrupted attempt are left as they are
+                result = self.supabase.table('outfits').upsert(rows, on_conflict='id', ignore_duplicates=True).execute()
+                outfit_ids = journal_ids
+                # Only the rows this batch inserted are returned, and only those may be rolled back
+                inserted = [record['id'] for record in result.data or []]
+            else:
+                result = self.supabase.table('outfits').insert(rows).execute()
+                outfit_ids = self._map_ids(rows, result.data or [])
+                inserted = outfit_ids
+
+        try:
+            pieces = [
+                piece
+                for (product, _), outfit_id in zip(batch, outfit_ids)
+                for piece in clothing_piece_rows(product, outfit_id)
+            ]
+            images = [
+                image
+                for (_, variants), outfit_id in zip(batch, outfit_ids)
+                for image in image_variant_rows(outfit_id, variants[1:])
+            ]
+
+            if pieces:
+                with self.rate_limiter.guard(self.supabase_url):
+                    self.supabase.table('clothing_pieces').upsert(pieces, on_conflict='id', ignore_duplicates=True).execute()
+            if images:
+                with self.rate_limiter.guard(self.supabase_url):
+                    self.supabase.table('outfit_images').upsert(images, on_conflict='id', ignore_duplicates=True).execute()
+        except Exception:
+            # ON DELETE CASCADE removes any pieces/images already attached
+            self.metrics.count('batch_rollbacks')
+            self._delete_outfits(inserted)
+            raise
+
+        for (product, _), outfit_id in zip(batch, outfit_ids):
+            self.posted(product, outfit_id)
+            print(f"   ✅ Post created: {outfit_id} ({product['brand']} - {product['name']})")
+
+        return outfit_ids
+
+    def _map_ids(self, rows: List[Dict], returned: List[Dict]) -> List[str]:
+        """Map returned records back to the submitted rows"""
+        if len(returned) == len(rows) and all(
+            record.get('image_url') == row['image_url'] and record.get('description') == row['description']
+            for record, row in zip(returned, rows)
+        ):
+            return [record['id'] for record in returned]
+
+        # PostgREST does not promise to keep the order: match on content instead
+        by_content = defaultdict(deque)
+        for record in returned:
+            by_content[(record.get('image_url'), record.get('description'))].append(record['id'])
+
+        outfit_ids = []
+        for row in rows:
+            candidates = by_content.get((row['image_url'], row['description']))
+            if not candidates:
+                self._delete_outfits([record['id'] for record in returned])
+                raise ValueError(f"outfits insert returned {len(returned)} rows for {len(rows)} products")
+            outfit_ids.append(candidates.popleft())
+
+        return outfit_ids
+
+    def _delete_outfits(self, outfit_ids: List[str]):
+        """
+        Roll back outfits of a failed batch so no orphan posts are left behind
+
+        Only ids this batch inserted are passed: in journal mode an outfit
+        written by an earlier attempt of the run is kept (with its pieces).
+        """
+        outfit_ids = [outfit_id for outfit_id in outfit_ids if outfit_id]
+        if not outfit_ids:
+            return
+
+        try:
+            with self.rate_limiter.guard(self.supabase_url):
+                self.supabase.table('outfits').delete().in_('id', outfit_ids).execute()
+        except Exception as e:
+            print(f"   ⚠️  Could not roll back outfits {outfit_ids}: {e}")
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Catalog snapshots of every run, and diffs between them
+Each run appends what it saw to runs/catalog/catalog-<start>-<run>.jsonl.gz: one
+compact JSON row per product observation, with a numeric price, the SKU and
+a timestamp. Every listing product found is recorded (posted or not), then
+again with its product page's details when it is enriched, sold-out
+products included.
+
+The diff compares the newest snapshot (the last one written to, so a resumed
+run's file counts from when it finished) with the last earlier observation of
+each product, so price drops, new items and restocks come out of files
+already on disk, without a re-scrape:
+
+    python catalog_snapshots.py list
+    python catalog_snapshots.py diff --history 7 --min-drop 10
+    python catalog_snapshots.py diff --json > changes.jsonl
+"""
+
+import gzip
+import json
+import threading
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+from dedup_index import extract_sku, product_key
+from listing_parser import parse_price
+
+DEFAULT_DIR = Path(__file__).parent / 'runs' / 'catalog'
+
+# Where an observation comes from
+LISTING = 'listing'
+PAGE = 'page'
+
+
+class Observation(NamedTuple):
+    """What the diff needs from a snapshot row"""
+    price: Optional[float]
+    in_stock: bool
+    seen_at: float
+
+
+def snapshot_row(product: Dict, listing: Optional[str], source: str, seen_at: float) -> Dict:
+    """Snapshot row of a product dict (listing or enriched)"""
+    price, currency = product.get('price_value'), product.get('currency')
+    if price is None:
+        price, parsed_currency = parse_price(product.get('price'))
+        currency = currency or parsed_currency
+
+    sizes = product.get('sizes')
+    return {
+        'key': product_key(product['product_url']),
+        'sku': extract_sku(product['product_url']),
+        'url': product['product_url'],
+        'brand': product.get('brand'),
+        'name': product.get('name'),
+        'listing': listing,
+        'category': product.get('category'),
+        'price': price,
+        'currency': currency,
+        'sizes': sizes,
+        # Listings only show buyable products; a product page with every size sold out has sizes == []
+        'in_stock': sizes != [],
+        'source': source,
+        'seen_at': round(seen_at, 3),
+    }
+
+
+class SnapshotWriter:
+    def __init__(self, run_id: Optional[str] = None, directory: Path = DEFAULT_DIR):
+        """
+        Args:
+            run_id: Journal run id (a resumed run appends to its own file); defaults to the start time
+            directory: Where catalog-<start time>-<run>.jsonl.gz files are written
+        """
+        started = datetime.now().strftime('%Y%m%d-%H%M%S')
+        self.run_id = run_id or started
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        # File names start with the run's start time; a resumed run finds its file by run id
+        existing = sorted(directory.glob(f"catalog-*-{self.run_id}.jsonl.gz")) if run_id else []
+        name = f"catalog-{started}-{run_id}.jsonl.gz" if run_id else f"catalog-{started}.jsonl.gz"
+        self.path = existing[-1] if existing else directory / name
+        # Appending adds a gzip member: the file stays one valid stream across resumed runs
+        self.file = gzip.open(self.path, 'ab')
+        self.lock = threading.Lock()
+        self.rows = 0
+
+    def record(self, products: Iterable[Dict], listing: Optional[str] = None, source: str = LISTING):
+        """Append one row per product; rows are flushed so a crashed run keeps what it saw"""
+        now = time.time()
+        lines = [json.dumps(snapshot_row(product, listing, source, now), ensure_ascii=False,
+                            separators=(',', ':')).encode() + b'\n' for product in products]
+        if not lines:
+            return
+        with self.lock:
+            self.file.write(b''.join(lines))
+            self.file.flush()
+            self.rows += len(lines)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+        print(f"🗂️  Catalog snapshot: {self.rows} rows in {self.path}")
+
+
+def list_snapshots(directory: Path = DEFAULT_DIR) -> List[Path]:
+    """
+    Snapshot files, oldest first by when they were last written
+
+    Not by name: a resumed run appends to the file named after its original
+    start, which must still sort after the runs that went in between.
+    """
+    return sorted(Path(directory).glob('catalog-*.jsonl.gz'), key=lambda path: (path.stat().st_mtime, path.name))
+
+
+def iter_rows(path: Path) -> Iterator[Dict]:
+    """Rows of a snapshot; a file cut short by a crash yields what was flushed"""
+    try:
+        with gzip.open(path, 'rb') as file:
+            for line in file:
+                if line.endswith(b'\n'):
+                    yield json.loads(line)
+    except (EOFError, zlib.error, gzip.BadGzipFile):
+        return
+
+
+def load_snapshot(path: Path) -> Dict[str, Observation]:
+    """Last observation of each product in a snapshot (page details come after the listing row)"""
+    return {row['key']: Observation(row['price'], row['in_stock'], row['seen_at']) for row in iter_rows(path)}
+
+
+class Change(NamedTuple):
+    kind: str
+    key: str
+    price: Optional[float]
+    previous_price: Optional[float]
+    previous_seen_at: Optional[float]
+
+    @property
+    def drop_percent(self) -> Optional[float]:
+        if not self.previous_price or self.price is None:
+            return None
+        return round((self.previous_price - self.price) / self.previous_price * 100, 1)
+
+
+PRICE_DROP = 'price_drop'
+NEW_ITEM = 'new_item'
+RESTOCK = 'restock'
+
+
+def diff(current: Dict[str, Observation], earlier: Dict[str, Observation], min_drop: float = 0.0) -> List[Change]:
+    """
+    Changes between the newest snapshot and the last earlier observation of each product
+
+    A price drop is a lower price than last observed (by at least `min_drop`
+    percent), a new item one that no earlier snapshot has, and a restock a
+    product in stock now that was last observed sold out.
+    """
+    changes = []
+    for key, now in current.items():
+        before = earlier.get(key)
+        if before is None:
+            changes.append(Change(NEW_ITEM, key, now.price, None, None))
+            continue
+        if now.in_stock and not before.in_stock:
+            changes.append(Change(RESTOCK, key, now.price, before.price, before.seen_at))
+        if now.price is not None and before.price and now.price < before.price:
+            change = Change(PRICE_DROP, key, now.price, before.price, before.seen_at)
+            if change.drop_percent >= min_drop:
+                changes.append(change)
+    return changes
+
+
+def diff_latest(directory: Path = DEFAULT_DIR, history: Optional[int] = None, min_drop: float = 0.0) -> Dict:
+    """
+    Diff the newest snapshot against the `history` snapshots before it (all of them if None)
+
+    Returns {'snapshot', 'compared_with', 'products', 'changes'}.
+    """
+    snapshots = list_snapshots(directory)
+    if not snapshots:
+        raise FileNotFoundError(f"No catalog snapshot in {directory}")
+
+    newest, older = snapshots[-1], snapshots[:-1]
+    if history is not None:
+        older = older[-history:] if history else []
+
+    # Oldest first, so each product ends up with its most recent earlier observation
+    earlier: Dict[str, Observation] = {}
+    for path in older:
+        earlier.update(load_snapshot(path))
+
+    current = load_snapshot(newest)
+    return {
+        'snapshot': newest.name,
+        'compared_with': [path.name for path in older],
+        'products': len(current),
+        'changes': diff(current, earlier, min_drop),
+    }
+
+
+def describe(path: Path, keys: Iterable[str]) -> Dict[str, Dict]:
+    """Full rows of some products of a snapshot (brand, name, URL for the report)"""
+    wanted = set(keys)
+    return {row['key']: row for row in iter_rows(path) if row['key'] in wanted}
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Catalog snapshots: list them, or diff the newest against earlier runs')
+    parser.add_argument('command', choices=['list', 'diff'])
+    parser.add_argument('--dir', type=Path, default=DEFAULT_DIR, help='Snapshot directory')
+    parser.add_argument('--history', type=int, help='Earlier snapshots compared with (default: all)')
+    parser.add_argument('--min-drop', type=float, default=0.0, help='Smallest price drop reported, in percent')
+    parser.add_argument('--json', action='store_true', help='Print changes as JSON lines')
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        for path in list_snapshots(args.dir):
+            rows = sum(1 for _ in iter_rows(path))
+            print(f"🗂️  {path.name}: {rows} rows, {path.stat().st_size / 1024:.0f} KB")
+        return
+
+    start = time.perf_counter()
+    result = diff_latest(args.dir, args.history, args.min_drop)
+    elapsed = time.perf_counter() - start
+
+    changes = result['changes']
+    rows = describe(args.dir / result['snapshot'], [change.key for change in changes])
+    if args.json:
+        for change in changes:
+            row = rows.get(change.key, {})
+            print(json.dumps({'kind': change.kind, 'key': change.key, 'sku': row.get('sku'), 'url': row.get('url'),
+                              'brand': row.get('brand'), 'name': row.get('name'), 'price': change.price,
+                              'previous_price': change.previous_price, 'drop_percent': change.drop_percent,
+                              'previous_seen_at': change.previous_seen_at}, ensure_ascii=False))
+        return
+
+    print(f"🔍 {result['snapshot']} ({result['products']} products) against {len(result['compared_with'])} "
+          f"earlier snapshot(s) in {elapsed:.2f}s")
+    icons = {PRICE_DROP: '📉', NEW_ITEM: '🆕', RESTOCK: '📦'}
+    for kind in (PRICE_DROP, RESTOCK, NEW_ITEM):
+        selected = [change for change in changes if change.kind == kind]
+        print(f"\n{icons[kind]} {kind}: {len(selected)}")
+        for change in sorted(selected, key=lambda change: -(change.drop_percent or 0))[:50]:
+            row = rows.get(change.key, {})
+            detail = f"{change.previous_price} → {change.price} (-{change.drop_percent}%)" if kind == PRICE_DROP \
+                else f"{change.price}"
+            print(f"   {row.get('brand')} - {row.get('name')}: {detail}")
+        if len(selected) > 50:
+            print(f"   ... and {len(selected) - 50} more (--json lists them all)")
+
+
+if __name__ == '__main__':
+    main()
@@ -10,28 +10,40 @@ date
 # Activate virtual environment
 source venv/bin/activate
 
-# Scrape women's fashion - new arrivals, max 50€, on sale
+# Per-run metrics: events.jsonl, scraper.prom (Prometheus textfile) and summary.json
+RUN_ID=$(date +%Y%m%d-%H%M%S)
+METRICS_DIR="runs/$RUN_ID"
+
+# Scrape women's and men's fashion over plain HTTP, Chrome only as a fallback,
+# posting while later pages are still loading
+# - new arrivals, max 50€, newest first, stopping at the first page already seen yesterday
 echo ""
-echo "👗 Scraping women's fashion..."
-python zalando_selenium.py \
-  --category mode-femme \
+echo "👗👔 Scraping women's and men's fashion..."
+python zalando_scraper.py \
+  --stream \
+  --tiered \
+  --incremental \
+  --category mode-femme mode-homme \
   --new-arrivals 1 \
   --price-to 50 \
-  --order sale \
-  --limit 10
+  --limit 10 \
+  --metrics-dir "$METRICS_DIR"
 
-# Wait a bit
-sleep 5
+# Archive the run summary and publish the textfile for node_exporter if configured
+if [ -f "$METRICS_DIR/summary.json" ]; then
+  mkdir -p runs/summaries
+  cp "$METRICS_DIR/summary.json" "runs/summaries/summary-$RUN_ID.json"
+  if [ -n "$PROMETHEUS_TEXTFILE_DIR" ]; then
+    cp "$METRICS_DIR/scraper.prom" "$PROMETHEUS_TEXTFILE_DIR/infit_scraper.prom.$$" \
+      && mv "$PROMETHEUS_TEXTFILE_DIR/infit_scraper.prom.$$" "$PROMETHEUS_TEXTFILE_DIR/infit_scraper.prom"
+  fi
+fi
 
-# Scrape men's fashion - new arrivals, max 50€, on sale
-echo ""
-echo "👔 Scraping men's fashion..."
-python zalando_selenium.py \
-  --category mode-homme \
-  --new-arrivals 1 \
-  --price-to 50 \
-  --order sale \
-  --limit 10
+# Price drops, new items and restocks since the earlier catalog snapshots
+if [ -d runs/catalog ]; then
+  mkdir -p "$METRICS_DIR"
+  python catalog_snapshots.py diff --json > "$METRICS_DIR/catalog_changes.jsonl"
+fi
 
 echo ""
 echo "✅ Daily scraping complete!"
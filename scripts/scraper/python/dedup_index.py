@@ -0,0 +1,152 @@
+"""
+Local dedup index of products already posted to InFit
+Keeps a SQLite file keyed by Zalando SKU (or normalized product URL) so
+known products are dropped before any image download or database call
+"""
+
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+CACHE_DIR = Path(__file__).parent / '.cache'
+DEFAULT_PATH = CACHE_DIR / 'dedup.sqlite'
+
+# Zalando product pages end with the SKU, e.g. .../nike-sportswear-tee-shirt-NI122O0GH-Q11.html
+SKU_PATTERN = re.compile(r'-([a-z0-9]{9}-[a-z0-9]{3})\.html', re.IGNORECASE)
+
+# SQLite caps the number of bound parameters per statement
+CHUNK_SIZE = 500
+
+
+def extract_sku(url: str) -> Optional[str]:
+    """Zalando SKU from a product URL, or None"""
+    match = SKU_PATTERN.search(url or '')
+    return match.group(1).upper() if match else None
+
+
+def normalize_url(url: str) -> str:
+    """Lowercase host and path, drop query string, fragment and trailing slash"""
+    parsed = urlparse(url.strip())
+    host = (parsed.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    return f"{host}{parsed.path.rstrip('/').lower()}"
+
+
+def product_key(url: str) -> str:
+    """Stable dedup key for a product URL"""
+    sku = extract_sku(url)
+    return f"sku:{sku}" if sku else f"url:{normalize_url(url)}"
+
+
+class DedupIndex:
+    def __init__(self, path: Path = DEFAULT_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS posted (
+                key TEXT PRIMARY KEY,
+                product_url TEXT,
+                outfit_id TEXT,
+                posted_at REAL
+            )
+        """)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)')
+        self.conn.commit()
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM posted').fetchone()[0]
+
+    def known_keys(self, keys: Iterable[str]) -> set:
+        """Subset of `keys` already in the index (one query per chunk)"""
+        keys = list(keys)
+        found = set()
+
+        with self.lock:
+            for start in range(0, len(keys), CHUNK_SIZE):
+                chunk = keys[start:start + CHUNK_SIZE]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self.conn.execute(f'SELECT key FROM posted WHERE key IN ({placeholders})', chunk)
+                found.update(row[0] for row in rows)
+
+        return found
+
+    def filter_new(self, products: List[Dict]) -> List[Dict]:
+        """Drop products already posted, and duplicates within the batch itself"""
+        keyed = [(product_key(product['product_url']), product) for product in products]
+        known = self.known_keys(key for key, _ in keyed)
+
+        fresh = []
+        for key, product in keyed:
+            if key in known:
+                continue
+            known.add(key)
+            fresh.append(product)
+
+        return fresh
+
+    def mark_posted(self, product: Dict, outfit_id: Optional[str] = None):
+        """Record a product as posted"""
+        self.add_urls([product['product_url']], outfit_id)
+
+    def add_urls(self, urls: Iterable[str], outfit_id: Optional[str] = None) -> int:
+        """Record product URLs as posted, returns the number of new entries"""
+        now = time.time()
+        rows = [(product_key(url), url, outfit_id, now) for url in urls if url]
+
+        with self.lock:
+            before = self.conn.total_changes
+            self.conn.executemany('INSERT OR IGNORE INTO posted VALUES (?, ?, ?, ?)', rows)
+            self.conn.commit()
+            return self.conn.total_changes - before
+
+    def warm_from_supabase(self, supabase, force: bool = False, page_size: int = 1000) -> int:
+        """
+        Seed the index from `clothing_pieces.purchase_link`
+
+        Runs once per index file unless `force` is set. Returns the number of
+        products added.
+        """
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE name = 'warmed_at'").fetchone()
+        if row and not force:
+            print(f"♻️  Dedup index already warmed ({len(self)} products)")
+            return 0
+
+        print("♻️  Warming dedup index from clothing_pieces...")
+        added = 0
+        start = 0
+
+        while True:
+            result = supabase.table('clothing_pieces') \
+                .select('purchase_link') \
+                .not_.is_('purchase_link', 'null') \
+                .range(start, start + page_size - 1) \
+                .execute()
+
+            links = [item['purchase_link'] for item in result.data or []]
+            added += self.add_urls(links)
+
+            if len(links) < page_size:
+                break
+            start += page_size
+
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('warmed_at', ?)", (str(time.time()),))
+            self.conn.commit()
+
+        print(f"✅ Dedup index warmed: {added} products added")
+        return added
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,285 @@
+"""
+Pool of reusable headless Chrome drivers for the Selenium scraper
+Lets one process fan categories and pages out across N browsers, replacing
+drivers that crash or hang and recycling each one after K pages
+"""
+
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List, Optional, Sequence, Tuple
+
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.chrome.options import Options
+from webdriver_manager.chrome import ChromeDriverManager
+
+CARD_SELECTORS = ['article[data-testid="product-card"]', '.cat_articleCard']
+
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+# Resources a listing page does not need for product-card extraction (lean mode)
+BLOCKED_URL_PATTERNS = [
+    '*.jpg', '*.jpeg', '*.png', '*.gif', '*.webp', '*.avif', '*.svg', '*.ico',
+    '*.woff', '*.woff2', '*.ttf', '*.otf',
+    '*.mp4', '*.webm', '*.m3u8',
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*', '*googlesyndication.com*',
+    '*facebook.net*', '*facebook.com/tr*', '*connect.facebook*', '*hotjar.com*', '*criteo.*',
+    '*tiktok.com*', '*pinterest.com*', '*bat.bing.com*', '*snapchat.com*', '*optimizely.com*',
+    '*quantummetric.com*', '*newrelic.com*', '*nr-data.net*',
+]
+
+_chromedriver_path: Optional[str] = None
+_chromedriver_lock = threading.Lock()
+
+
+def chromedriver_path() -> str:
+    """Resolve (and download if needed) chromedriver once per process"""
+    global _chromedriver_path
+    with _chromedriver_lock:
+        if _chromedriver_path is None:
+            _chromedriver_path = ChromeDriverManager().install()
+        return _chromedriver_path
+
+
+def build_chrome_options(headless: bool = True, lean: bool = False) -> Options:
+    chrome_options = Options()
+    if headless:
+        chrome_options.add_argument('--headless=new')
+
+    if lean:
+        # Do not fetch or decode images, notifications, geolocation prompts...
+        chrome_options.add_argument('--blink-settings=imagesEnabled=false')
+        chrome_options.add_argument('--disable-extensions')
+        chrome_options.add_argument('--disable-background-networking')
+        chrome_options.add_argument('--mute-audio')
+        chrome_options.add_experimental_option('prefs', {
+            'profile.managed_default_content_settings.images': 2,
+            'profile.managed_default_content_settings.media_stream': 2,
+            'profile.managed_default_content_settings.notifications': 2,
+            'profile.managed_default_content_settings.geolocation': 2,
+            'profile.managed_default_content_settings.plugins': 2,
+            'profile.managed_default_content_settings.popups': 2,
+        })
+        # Listing HTML is usable as soon as the DOM is ready
+        chrome_options.page_load_strategy = 'eager'
+
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    chrome_options.add_argument('--disable-blink-features=AutomationControlled')
+    chrome_options.add_argument(f'--user-agent={USER_AGENT}')
+
+    # Disable automation flags
+    chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    chrome_options.add_experimental_option('useAutomationExtension', False)
+
+    return chrome_options
+
+
+def create_driver(headless: bool = True, page_load_timeout: int = 45, lean: bool = False) -> webdriver.Chrome:
+    """Start a Chrome driver configured like the Selenium scraper's"""
+    service = Service(chromedriver_path())
+    driver = webdriver.Chrome(service=service, options=build_chrome_options(headless, lean))
+
+    if lean:
+        # Block fonts, media, images and third-party trackers at the network layer
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
+
+    # A hung page raises TimeoutException instead of blocking the worker forever
+    driver.set_page_load_timeout(page_load_timeout)
+    driver.set_script_timeout(page_load_timeout)
+
+    # Remove webdriver property
+    driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+
+    return driver
+
+
+def wait_for_cards(driver, timeout: int = 20) -> str:
+    """Wait until any product-card selector matches and return that selector"""
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=0.2).until(EC.any_of(*(
+            EC.presence_of_element_located((By.CSS_SELECTOR, selector)) for selector in CARD_SELECTORS
+        )))
+    except TimeoutException:
+        return 'article'
+
+    for selector in CARD_SELECTORS:
+        if driver.find_elements(By.CSS_SELECTOR, selector):
+            return selector
+    return 'article'
+
+
+def scroll_until(driver, selector: str, target: Optional[int] = None, max_scrolls: int = 30,
+                 growth_timeout: float = 4.0) -> int:
+    """
+    Scroll to lazy-load product cards, returns the final card count
+
+    Stops as soon as `target` cards are on the page, or when a scroll does
+    not bring any new card within `growth_timeout` seconds.
+    """
+    count_cards = lambda d: len(d.find_elements(By.CSS_SELECTOR, selector))
+    count = count_cards(driver)
+
+    for _ in range(max_scrolls):
+        if target and count >= target:
+            break
+
+        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+        try:
+            WebDriverWait(driver, growth_timeout, poll_frequency=0.2).until(lambda d: count_cards(d) > count)
+        except TimeoutException:
+            break
+        count = count_cards(driver)
+
+    return count
+
+
+def load_listing(driver, url: str, target: Optional[int] = None) -> Tuple[str, str]:
+    """Load a listing page, scroll until `target` cards (or no growth), returns (selector, page source)"""
+    driver.get(url)
+    selector = wait_for_cards(driver)
+    scroll_until(driver, selector, target)
+    return selector, driver.page_source
+
+
+class PooledDriver:
+    def __init__(self, driver: webdriver.Chrome):
+        self.driver = driver
+        self.pages = 0
+
+    def alive(self) -> bool:
+        try:
+            self.driver.execute_script('return 1')
+            return True
+        except Exception:
+            return False
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception:
+            pass
+
+
+class DriverPool:
+    def __init__(self, size: int = 2, headless: bool = True, recycle_after: int = 20, page_load_timeout: int = 45,
+                 lean: bool = False):
+        """
+        Args:
+            size: Maximum number of Chrome instances
+            headless: Run Chrome without a window
+            recycle_after: Pages served before a driver is restarted (keeps memory in check)
+            page_load_timeout: Seconds before a page load counts as hung
+            lean: Block images, fonts, media and trackers (see BLOCKED_URL_PATTERNS)
+        """
+        self.size = max(1, size)
+        self.headless = headless
+        self.recycle_after = max(1, recycle_after)
+        self.page_load_timeout = page_load_timeout
+        self.lean = lean
+
+        self.idle: "queue.Queue[PooledDriver]" = queue.Queue()
+        self.live = 0
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def _acquire(self) -> PooledDriver:
+        while True:
+            try:
+                pooled = self.idle.get_nowait()
+            except queue.Empty:
+                with self.lock:
+                    can_start = self.live < self.size
+                    if can_start:
+                        self.live += 1
+
+                if can_start:
+                    try:
+                        return PooledDriver(create_driver(self.headless, self.page_load_timeout, self.lean))
+                    except Exception:
+                        with self.lock:
+                            self.live -= 1
+                        raise
+
+                # Pool is full: wait for a driver to come back (or a slot to free up)
+                try:
+                    pooled = self.idle.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+
+            if pooled.alive():
+                return pooled
+
+            # Crashed while idle: drop it and start a replacement
+            print("♻️  Replacing dead Chrome driver")
+            self._discard(pooled)
+
+    def _discard(self, pooled: PooledDriver):
+        pooled.quit()
+        with self.lock:
+            self.live -= 1
+
+    def _release(self, pooled: PooledDriver, broken: bool = False):
+        pooled.pages += 1
+
+        if broken or self.closed or pooled.pages >= self.recycle_after:
+            # The replacement is started lazily by the next _acquire
+            self._discard(pooled)
+        else:
+            self.idle.put(pooled)
+
+    @contextmanager
+    def driver(self):
+        """Lease a driver; it is replaced if the block raises and recycled after `recycle_after` pages"""
+        pooled = self._acquire()
+        try:
+            yield pooled.driver
+        except Exception:
+            self._release(pooled, broken=True)
+            raise
+        else:
+            self._release(pooled)
+
+    def imap(self, fn: Callable[[webdriver.Chrome, Any], Any], tasks: Sequence, retries: int = 1) -> Iterator[Any]:
+        """
+        Run fn(driver, task) for every task across the pool, yielding results in task order as they complete
+
+        A task whose driver crashes or hangs is retried on a fresh driver up to
+        `retries` times; its result is None if it still fails.
+        """
+        def run(task):
+            for attempt in range(retries + 1):
+                try:
+                    with self.driver() as driver:
+                        return fn(driver, task)
+                except Exception as e:
+                    print(f"   ⚠️  Driver task {task} failed (attempt {attempt + 1}/{retries + 1}): {e}")
+            return None
+
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            yield from executor.map(run, tasks)
+
+    def map(self, fn: Callable[[webdriver.Chrome, Any], Any], tasks: Sequence, retries: int = 1) -> List[Any]:
+        """Results of fn(driver, task) for every task, in task order (see imap)"""
+        return list(self.imap(fn, tasks, retries))
+
+    def close(self):
+        self.closed = True
+        while True:
+            try:
+                self._discard(self.idle.get_nowait())
+            except queue.Empty:
+                break
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,251 @@
+"""
+Persistent HTTP cache for the Zalando scrapers
+Stores GET responses (listing pages, product images) in a size-bounded SQLite
+file with LRU eviction and per-content-type TTLs. Stale entries are
+revalidated with ETag / Last-Modified, so an unchanged body is never
+downloaded twice.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional
+
+import httpx
+
+from dedup_index import CACHE_DIR
+from http_transport import HttpSession
+
+DEFAULT_PATH = CACHE_DIR / 'http.sqlite'
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Freshness per content type (longest matching prefix wins)
+DEFAULT_TTLS = {
+    'text/html': 15 * 60,
+    'application/json': 5 * 60,
+    'image/': 30 * 24 * 3600,
+}
+DEFAULT_TTL = 3600
+
+# Response headers kept with the body
+KEPT_HEADERS = ('content-type', 'etag', 'last-modified', 'cache-control')
+
+
+class CacheEntry(NamedTuple):
+    url: str
+    body: bytes
+    headers: Dict[str, str]
+    expires_at: float
+
+    @property
+    def fresh(self) -> bool:
+        return self.expires_at > time.time()
+
+    @property
+    def validators(self) -> Dict[str, str]:
+        """Conditional request headers for revalidation"""
+        validators = {}
+        if self.headers.get('etag'):
+            validators['If-None-Match'] = self.headers['etag']
+        if self.headers.get('last-modified'):
+            validators['If-Modified-Since'] = self.headers['last-modified']
+        return validators
+
+
+class HttpCache:
+    def __init__(self, path: Path = DEFAULT_PATH, max_bytes: int = DEFAULT_MAX_BYTES, ttls: Dict[str, float] = None,
+                 default_ttl: float = DEFAULT_TTL):
+        """
+        Args:
+            path: SQLite file holding the cached responses
+            max_bytes: Total body size kept before least recently used entries are evicted
+            ttls: Seconds an entry stays fresh, per content-type prefix
+            default_ttl: Freshness for content types not in `ttls`
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttls = ttls or DEFAULT_TTLS
+        self.default_ttl = default_ttl
+        self.stats = {'hits': 0, 'revalidated': 0, 'misses': 0}
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                headers TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self.conn.execute('CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)')
+        self.conn.commit()
+        self.total_bytes = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def ttl_for(self, content_type: Optional[str]) -> float:
+        content_type = (content_type or '').split(';')[0].strip().lower()
+        matches = [prefix for prefix in self.ttls if content_type.startswith(prefix)]
+        return self.ttls[max(matches, key=len)] if matches else self.default_ttl
+
+    def get(self, url: str) -> Optional[CacheEntry]:
+        with self.lock:
+            row = self.conn.execute('SELECT body, headers, expires_at FROM responses WHERE url = ?', (url,)).fetchone()
+            if not row:
+                return None
+            self.conn.execute('UPDATE responses SET last_used = ? WHERE url = ?', (time.time(), url))
+            self.conn.commit()
+        return CacheEntry(url, row[0], json.loads(row[1]), row[2])
+
+    def put(self, url: str, headers, body: bytes):
+        """Store a 200 response (skipped for no-store responses and bodies larger than the cache)"""
+        kept = {name: headers[name] for name in KEPT_HEADERS if headers.get(name)}
+        if 'no-store' in kept.get('cache-control', '') or len(body) > self.max_bytes:
+            return
+
+        now = time.time()
+        with self.lock:
+            previous = self.conn.execute('SELECT size FROM responses WHERE url = ?', (url,)).fetchone()
+            self.conn.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+                (url, body, json.dumps(kept), len(body), now + self.ttl_for(kept.get('content-type')), now)
+            )
+            self.total_bytes += len(body) - (previous[0] if previous else 0)
+            self._evict()
+            self.conn.commit()
+
+    def refresh(self, entry: CacheEntry, headers) -> CacheEntry:
+        """Extend an entry after a 304 Not Modified, picking up new validators"""
+        kept = {**entry.headers, **{name: headers[name] for name in KEPT_HEADERS if headers.get(name)}}
+        expires_at = time.time() + self.ttl_for(kept.get('content-type'))
+        with self.lock:
+            self.conn.execute(
+                'UPDATE responses SET headers = ?, expires_at = ?, last_used = ? WHERE url = ?',
+                (json.dumps(kept), expires_at, time.time(), entry.url)
+            )
+            self.conn.commit()
+        return entry._replace(headers=kept, expires_at=expires_at)
+
+    def count(self, result: str):
+        """Count a response served from the cache ('hits'), revalidated or downloaded (callers run on several threads)"""
+        with self.lock:
+            self.stats[result] += 1
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits again (lock held)"""
+        while self.total_bytes > self.max_bytes:
+            rows = self.conn.execute('SELECT url, size FROM responses ORDER BY last_used LIMIT 64').fetchall()
+            if not rows:
+                self.total_bytes = 0
+                return
+            for url, size in rows:
+                self.conn.execute('DELETE FROM responses WHERE url = ?', (url,))
+                self.total_bytes -= size
+                if self.total_bytes <= self.max_bytes:
+                    return
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def cached_response(entry: CacheEntry) -> httpx.Response:
+    """httpx.Response served from the cache"""
+    response = httpx.Response(200, headers=entry.headers, content=entry.body, request=httpx.Request('GET', entry.url))
+    response.from_cache = True
+    return response
+
+
+class CachedSession(HttpSession):
+    """HttpSession whose GETs go through an HttpCache"""
+
+    def __init__(self, cache: HttpCache, headers: Dict[str, str] = None):
+        super().__init__(headers)
+        self.cache = cache
+
+    def cached_response(self, method: str, url: str) -> Optional[httpx.Response]:
+        """Fresh cached response for a GET, None when the network is needed"""
+        if method.upper() != 'GET':
+            return None
+        entry = self.cache.get(url)
+        if entry and entry.fresh:
+            self.cache.count('hits')
+            return cached_response(entry)
+        return None
+
+    def request(self, method, url, *args, **kwargs):
+        # Streamed bodies are consumed by the caller, never held whole to be cached
+        if method.upper() != 'GET' or kwargs.get('stream'):
+            return super().request(method, url, *args, **kwargs)
+
+        entry = self.cache.get(url)
+        if entry and entry.fresh:
+            self.cache.count('hits')
+            return cached_response(entry)
+
+        if entry:
+            kwargs['headers'] = {**(kwargs.get('headers') or {}), **entry.validators}
+
+        response = super().request(method, url, *args, **kwargs)
+
+        if entry and response.status_code == 304:
+            self.cache.count('revalidated')
+            return cached_response(self.cache.refresh(entry, response.headers))
+
+        self.cache.count('misses')
+        if response.status_code == 200:
+            self.cache.put(url, response.headers, response.content)
+        return response
+
+
+class CachingTransport(httpx.AsyncBaseTransport):
+    """httpx transport serving GETs from an HttpCache, for the async posting engine"""
+
+    def __init__(self, cache: HttpCache, transport: httpx.AsyncBaseTransport = None, **transport_options):
+        self.cache = cache
+        self.transport = transport or httpx.AsyncHTTPTransport(**transport_options)
+
+    def _cached(self, entry: CacheEntry, request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, headers=entry.headers, content=entry.body, request=request)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        # Streamed transfers (extensions={'cache': False}) must not be read into memory to be cached
+        if request.method != 'GET' or request.extensions.get('cache') is False:
+            return await self.transport.handle_async_request(request)
+
+        url = str(request.url)
+        entry = self.cache.get(url)
+        if entry and entry.fresh:
+            self.cache.count('hits')
+            return self._cached(entry, request)
+
+        if entry:
+            for name, value in entry.validators.items():
+                request.headers[name] = value
+
+        response = await self.transport.handle_async_request(request)
+
+        if entry and response.status_code == 304:
+            await response.aclose()
+            self.cache.count('revalidated')
+            return self._cached(self.cache.refresh(entry, response.headers), request)
+
+        self.cache.count('misses')
+        if response.status_code != 200:
+            return response
+
+        body = await response.aread()
+        await response.aclose()
+        self.cache.put(url, response.headers, body)
+        # The body was decoded by aread(); do not let the client decode it again
+        headers = [(name, value) for name, value in response.headers.items()
+                   if name.lower() not in ('content-encoding', 'content-length', 'transfer-encoding')]
+        return httpx.Response(200, headers=headers, content=body, request=request)
+
+    async def aclose(self):
+        await self.transport.aclose()
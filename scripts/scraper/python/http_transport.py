@@ -0,0 +1,173 @@
+"""
+Shared HTTP transport for the Zalando scrapers
+One httpx client per process carries every request of both scrapers:
+listing and product pages, the image CDN and Supabase Storage. Each host
+family gets its own keep-alive pool (HOST_POOLS), multiplexed over HTTP/2
+when h2 is installed, so after the first image a download costs one round
+trip instead of a TCP + TLS handshake.
+
+Accept-Encoding only advertises codecs this process can decode. Connection
+reuse is counted per request (http_connections{reused}) and decoded sizes of
+compressed bodies next to their wire size (see metrics.Metrics.http).
+"""
+
+import threading
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+from metrics import get_metrics
+
+
+def _installed(*modules: str) -> bool:
+    for module in modules:
+        try:
+            __import__(module)
+            return True
+        except ImportError:
+            pass
+    return False
+
+
+# HTTP/2 needs the h2 package (httpx[http2]); without it every pool falls back to HTTP/1.1 keep-alive
+HTTP2 = _installed('h2')
+
+# httpx decodes br only with brotli or brotlicffi installed: never ask for what we cannot read
+ACCEPT_ENCODING = 'gzip, deflate, br' if _installed('brotli', 'brotlicffi') else 'gzip, deflate'
+
+# (max connections, max idle keep-alive connections, HTTP/2) matched against the end of the host name
+HOST_POOLS: Dict[str, Tuple[int, int, bool]] = {
+    'zalando.fr': (4, 4, True),
+    'ztat.net': (8, 8, True),
+    'supabase.co': (16, 16, True),
+}
+DEFAULT_POOL: Tuple[int, int, bool] = (16, 8, True)
+
+# Idle connections are closed after this many seconds
+KEEPALIVE_EXPIRY = 30.0
+
+DEFAULT_TIMEOUT = 30.0
+
+
+class MeteredTransport(httpx.BaseTransport):
+    """Counts, per host and HTTP version, requests sent on a new connection vs a reused one"""
+
+    def __init__(self, transport: httpx.BaseTransport):
+        self.transport = transport
+        self.metrics = get_metrics()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        opened = []
+        traced = request.extensions.get('trace')
+
+        def trace(event: str, info: dict):
+            if event == 'connection.connect_tcp.complete':
+                opened.append(event)
+            if traced:
+                traced(event, info)
+
+        request.extensions = {**request.extensions, 'trace': trace}
+        response = self.transport.handle_request(request)
+        count_connection(self.metrics, request, response, bool(opened))
+        return response
+
+    def close(self):
+        self.transport.close()
+
+
+class MeteredAsyncTransport(httpx.AsyncBaseTransport):
+    """MeteredTransport for httpx.AsyncClient (the async posting engine)"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self.transport = transport
+        self.metrics = get_metrics()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        opened = []
+        traced = request.extensions.get('trace')
+
+        async def trace(event: str, info: dict):
+            if event == 'connection.connect_tcp.complete':
+                opened.append(event)
+            if traced:
+                await traced(event, info)
+
+        request.extensions = {**request.extensions, 'trace': trace}
+        response = await self.transport.handle_async_request(request)
+        count_connection(self.metrics, request, response, bool(opened))
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def count_connection(metrics, request: httpx.Request, response: httpx.Response, opened: bool):
+    version = response.extensions.get('http_version', b'').decode() or 'HTTP/1.1'
+    metrics.count('http_connections', host=request.url.host, version=version, reused='no' if opened else 'yes')
+
+
+def _limits(pool: Tuple[int, int, bool]) -> httpx.Limits:
+    connections, keepalive, _ = pool
+    return httpx.Limits(max_connections=connections, max_keepalive_connections=keepalive,
+                        keepalive_expiry=KEEPALIVE_EXPIRY)
+
+
+def build_client(timeout: float = DEFAULT_TIMEOUT) -> httpx.Client:
+    """Client with one metered keep-alive pool per HOST_POOLS entry and one for every other host"""
+    mounts = {
+        f"all://*{suffix}": MeteredTransport(httpx.HTTPTransport(limits=_limits(pool), http2=HTTP2 and pool[2]))
+        for suffix, pool in HOST_POOLS.items()
+    }
+    transport = MeteredTransport(httpx.HTTPTransport(limits=_limits(DEFAULT_POOL), http2=HTTP2 and DEFAULT_POOL[2]))
+    return httpx.Client(transport=transport, mounts=mounts, timeout=timeout, follow_redirects=True,
+                        headers={'Accept-Encoding': ACCEPT_ENCODING})
+
+
+def build_async_client(timeout: float = DEFAULT_TIMEOUT, wrap=None) -> httpx.AsyncClient:
+    """
+    AsyncClient for the async posting engine, with the same per-host pools (HOST_POOLS) as the shared client
+
+    `wrap` receives each metered transport and returns the one to use (the HTTP cache).
+    """
+    def transport(pool: Tuple[int, int, bool]) -> httpx.AsyncBaseTransport:
+        metered = MeteredAsyncTransport(httpx.AsyncHTTPTransport(limits=_limits(pool), http2=HTTP2 and pool[2]))
+        return wrap(metered) if wrap else metered
+
+    mounts = {f"all://*{suffix}": transport(pool) for suffix, pool in HOST_POOLS.items()}
+    return httpx.AsyncClient(transport=transport(DEFAULT_POOL), mounts=mounts, timeout=timeout,
+                             follow_redirects=True, headers={'Accept-Encoding': ACCEPT_ENCODING})
+
+
+class HttpSession:
+    """
+    Per-scraper view of the shared client: its own default headers, the pools of everyone
+
+    request() takes httpx keyword arguments plus stream=True, which returns
+    the response unread (iterate it with iter_bytes() and close() it).
+    """
+
+    def __init__(self, headers: Dict[str, str] = None, client: httpx.Client = None):
+        self.client = client or get_http_client()
+        self.headers = httpx.Headers(headers or {})
+
+    def request(self, method: str, url: str, stream: bool = False, headers: Dict[str, str] = None, **kwargs):
+        merged = httpx.Headers(self.headers)
+        merged.update(headers or {})
+        request = self.client.build_request(method, url, headers=merged, **kwargs)
+        return self.client.send(request, stream=stream)
+
+    def get(self, url: str, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+
+_shared_client: Optional[httpx.Client] = None
+_client_lock = threading.Lock()
+
+
+def get_http_client() -> httpx.Client:
+    """Process-wide client, so every scraper in a run shares the same connection pools"""
+    global _shared_client
+    with _client_lock:
+        if _shared_client is None:
+            _shared_client = build_client()
+        return _shared_client
@@ -0,0 +1,211 @@
+"""
+Perceptual-hash index of posted product images
+The same garment shows up under several listing cards, colour variants and
+merchants with different URLs. A 64-bit pHash (or dHash) of each downloaded
+image is compared with every hash already posted, with one vectorized XOR +
+popcount over a NumPy array, so near-duplicates are caught before any upload
+or insert even with hundreds of thousands of stored hashes.
+
+Hashes are kept in memory as a uint64 array and snapshotted to a .npy file;
+the product key and outfit id of each hash live in SQLite next to it.
+"""
+
+import io
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from dedup_index import CACHE_DIR, product_key
+
+SKIP = 'skip'
+LINK = 'link'
+
+# Default maximum Hamming distance (out of 64 bits) for two images to count as the same garment
+DEFAULT_THRESHOLD = 6
+
+# New hashes written to the .npy snapshot every this many additions (SQLite has them all anyway)
+SNAPSHOT_EVERY = 1000
+
+# Bits set in each byte value, for NumPy versions without bitwise_count
+POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+
+def _pixels(data: bytes, width: int, height: int) -> np.ndarray:
+    """Grayscale pixels of an image shrunk to width x height"""
+    image = Image.open(io.BytesIO(data))
+    if image.format == 'JPEG':
+        # Let the decoder downscale while decoding: the hash only needs a thumbnail
+        image.draft('L', (width * 8, height * 8))
+    return np.asarray(image.convert('L').resize((width, height), Image.BILINEAR), dtype=np.float32)
+
+
+def _pack(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.astype(np.uint8).ravel()).tobytes(), 'big')
+
+
+def dhash(data: bytes) -> int:
+    """
+    64-bit difference hash: is each pixel brighter than its right neighbour (9x8 thumbnail)
+
+    Cheaper than phash, but packshots on large white backgrounds share most of
+    their bits, so it needs a lower threshold.
+    """
+    pixels = _pixels(data, 9, 8)
+    return _pack(pixels[:, 1:] > pixels[:, :-1])
+
+
+def _dct_matrix(size: int) -> np.ndarray:
+    rows = np.arange(size)[:, None]
+    cols = np.arange(size)[None, :]
+    matrix = np.cos(np.pi * (2 * cols + 1) * rows / (2 * size)) * np.sqrt(2 / size)
+    matrix[0] /= np.sqrt(2)
+    return matrix.astype(np.float32)
+
+
+DCT_32 = _dct_matrix(32)
+
+
+def phash(data: bytes) -> int:
+    """64-bit perceptual hash: low-frequency DCT coefficients of a 32x32 thumbnail against their median"""
+    pixels = _pixels(data, 32, 32)
+    low = (DCT_32 @ pixels @ DCT_32.T)[:8, :8]
+    return _pack(low > np.median(low.ravel()[1:]))
+
+
+HASHES: Dict[str, Callable[[bytes], int]] = {'phash': phash, 'dhash': dhash}
+
+
+def hamming_distances(hashes: np.ndarray, image_hash: int) -> np.ndarray:
+    """Bits differing between `image_hash` and every entry of a uint64 array"""
+    xor = np.bitwise_xor(hashes, np.uint64(image_hash))
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(xor)
+    return POPCOUNT[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def _signed(value: int) -> int:
+    """uint64 as the signed 64-bit integer SQLite stores"""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+class NearDuplicateIndex:
+    def __init__(self, kind: str = 'phash', threshold: Optional[int] = None, action: str = SKIP,
+                 directory: Path = CACHE_DIR):
+        """
+        Args:
+            kind: Hash function (phash or dhash); each kind has its own index files
+            threshold: Maximum Hamming distance for a near-duplicate (None: DEFAULT_THRESHOLD)
+            action: What the scrapers do with a near-duplicate: skip it, or link it to the existing post
+            directory: Where image_hashes_<kind>.sqlite / .npy are kept
+        """
+        self.hash = HASHES[kind]
+        self.threshold = DEFAULT_THRESHOLD if threshold is None else threshold
+        self.action = action
+        self.npy_path = Path(directory) / f"image_hashes_{kind}.npy"
+        self.db_path = Path(directory) / f"image_hashes_{kind}.sqlite"
+        self.npy_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS hashes (
+                pos INTEGER PRIMARY KEY,
+                hash INTEGER NOT NULL,
+                key TEXT NOT NULL,
+                outfit_id TEXT,
+                added_at REAL
+            )
+        """)
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_hashes_key ON hashes(key)')
+        self.conn.commit()
+
+        self.hashes, self.size = self._load()
+        self.snapshot_size = self.size
+
+        # Keys hashed by this process and not posted yet
+        self.in_flight = set()
+
+    def _load(self) -> Tuple[np.ndarray, int]:
+        """Hashes from the .npy snapshot, plus the rows SQLite got after it was written"""
+        stored = self.conn.execute('SELECT COUNT(*) FROM hashes').fetchone()[0]
+        snapshot = np.load(self.npy_path) if self.npy_path.exists() else np.empty(0, dtype=np.uint64)
+        snapshot = snapshot[:stored]
+
+        rows = self.conn.execute('SELECT hash FROM hashes WHERE pos >= ? ORDER BY pos', (len(snapshot),))
+        tail = np.fromiter((row[0] for row in rows), dtype=np.int64).view(np.uint64)
+
+        hashes = np.empty(max(1024, 2 * stored), dtype=np.uint64)
+        hashes[:len(snapshot)] = snapshot
+        hashes[len(snapshot):stored] = tail
+        return hashes, stored
+
+    def find(self, image_hash: int, product: Dict) -> Optional[Tuple[str, Optional[str], int]]:
+        """
+        Closest stored image within the threshold, as (product key, outfit id, distance)
+
+        The outfit id is None while this process is still posting the match.
+        The product's own hash (a retried product) is not a near-duplicate, nor
+        is a product an earlier run hashed but never managed to post.
+        """
+        with self.lock:
+            if not self.size:
+                return None
+            distances = hamming_distances(self.hashes[:self.size], image_hash)
+            pos = int(np.argmin(distances))
+            distance = int(distances[pos])
+            if distance > self.threshold:
+                return None
+            key, outfit_id = self.conn.execute('SELECT key, outfit_id FROM hashes WHERE pos = ?', (pos,)).fetchone()
+            if key == product_key(product['product_url']) or (outfit_id is None and key not in self.in_flight):
+                return None
+        return key, outfit_id, distance
+
+    def add(self, image_hash: int, product: Dict):
+        """Store the hash of a product's image before it is posted (the outfit id is filled in by posted())"""
+        key = product_key(product['product_url'])
+        with self.lock:
+            self.in_flight.add(key)
+            if self.conn.execute('SELECT 1 FROM hashes WHERE key = ?', (key,)).fetchone():
+                return
+            if self.size == len(self.hashes):
+                grown = np.empty(2 * len(self.hashes), dtype=np.uint64)
+                grown[:self.size] = self.hashes[:self.size]
+                self.hashes = grown
+            self.hashes[self.size] = image_hash
+            self.conn.execute('INSERT INTO hashes VALUES (?, ?, ?, NULL, ?)',
+                              (self.size, _signed(image_hash), key, time.time()))
+            self.conn.commit()
+            self.size += 1
+            snapshot = self.size - self.snapshot_size >= SNAPSHOT_EVERY
+
+        if snapshot:
+            self.save()
+
+    def posted(self, product: Dict, outfit_id: str):
+        """Record the outfit a hashed product was posted as, so later near-duplicates can link to it"""
+        key = product_key(product['product_url'])
+        with self.lock:
+            self.in_flight.discard(key)
+            self.conn.execute('UPDATE hashes SET outfit_id = ? WHERE key = ? AND outfit_id IS NULL', (outfit_id, key))
+            self.conn.commit()
+
+    def save(self):
+        """Write the .npy snapshot (atomically) so the next run loads the hashes without reading SQLite"""
+        with self.lock:
+            hashes = self.hashes[:self.size].copy()
+        tmp_path = self.npy_path.with_suffix('.tmp.npy')
+        np.save(tmp_path, hashes)
+        os.replace(tmp_path, self.npy_path)
+        self.snapshot_size = len(hashes)
+
+    def close(self):
+        self.save()
+        with self.lock:
+            self.conn.close()
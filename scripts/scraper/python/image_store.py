@@ -0,0 +1,241 @@
+"""
+Content-addressed image storage for scraped products
+Images are stored under the SHA-256 of their bytes, so identical images are
+uploaded once and reused across products, colours and runs. transfer()
+streams an image from the CDN to Storage without holding it in memory (see
+image_transfer.py).
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+
+from dedup_index import CACHE_DIR
+from metrics import get_metrics, host_of
+
+DEFAULT_PATH = CACHE_DIR / 'images.sqlite'
+BUCKET = 'outfits'
+
+# How long a source URL is trusted to still serve the image stored for it
+SOURCE_TTL_SECONDS = 30 * 24 * 3600
+
+
+def sniff_image_type(data: bytes) -> Tuple[str, str]:
+    """(content type, extension) from the image's magic bytes, JPEG if unknown"""
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'image/png', 'png'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp', 'webp'
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif', 'gif'
+    if data[4:12] in (b'ftypavif', b'ftypavis'):
+        return 'image/avif', 'avif'
+    return 'image/jpeg', 'jpg'
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def content_path(digest: str, extension: str = 'jpg') -> str:
+    """Storage path for a content hash (two-level fan-out keeps folders small)"""
+    return f"scraped/{digest[:2]}/{digest}.{extension}"
+
+
+def public_url(supabase_url: str, path: str, bucket: str = BUCKET) -> str:
+    return f"{supabase_url.rstrip('/')}/storage/v1/object/public/{bucket}/{path}"
+
+
+class KnownImages:
+    """Local cache of hashes already present in Supabase Storage, per Supabase project"""
+
+    def __init__(self, supabase_url: str, path: Path = DEFAULT_PATH):
+        """
+        Args:
+            supabase_url: Project the cached objects live in (staging and production never share entries)
+            path: SQLite file, shared by every project
+        """
+        self.project = supabase_url.rstrip('/')
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(images)')]
+        if columns and 'project' not in columns:
+            # Written before entries were keyed by project: nothing says which project they belong to
+            self.conn.execute('DROP TABLE images')
+            self.conn.execute('DROP TABLE IF EXISTS sources')
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS images (
+                project TEXT NOT NULL,
+                path TEXT NOT NULL,
+                public_url TEXT NOT NULL,
+                stored_at REAL,
+                PRIMARY KEY (project, path)
+            )
+        """)
+        # Storage path of each CDN URL transferred, so a re-run needs no download to find it
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS sources (
+                project TEXT NOT NULL,
+                source_url TEXT NOT NULL,
+                path TEXT NOT NULL,
+                stored_at REAL,
+                PRIMARY KEY (project, source_url)
+            )
+        """)
+        self.conn.commit()
+
+    def get(self, path: str) -> Optional[str]:
+        with self.lock:
+            row = self.conn.execute('SELECT public_url FROM images WHERE project = ? AND path = ?',
+                                    (self.project, path)).fetchone()
+        return row[0] if row else None
+
+    def add(self, path: str, url: str):
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?)',
+                              (self.project, path, url, time.time()))
+            self.conn.commit()
+
+    def source(self, source_url: str) -> Optional[str]:
+        """Public URL of the image transferred from `source_url`, None if unknown or expired"""
+        with self.lock:
+            row = self.conn.execute("""
+                SELECT images.public_url FROM sources
+                JOIN images ON images.project = sources.project AND images.path = sources.path
+                WHERE sources.project = ? AND sources.source_url = ? AND sources.stored_at > ?
+            """, (self.project, source_url, time.time() - SOURCE_TTL_SECONDS)).fetchone()
+        return row[0] if row else None
+
+    def add_source(self, source_url: str, path: str):
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)',
+                              (self.project, source_url, path, time.time()))
+            self.conn.commit()
+
+
+class ImageStore:
+    def __init__(self, supabase, supabase_url: str, session, rate_limiter, known: KnownImages = None,
+                 bucket: str = BUCKET, supabase_key: str = None, buffers: int = 8):
+        """
+        Args:
+            supabase: Supabase client used for uploads
+            supabase_url: Project URL, used to build public URLs
+            session: HttpSession used for downloads and existence checks
+            rate_limiter: HostRateLimiter shared with the scraper
+            known: Local hash cache (defaults to this project's entries in .cache/images.sqlite)
+            supabase_key: Service key for resumable uploads of large images
+            buffers: Chunk buffers shared by concurrent transfers (bounds their memory)
+        """
+        from image_transfer import BufferPool
+
+        self.supabase = supabase
+        self.supabase_url = supabase_url
+        self.supabase_key = supabase_key
+        self.session = session
+        self.rate_limiter = rate_limiter
+        self.known = known or KnownImages(supabase_url)
+        self.bucket = bucket
+        self.pool = BufferPool(buffers)
+        self.metrics = get_metrics()
+
+    def exists(self, path: str) -> bool:
+        """Check whether an object is already in the bucket (HEAD on its public URL)"""
+        url = public_url(self.supabase_url, path, self.bucket)
+        try:
+            response = self.rate_limiter.request(self.session, 'HEAD', url, timeout=10)
+            return response.status_code == 200
+        except Exception:
+            return False
+
+    def put(self, data: bytes, content_type: str = None, extension: str = None) -> str:
+        """Store image bytes and return their public URL, skipping the upload if already stored"""
+        if content_type is None:
+            content_type, extension = sniff_image_type(data)
+
+        path = content_path(content_hash(data), extension)
+        return self._store(path, len(data), lambda: self.supabase.storage.from_(self.bucket).upload(
+            path, data, {'content-type': content_type}
+        ))
+
+    def transfer(self, image_url: str) -> str:
+        """
+        Stream an image from the CDN into Storage and return its public URL
+
+        The download is spooled to a temporary file while it is hashed, then
+        uploaded from that file (resumably above RESUMABLE_BYTES), so only
+        pooled chunk buffers are ever in memory.
+        """
+        from image_transfer import RESUMABLE_BYTES, spool_response, upload_resumable
+
+        known = self.known.source(image_url)
+        if known:
+            print(f"      ♻️  Image already stored ({image_url})")
+            self.metrics.count('images_reused', source='source_url')
+            return known
+
+        response = self.rate_limiter.request(self.session, 'GET', image_url, stream=True, timeout=30)
+        if response.is_error:
+            response.close()
+            response.raise_for_status()
+        if getattr(response, 'from_cache', False):
+            # Served by the HTTP cache: the bytes are already in memory
+            data = response.content
+            content_type, extension = sniff_image_type(data)
+            url = self.put(data, content_type, extension)
+            self.known.add_source(image_url, content_path(content_hash(data), extension))
+            return url
+
+        image = spool_response(response, self.pool)
+        try:
+            path = content_path(image.digest, image.extension)
+            resumable = image.size >= RESUMABLE_BYTES and self.supabase_key
+
+            def upload():
+                if resumable:
+                    upload_resumable(self.session, self.rate_limiter, self.supabase_url, self.supabase_key,
+                                     self.bucket, path, image, self.pool)
+                    return
+                with open(image.path, 'rb') as file:
+                    self.supabase.storage.from_(self.bucket).upload(path, file, {'content-type': image.content_type})
+
+            # Resumable chunks go through the rate limiter, which already counts their bytes
+            url = self._store(path, 0 if resumable else image.size, upload)
+        finally:
+            image.discard()
+
+        self.known.add_source(image_url, path)
+        return url
+
+    def _store(self, path: str, size: int, upload: Callable[[], None]) -> str:
+        """Run `upload` unless `path` is already stored, and return the public URL"""
+        cached = self.known.get(path)
+        if cached:
+            print(f"      ♻️  Image already stored ({path})")
+            self.metrics.count('images_reused', source='local')
+            return cached
+
+        url = public_url(self.supabase_url, path, self.bucket)
+
+        if self.exists(path):
+            print(f"      ♻️  Image already stored ({path})")
+            self.metrics.count('images_reused', source='storage')
+        else:
+            try:
+                with self.metrics.timer('storage_upload'), self.rate_limiter.guard(self.supabase_url):
+                    upload()
+                if size:
+                    self.metrics.count('http_bytes', size, host=host_of(self.supabase_url), direction='out')
+            except Exception as e:
+                # Another run uploaded the same content in the meantime
+                if 'Duplicate' not in str(e) and '409' not in str(e):
+                    raise
+
+        self.known.add(path, url)
+        return url
@@ -0,0 +1,118 @@
+"""
+Image transcoding stage for scraped products
+Decodes each CDN image once and produces resized WebP/JPEG variants in a
+process pool, so the feed no longer downloads full-size originals
+"""
+
+import asyncio
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import List, Dict, Iterable, Iterator, Sequence
+
+from PIL import Image, ImageOps
+
+# Target widths, largest first: the first variant becomes outfits.image_url
+WIDTHS = (1080, 640, 320)
+
+# EXIF Orientation values that turn the stored image by 90 or 270 degrees
+ORIENTATION_TAG = 0x0112
+ROTATED = (5, 6, 7, 8)
+
+FORMATS = {
+    'webp': ('WEBP', 'image/webp', 'webp'),
+    'jpeg': ('JPEG', 'image/jpeg', 'jpg'),
+}
+
+
+def transcode(data: bytes, widths: Sequence[int] = WIDTHS, image_format: str = 'webp',
+              quality: int = 80) -> List[Dict]:
+    """
+    Decode an image once and encode it at each target width
+
+    The image is first turned upright according to its EXIF Orientation tag.
+    Widths larger than the source are collapsed into a single variant at the
+    source width. Each smaller variant is resized from the previous one, which
+    is much cheaper than resizing from the original every time.
+
+    Returns a list of {'width', 'height', 'data', 'content_type', 'extension'},
+    largest first.
+    """
+    pil_format, content_type, extension = FORMATS[image_format]
+    widths = sorted(set(widths), reverse=True)
+
+    image = Image.open(io.BytesIO(data))
+    rotated = image.getexif().get(ORIENTATION_TAG) in ROTATED
+    upright_width = image.height if rotated else image.width
+
+    # Let the JPEG decoder downscale by 1/2, 1/4 or 1/8 while decoding
+    if image.format == 'JPEG' and upright_width > widths[0]:
+        scale = widths[0] / upright_width
+        image.draft('RGB', (round(image.width * scale), round(image.height * scale)))
+
+    image = ImageOps.exif_transpose(image).convert('RGB')
+
+    variants = []
+    for width in widths:
+        if width < image.width:
+            height = round(image.height * width / image.width)
+            image = image.resize((width, height), Image.LANCZOS)
+        elif variants:
+            # Source narrower than this width: already covered by the previous variant
+            continue
+
+        buffer = io.BytesIO()
+        if pil_format == 'JPEG':
+            image.save(buffer, pil_format, quality=quality, optimize=True, progressive=True)
+        else:
+            image.save(buffer, pil_format, quality=quality, method=4)
+
+        variants.append({
+            'width': image.width,
+            'height': image.height,
+            'data': buffer.getvalue(),
+            'content_type': content_type,
+            'extension': extension
+        })
+
+    return variants
+
+
+class Transcoder:
+    def __init__(self, workers: int = None, widths: Sequence[int] = WIDTHS, image_format: str = 'webp',
+                 quality: int = 80):
+        """
+        Args:
+            workers: Number of worker processes (defaults to the CPU count)
+            widths: Target widths in pixels
+            image_format: 'webp' or 'jpeg'
+            quality: Encoder quality (0-100)
+        """
+        if image_format not in FORMATS:
+            raise ValueError(f"Unsupported image format: {image_format}")
+
+        self.workers = workers or os.cpu_count() or 1
+        self.job = partial(transcode, widths=tuple(widths), image_format=image_format, quality=quality)
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+
+    def transcode(self, data: bytes) -> List[Dict]:
+        """Transcode one image in the pool and wait for its variants"""
+        return self.pool.submit(self.job, data).result()
+
+    async def transcode_async(self, data: bytes) -> List[Dict]:
+        """Transcode one image in the pool without blocking the event loop"""
+        return await asyncio.get_running_loop().run_in_executor(self.pool, self.job, data)
+
+    def map(self, images: Iterable[bytes]) -> Iterator[List[Dict]]:
+        """Transcode many images in parallel, results in input order"""
+        return self.pool.map(self.job, images)
+
+    def close(self):
+        self.pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,319 @@
+"""
+Streaming image transfer from the CDN to Supabase Storage
+Images are copied chunk by chunk through a temporary file instead of being
+held in memory: the content hash (the storage path) is computed while the
+download streams in, then the upload streams the file back out. Files above
+RESUMABLE_BYTES go through Storage's resumable (TUS) endpoint, in chunks that
+are resumed from the server's offset after a failure.
+
+Chunks are read into buffers from a bounded pool, so memory stays flat
+whatever the image size or the number of transfers in flight; a transfer
+waits for a free buffer instead of allocating one.
+"""
+
+import asyncio
+import base64
+import hashlib
+import os
+import queue
+import tempfile
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Dict, Iterator, NamedTuple, Optional
+from urllib.parse import urljoin
+
+from image_store import sniff_image_type
+
+# Read / write size of each streamed chunk
+CHUNK_BYTES = 64 * 1024
+
+# Uploads at least this large use the resumable endpoint (Storage's own recommendation)
+RESUMABLE_BYTES = 6 * 1024 * 1024
+
+# Size of each resumable PATCH (Storage only accepts 6 MB chunks)
+RESUMABLE_CHUNK_BYTES = 6 * 1024 * 1024
+
+# Attempts per resumable chunk before giving up
+RESUMABLE_ATTEMPTS = 3
+
+
+class SpooledImage(NamedTuple):
+    """A downloaded image waiting in a temporary file"""
+    path: str
+    size: int
+    digest: str
+    content_type: str
+    extension: str
+
+    def discard(self):
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+class BufferPool:
+    """Fixed set of reusable chunk buffers shared by every transfer (threads)"""
+
+    def __init__(self, buffers: int = 8, size: int = CHUNK_BYTES):
+        self.size = size
+        self.free = queue.Queue()
+        for _ in range(max(1, buffers)):
+            self.free.put(bytearray(size))
+
+    @contextmanager
+    def buffer(self) -> Iterator[memoryview]:
+        """Borrow a buffer, blocking while all of them are in use"""
+        buffer = self.free.get()
+        try:
+            yield memoryview(buffer)
+        finally:
+            self.free.put(buffer)
+
+
+class AsyncBufferPool:
+    """BufferPool for the async posting engine (waiting does not block the event loop)"""
+
+    def __init__(self, buffers: int = 8, size: int = CHUNK_BYTES):
+        self.size = size
+        self.buffers = max(1, buffers)
+        self.free: Optional[asyncio.Queue] = None
+
+    @asynccontextmanager
+    async def buffer(self) -> AsyncIterator[memoryview]:
+        if self.free is None:
+            # Created lazily so the queue belongs to the running loop
+            self.free = asyncio.Queue()
+            for _ in range(self.buffers):
+                self.free.put_nowait(bytearray(self.size))
+        buffer = await self.free.get()
+        try:
+            yield memoryview(buffer)
+        finally:
+            self.free.put_nowait(buffer)
+
+
+class Spooler:
+    """Writes a download to a temporary file, hashing and sniffing it on the way"""
+
+    def __init__(self):
+        handle, self.path = tempfile.mkstemp(prefix='infit-image-')
+        self.file = os.fdopen(handle, 'wb')
+        self.hash = hashlib.sha256()
+        self.head = b''
+        self.size = 0
+
+    def write(self, chunk):
+        if len(self.head) < 16:
+            self.head += bytes(chunk[:16 - len(self.head)])
+        self.hash.update(chunk)
+        self.file.write(chunk)
+        self.size += len(chunk)
+
+    def close(self) -> SpooledImage:
+        self.file.close()
+        content_type, extension = sniff_image_type(self.head)
+        return SpooledImage(self.path, self.size, self.hash.hexdigest(), content_type, extension)
+
+    def abort(self):
+        self.file.close()
+        SpooledImage(self.path, 0, '', '', '').discard()
+
+
+def _fill(spooler: Spooler, buffer: memoryview, filled: int, chunk: bytes) -> int:
+    """Coalesce an httpx chunk into the pooled buffer, spooling it each time it is full"""
+    while chunk:
+        taken = min(len(chunk), len(buffer) - filled)
+        buffer[filled:filled + taken] = chunk[:taken]
+        filled += taken
+        chunk = chunk[taken:]
+        if filled == len(buffer):
+            spooler.write(buffer)
+            filled = 0
+    return filled
+
+
+def spool_response(response, pool: BufferPool) -> SpooledImage:
+    """Stream an httpx response (sent with stream=True) into a temporary file"""
+    spooler = Spooler()
+    try:
+        with pool.buffer() as buffer:
+            filled = 0
+            for chunk in response.iter_bytes():
+                filled = _fill(spooler, buffer, filled, chunk)
+            if filled:
+                spooler.write(buffer[:filled])
+    except BaseException:
+        spooler.abort()
+        raise
+    finally:
+        response.close()
+    return spooler.close()
+
+
+async def spool_response_async(response, pool: AsyncBufferPool) -> SpooledImage:
+    """Async counterpart of spool_response()"""
+    spooler = Spooler()
+    try:
+        async with pool.buffer() as buffer:
+            filled = 0
+            async for chunk in response.aiter_bytes():
+                filled = _fill(spooler, buffer, filled, chunk)
+            if filled:
+                spooler.write(buffer[:filled])
+    except BaseException:
+        spooler.abort()
+        raise
+    finally:
+        await response.aclose()
+    return spooler.close()
+
+
+class FileWindow:
+    """
+    Part of a file sent as httpx request content without loading it
+
+    Chunks are read through one pooled buffer. Iterating again starts over,
+    so a retried request resends it; the caller sets Content-Length (len()).
+    """
+
+    def __init__(self, path: str, offset: int, length: int, pool: BufferPool):
+        self.path = path
+        self.offset = offset
+        self.length = length
+        self.pool = pool
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self) -> Iterator[bytes]:
+        with open(self.path, 'rb') as file, self.pool.buffer() as buffer:
+            file.seek(self.offset)
+            remaining = self.length
+            while remaining:
+                read = file.readinto(buffer[:min(remaining, len(buffer))])
+                if not read:
+                    break
+                remaining -= read
+                # h2 keeps chunks until the peer's flow-control window opens: hand out a copy
+                yield bytes(buffer[:read])
+
+
+class AsyncFileWindow:
+    """FileWindow for httpx.AsyncClient request content (an async iterable, resent on retries like FileWindow)"""
+
+    def __init__(self, path: str, offset: int, length: int, pool: AsyncBufferPool):
+        self.path = path
+        self.offset = offset
+        self.length = length
+        self.pool = pool
+
+    def __len__(self) -> int:
+        return self.length
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async with self.pool.buffer() as buffer:
+            with open(self.path, 'rb') as file:
+                file.seek(self.offset)
+                remaining = self.length
+                while remaining:
+                    read = file.readinto(buffer[:min(remaining, len(buffer))])
+                    if not read:
+                        break
+                    remaining -= read
+                    yield bytes(buffer[:read])
+
+
+def resumable_endpoint(supabase_url: str) -> str:
+    return f"{supabase_url.rstrip('/')}/storage/v1/upload/resumable"
+
+
+def resumable_headers(supabase_key: str, bucket: str, path: str, image: SpooledImage) -> Dict[str, str]:
+    """Headers creating a TUS upload of `image` at bucket/path"""
+    metadata = {'bucketName': bucket, 'objectName': path, 'contentType': image.content_type}
+    return {
+        'authorization': f"Bearer {supabase_key}",
+        'apikey': supabase_key,
+        'tus-resumable': '1.0.0',
+        'upload-length': str(image.size),
+        'upload-metadata': ','.join(f"{key} {base64.b64encode(value.encode()).decode()}"
+                                    for key, value in metadata.items()),
+    }
+
+
+def _resumable_location(endpoint: str, created) -> Optional[str]:
+    """URL of the upload a creation response points to, None if the object already exists"""
+    if created.status_code == 409:
+        return None
+    created.raise_for_status()
+    return urljoin(endpoint + '/', created.headers['location'])
+
+
+def _chunk_headers(headers: Dict[str, str], offset: Optional[int] = None) -> Dict[str, str]:
+    base = {name: headers[name] for name in ('authorization', 'apikey', 'tus-resumable')}
+    if offset is None:
+        return base
+    return {**base, 'upload-offset': str(offset), 'content-type': 'application/offset+octet-stream'}
+
+
+def upload_resumable(session, rate_limiter, supabase_url: str, supabase_key: str, bucket: str, path: str,
+                     image: SpooledImage, pool: BufferPool):
+    """
+    Upload a spooled image through the TUS endpoint, RESUMABLE_CHUNK_BYTES at a time
+
+    After a failed chunk the server's offset is read back (HEAD) and the upload
+    continues from there. An object that already exists (409) is left as is.
+    """
+    endpoint = resumable_endpoint(supabase_url)
+    headers = resumable_headers(supabase_key, bucket, path, image)
+    # A replayed creation at worst leaves an unused upload behind; chunks carry their offset and are safe to resend
+    location = _resumable_location(endpoint, rate_limiter.request(session, 'POST', endpoint, headers=headers,
+                                                                  timeout=30, idempotent=True))
+    offset = 0
+    failures = 0
+    while location and offset < image.size:
+        length = min(RESUMABLE_CHUNK_BYTES, image.size - offset)
+        try:
+            response = rate_limiter.request(
+                session, 'PATCH', location, content=FileWindow(image.path, offset, length, pool),
+                headers={**_chunk_headers(headers, offset), 'content-length': str(length)}, timeout=60,
+                idempotent=True
+            )
+            response.raise_for_status()
+            offset = int(response.headers.get('upload-offset', offset + length))
+            failures = 0
+        except Exception:
+            failures += 1
+            if failures >= RESUMABLE_ATTEMPTS:
+                raise
+            # Continue from whatever the server received
+            head = rate_limiter.request(session, 'HEAD', location, headers=_chunk_headers(headers), timeout=30)
+            head.raise_for_status()
+            offset = int(head.headers['upload-offset'])
+
+
+async def upload_resumable_async(client, rate_limiter, supabase_url: str, supabase_key: str, bucket: str, path: str,
+                                 image: SpooledImage, pool: AsyncBufferPool):
+    """Async counterpart of upload_resumable() for an httpx.AsyncClient"""
+    endpoint = resumable_endpoint(supabase_url)
+    headers = resumable_headers(supabase_key, bucket, path, image)
+    location = _resumable_location(endpoint, await rate_limiter.request_async(client, 'POST', endpoint,
+                                                                              headers=headers, idempotent=True))
+    offset = 0
+    failures = 0
+    while location and offset < image.size:
+        length = min(RESUMABLE_CHUNK_BYTES, image.size - offset)
+        try:
+            response = await rate_limiter.request_async(
+                client, 'PATCH', location, content=AsyncFileWindow(image.path, offset, length, pool),
+                headers={**_chunk_headers(headers, offset), 'content-length': str(length)}, idempotent=True
+            )
+            response.raise_for_status()
+            offset = int(response.headers.get('upload-offset', offset + length))
+            failures = 0
+        except Exception:
+            failures += 1
+            if failures >= RESUMABLE_ATTEMPTS:
+                raise
+            head = await rate_limiter.request_async(client, 'HEAD', location, headers=_chunk_headers(headers))
+            head.raise_for_status()
+            offset = int(head.headers['upload-offset'])
@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+Durable work queue for scrape jobs
+One task per (category, filters, listing page) of a batch (a day's work by
+default), in a SQLite file that any number of worker processes lease tasks
+from (see queue_worker.py). Workers on several machines share one queue file
+on network storage, so it uses SQLite's rollback journal rather than WAL
+(whose shared memory only works between processes of one host) and relies
+on the filesystem's POSIX byte-range locks to serialize leases: NFSv4 or SMB
+mounts with locking enabled work, a mount without working locks (NFS
+`nolock`, most FUSE and object-store filesystems) can hand one task to two
+workers or corrupt the file. Without such storage, run the workers on one
+host.
+
+A leased task belongs to its worker until the lease expires; workers renew
+it while they run. A task that fails, or whose worker died, is retried after
+a backoff, and moved to the dead-letter list once it used its attempts.
+
+    python job_queue.py enqueue --category mode-femme mode-homme --pages 10 --new-arrivals 1
+    python job_queue.py status
+    python job_queue.py dead
+    python job_queue.py requeue
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from datetime import date
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from dedup_index import CACHE_DIR
+
+DEFAULT_PATH = CACHE_DIR / 'queue.sqlite'
+
+# Task states
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+# Pages after the end of their listing
+SKIPPED = 'skipped'
+DEAD = 'dead'
+
+DEFAULT_LEASE_SECONDS = 300.0
+DEFAULT_ATTEMPTS = 3
+
+# Backoff before a failed task is leased again: RETRY_DELAY * 2^(attempt - 1), at most MAX_RETRY_DELAY
+RETRY_DELAY = 30.0
+MAX_RETRY_DELAY = 900.0
+
+
+class Task(NamedTuple):
+    id: int
+    batch: str
+    category: str
+    filters: Dict
+    page: int
+    limit: Optional[int]
+    attempts: int
+    run_id: Optional[str]
+
+    @property
+    def params(self) -> Dict:
+        return {'batch': self.batch, 'category': self.category, 'filters': self.filters, 'page': self.page}
+
+
+def worker_name() -> str:
+    """Lease owner name of this process, unique across the machines sharing a queue"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobQueue:
+    def __init__(self, path: Path = DEFAULT_PATH):
+        """
+        Args:
+            path: SQLite file shared by the coordinator and every worker
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.lock = threading.Lock()
+        # Transactions are explicit (BEGIN IMMEDIATE) so two processes cannot lease the same task
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30, isolation_level=None)
+        # Rollback journal: the file may be shared by several hosts, which WAL does not support
+        self.conn.execute('PRAGMA journal_mode=DELETE')
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY,
+                batch TEXT,
+                category TEXT,
+                filters TEXT,
+                page INTEGER,
+                max_products INTEGER,
+                status TEXT,
+                attempts INTEGER DEFAULT 0,
+                max_attempts INTEGER,
+                owner TEXT,
+                lease_expires REAL,
+                not_before REAL DEFAULT 0,
+                run_id TEXT,
+                error TEXT,
+                result TEXT,
+                created_at REAL,
+                updated_at REAL,
+                UNIQUE (batch, category, filters, page)
+            )
+        """)
+        self.conn.execute('CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, page, id)')
+        # Products selected by a task of the batch: another page showing them later leaves them alone
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS claims (
+                batch TEXT,
+                key TEXT,
+                task_id INTEGER,
+                PRIMARY KEY (batch, key)
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS workers (
+                name TEXT PRIMARY KEY,
+                started_at REAL,
+                seen_at REAL,
+                tasks INTEGER DEFAULT 0
+            )
+        """)
+
+    def enqueue(self, batch: str, categories: Iterable[str], filters: Dict, pages: int,
+                limit: Optional[int] = None, max_attempts: int = DEFAULT_ATTEMPTS) -> int:
+        """Add pages 1..`pages` of every category to `batch`, returns how many tasks were new (enqueuing twice is a no-op)"""
+        now = time.time()
+        rows = [(batch, category, json.dumps(filters, sort_keys=True), page, limit, PENDING, max_attempts, now, now)
+                for category in categories for page in range(1, pages + 1)]
+        with self.lock:
+            before = self.conn.total_changes
+            self.conn.execute('BEGIN IMMEDIATE')
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO tasks (batch, category, filters, page, max_products, status, max_attempts, '
+                'created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                rows
+            )
+            self.conn.execute('COMMIT')
+            return self.conn.total_changes - before
+
+    def lease(self, owner: str, lease_seconds: float = DEFAULT_LEASE_SECONDS, batch: str = None) -> Optional[Task]:
+        """
+        Take the next due task (lowest page first) for `lease_seconds`, None if none is due
+
+        Tasks whose lease expired are taken over, or sent to the dead-letter
+        list if their worker died on the last attempt.
+        """
+        now = time.time()
+        scope, args = ('AND batch = ?', (batch,)) if batch else ('', ())
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                self.conn.execute(
+                    f"UPDATE tasks SET status = ?, owner = NULL, error = 'lease expired on the last attempt', "
+                    f"updated_at = ? WHERE status = ? AND lease_expires < ? AND attempts >= max_attempts {scope}",
+                    (DEAD, now, LEASED, now, *args)
+                )
+                row = self.conn.execute(
+                    f"SELECT id, batch, category, filters, page, max_products, attempts, run_id FROM tasks "
+                    f"WHERE ((status = ? AND not_before <= ?) OR (status = ? AND lease_expires < ?)) {scope} "
+                    f"ORDER BY page, id LIMIT 1",
+                    (PENDING, now, LEASED, now, *args)
+                ).fetchone()
+                if row is not None:
+                    self.conn.execute(
+                        'UPDATE tasks SET status = ?, owner = ?, lease_expires = ?, attempts = attempts + 1, '
+                        'updated_at = ? WHERE id = ?',
+                        (LEASED, owner, now + lease_seconds, now, row[0])
+                    )
+                self.conn.execute('COMMIT')
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+
+        if row is None:
+            return None
+        task_id, batch, category, filters, page, limit, attempts, run_id = row
+        return Task(task_id, batch, category, json.loads(filters), page, limit, attempts + 1, run_id)
+
+    def _owned(self, sql: str, task: Task, owner: str, *values) -> bool:
+        """Run an UPDATE on a task still leased by `owner`, False if the lease was lost"""
+        with self.lock:
+            cursor = self.conn.execute(f"{sql} WHERE id = ? AND owner = ? AND status = ?",
+                                       (*values, task.id, owner, LEASED))
+            return cursor.rowcount == 1
+
+    def renew(self, task: Task, owner: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> bool:
+        now = time.time()
+        return self._owned('UPDATE tasks SET lease_expires = ?, updated_at = ?', task, owner, now + lease_seconds, now)
+
+    def attach_run(self, task: Task, owner: str, run_id: str) -> bool:
+        """Remember the run journal of a task, so a retry resumes it instead of starting over"""
+        return self._owned('UPDATE tasks SET run_id = ?', task, owner, run_id)
+
+    def complete(self, task: Task, owner: str, result: Dict) -> bool:
+        done = self._owned('UPDATE tasks SET status = ?, owner = NULL, error = NULL, result = ?, updated_at = ?',
+                           task, owner, DONE, json.dumps(result), time.time())
+        if done:
+            with self.lock:
+                self.conn.execute('UPDATE workers SET tasks = tasks + 1 WHERE name = ?', (owner,))
+        return done
+
+    def fail(self, task: Task, owner: str, error: str) -> Optional[str]:
+        """
+        Give a task back after an error: pending again after a backoff, or dead if it was its last attempt
+
+        Returns the task's new status, None if its lease was lost meanwhile.
+        """
+        with self.lock:
+            max_attempts = self.conn.execute('SELECT max_attempts FROM tasks WHERE id = ?', (task.id,)).fetchone()[0]
+        status = DEAD if task.attempts >= max_attempts else PENDING
+        delay = min(MAX_RETRY_DELAY, RETRY_DELAY * 2 ** (task.attempts - 1))
+        now = time.time()
+        if not self._owned('UPDATE tasks SET status = ?, owner = NULL, error = ?, not_before = ?, updated_at = ?',
+                           task, owner, status, str(error)[:500], now + delay, now):
+            return None
+        return status
+
+    def end_of_listing(self, task: Task) -> int:
+        """Skip the pending pages after `task`'s, which found the end of its listing; returns how many"""
+        with self.lock:
+            cursor = self.conn.execute(
+                'UPDATE tasks SET status = ?, updated_at = ? '
+                'WHERE batch = ? AND category = ? AND filters = ? AND page > ? AND status = ?',
+                (SKIPPED, time.time(), task.batch, task.category, json.dumps(task.filters, sort_keys=True),
+                 task.page, PENDING)
+            )
+            return cursor.rowcount
+
+    def claim(self, task: Task, keys: Iterable[str]) -> set:
+        """Claim product keys for `task` in its batch, returns those it holds (claimed now or by an earlier attempt)"""
+        keys = list(keys)
+        if not keys:
+            return set()
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            self.conn.executemany('INSERT OR IGNORE INTO claims VALUES (?, ?, ?)',
+                                  [(task.batch, key, task.id) for key in keys])
+            held = {row[0] for row in self.conn.execute(
+                f"SELECT key FROM claims WHERE batch = ? AND task_id = ? AND key IN ({','.join('?' * len(keys))})",
+                (task.batch, task.id, *keys)
+            )}
+            self.conn.execute('COMMIT')
+        return held
+
+    def unfinished(self, batch: str = None) -> int:
+        """Tasks still pending or leased (a leased one can still fail and come back)"""
+        scope, args = ('AND batch = ?', (batch,)) if batch else ('', ())
+        with self.lock:
+            return self.conn.execute(f"SELECT COUNT(*) FROM tasks WHERE status IN (?, ?) {scope}",
+                                     (PENDING, LEASED, *args)).fetchone()[0]
+
+    def heartbeat(self, owner: str):
+        """Register or refresh a worker"""
+        now = time.time()
+        with self.lock:
+            self.conn.execute('INSERT INTO workers (name, started_at, seen_at) VALUES (?, ?, ?) '
+                              'ON CONFLICT (name) DO UPDATE SET seen_at = excluded.seen_at', (owner, now, now))
+
+    def retire(self, owner: str):
+        with self.lock:
+            self.conn.execute('UPDATE workers SET seen_at = 0 WHERE name = ?', (owner,))
+
+    def live_workers(self, within: float = DEFAULT_LEASE_SECONDS) -> int:
+        """Workers seen in the last `within` seconds"""
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM workers WHERE seen_at > ?',
+                                     (time.time() - within,)).fetchone()[0]
+
+    def progress(self, batch: str = None) -> Dict[str, Dict[str, int]]:
+        """Task counts by category then status"""
+        scope, args = ('WHERE batch = ?', (batch,)) if batch else ('', ())
+        counts: Dict[str, Dict[str, int]] = {}
+        with self.lock:
+            rows = self.conn.execute(f"SELECT category, status, COUNT(*) FROM tasks {scope} GROUP BY category, status",
+                                     args)
+            for category, status, n in rows:
+                counts.setdefault(category, {})[status] = n
+        return counts
+
+    def results(self, batch: str = None, since: float = 0.0) -> List[Dict]:
+        """Results of the tasks done since `since`, with their completion time"""
+        scope, args = ('AND batch = ?', (batch,)) if batch else ('', ())
+        with self.lock:
+            rows = self.conn.execute(f"SELECT result, updated_at FROM tasks WHERE status = ? AND updated_at >= ? {scope}",
+                                     (DONE, since, *args)).fetchall()
+        return [{**json.loads(result or '{}'), 'done_at': done_at} for result, done_at in rows]
+
+    def dead(self, batch: str = None) -> List[Dict]:
+        scope, args = ('AND batch = ?', (batch,)) if batch else ('', ())
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT id, batch, category, filters, page, attempts, error FROM tasks WHERE status = ? {scope} "
+                f"ORDER BY id", (DEAD, *args)
+            ).fetchall()
+        return [{'id': row[0], 'batch': row[1], 'category': row[2], 'filters': json.loads(row[3]), 'page': row[4],
+                 'attempts': row[5], 'error': row[6]} for row in rows]
+
+    def requeue(self, batch: str = None) -> int:
+        """Give the dead-letter tasks a fresh set of attempts"""
+        scope, args = ('AND batch = ?', (batch,)) if batch else ('', ())
+        with self.lock:
+            cursor = self.conn.execute(
+                f"UPDATE tasks SET status = ?, attempts = 0, not_before = 0, updated_at = ? WHERE status = ? {scope}",
+                (PENDING, time.time(), DEAD, *args)
+            )
+            return cursor.rowcount
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def print_status(queue: JobQueue, batch: Optional[str], window: float = 600.0):
+    progress = queue.progress(batch)
+    if not progress:
+        print(f"📭 No task{' in batch ' + batch if batch else ''}")
+        return
+
+    totals: Dict[str, int] = {}
+    print(f"📋 {'Batch ' + batch if batch else 'All batches'}")
+    for category, counts in sorted(progress.items()):
+        for status, n in counts.items():
+            totals[status] = totals.get(status, 0) + n
+        print(f"   {category}: " + ', '.join(f"{counts.get(status, 0)} {status}"
+                                           for status in (DONE, LEASED, PENDING, SKIPPED, DEAD)))
+
+    results = queue.results(batch)
+    recent = [result for result in results if result['done_at'] >= time.time() - window]
+    remaining = totals.get(PENDING, 0) + totals.get(LEASED, 0)
+    print(f"\n   {sum(totals.values())} tasks: " + ', '.join(f"{n} {status}" for status, n in sorted(totals.items())))
+    print(f"   {sum(result.get('posted', 0) for result in results)} products posted, "
+          f"{queue.live_workers()} live worker(s)")
+    if recent:
+        rate = len(recent) / window * 60
+        print(f"   {rate:.1f} tasks/min over the last {window / 60:.0f} min"
+              + (f", about {remaining / rate:.0f} min left" if remaining else ''))
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Scrape job queue: enqueue a day of work and follow its progress')
+    parser.add_argument('command', choices=['enqueue', 'status', 'dead', 'requeue'])
+    parser.add_argument('--queue', type=Path, default=DEFAULT_PATH, help='Queue file shared by the workers')
+    parser.add_argument('--batch', help='Batch of tasks (default: today for enqueue, every batch otherwise)')
+    parser.add_argument('--category', nargs='+', default=['mode-femme'], help='Categories to scrape')
+    parser.add_argument('--pages', type=int, default=10, help='Listing pages enqueued per category')
+    parser.add_argument('--limit', type=int, help='Products posted per page at most (default: all new ones)')
+    parser.add_argument('--attempts', type=int, default=DEFAULT_ATTEMPTS, help='Attempts before a task is dead')
+    parser.add_argument('--brand', help='Filter by brand')
+    parser.add_argument('--new-arrivals', type=int, help='New arrivals in last X days (e.g., 7, 14, 30)')
+    parser.add_argument('--price-to', type=int, help='Maximum price (e.g., 50)')
+    parser.add_argument('--price-from', type=int, help='Minimum price')
+    parser.add_argument('--order', choices=['sale', 'popularity', 'price_asc', 'price_desc', 'newest'],
+                        help='Sort order')
+    args = parser.parse_args()
+
+    queue = JobQueue(args.queue)
+
+    if args.command == 'enqueue':
+        filters = {}
+        if args.brand:
+            filters['brand'] = args.brand
+        if args.new_arrivals:
+            filters['activation_date'] = f"0-{args.new_arrivals}"
+        if args.price_to:
+            filters['price_to'] = args.price_to
+        if args.price_from:
+            filters['price_from'] = args.price_from
+        if args.order:
+            filters['order'] = args.order
+
+        batch = args.batch or date.today().isoformat()
+        added = queue.enqueue(batch, args.category, filters, args.pages, args.limit, args.attempts)
+        print(f"📥 Batch {batch}: {added} new tasks ({len(args.category)} categories x {args.pages} pages)")
+        print_status(queue, batch)
+
+    elif args.command == 'status':
+        print_status(queue, args.batch)
+
+    elif args.command == 'dead':
+        dead = queue.dead(args.batch)
+        print(f"☠️  {len(dead)} dead tasks")
+        for task in dead:
+            print(f"   #{task['id']} {task['batch']} {task['category']} page {task['page']} "
+                  f"({task['attempts']} attempts): {task['error']}")
+
+    elif args.command == 'requeue':
+        print(f"🔁 {queue.requeue(args.batch)} dead tasks back in the queue")
+
+    queue.close()
+
+
+if __name__ == '__main__':
+    main()
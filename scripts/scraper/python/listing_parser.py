@@ -0,0 +1,294 @@
+"""
+Listing page parser for the Zalando scrapers
+Reads the structured product data embedded in the page (`application/ld+json`
+and the JSON hydration blobs) without building a DOM, and only falls back to
+walking the product cards with BeautifulSoup when no embedded data is found
+"""
+
+import json
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urljoin
+
+BASE_URL = 'https://www.zalando.fr'
+MEDIA_URL = 'https://img01.ztat.net/article/'
+DEFAULT_SIZES = ['S', 'M', 'L', 'XL']
+
+# Every JSON <script> block (ld+json, application/json hydration state), CDATA-wrapped or not
+SCRIPT_RE = re.compile(
+    rb'<script\b[^>]*\btype=["\']application/(?:ld\+)?json["\'][^>]*>\s*(?:<!\[CDATA\[)?(.*?)(?:\]\]>)?\s*</script>',
+    re.S | re.I,
+)
+
+CURRENCY_SYMBOLS = {'EUR': '€', 'GBP': '£', 'USD': '$', 'CHF': 'CHF'}
+
+# Struck-through original price and discount badge ("-30%") shown next to a sale price
+STRUCK_TAGS = ['s', 'del', 'strike']
+DISCOUNT_RE = re.compile(r'^-?\s*\d+(?:[.,]\d+)?\s*%$')
+
+JSON = 'json'
+DOM = 'dom'
+
+
+def product(name: str, brand: str, price: str, image_url: str, product_url: str) -> Dict:
+    """Product dict in the shape the posting code expects"""
+    return {
+        'name': name,
+        'brand': brand,
+        'price': price,
+        'image_url': image_url,
+        'product_url': product_url,
+        'sizes': list(DEFAULT_SIZES),
+        'description': f"{brand} - {name}",
+        'category': 'Vêtement'
+    }
+
+
+def clean_image_url(image_url: str) -> str:
+    """Drop the CDN resize parameters to get the full-quality image"""
+    if 'zalando' in image_url or 'ztat.net' in image_url:
+        return image_url.split('?')[0]
+    return image_url
+
+
+def format_price(amount: Any, currency: Optional[str] = 'EUR') -> str:
+    """Format a numeric price like the listing shows it (29,99 €)"""
+    try:
+        value = float(str(amount).replace(',', '.'))
+    except ValueError:
+        return str(amount)
+    symbol = CURRENCY_SYMBOLS.get((currency or 'EUR').upper(), currency)
+    return f"{value:.2f}".replace('.', ',') + f" {symbol}"
+
+
+# One number of a displayed price: grouped thousands (1 299,99 / 1.299,99) or plain digits, 1-2 decimals
+PRICE_NUMBER_RE = re.compile(
+    r'(?<![\d.,])(?:\d{1,3}(?:[\s\u00a0\u202f.,]\d{3})+|\d+)(?:[.,]\d{1,2})?(?![\d%])(?!\s*%)'
+)
+
+
+def _amount(number: str) -> float:
+    digits = re.sub(r'[\s\u00a0\u202f]', '', number)
+    # The last separator is the decimal one when 1 or 2 digits follow it (29,99 / 29.9), a thousands one otherwise
+    decimal = max(digits.rfind(','), digits.rfind('.'))
+    if decimal >= 0 and len(digits) - decimal - 1 in (1, 2):
+        return float(re.sub(r'[.,]', '', digits[:decimal]) + '.' + digits[decimal + 1:])
+    return float(re.sub(r'[.,]', '', digits))
+
+
+def _currency_near(text: str, start: int, end: int) -> Optional[str]:
+    """Currency code written right after or right before the number at text[start:end]"""
+    after = text[end:].lstrip().upper()
+    before = text[:start].rstrip().upper()
+    for code, symbol in CURRENCY_SYMBOLS.items():
+        if after.startswith((symbol, code)) or before.endswith((symbol, code)):
+            return code
+    return None
+
+
+def parse_price(text: Optional[str]) -> Tuple[Optional[float], Optional[str]]:
+    """
+    (amount, currency code) from a displayed price like "1 299,99 €", (None, None) without a number
+
+    Only numbers next to a currency are read when there are some, and
+    percentages ("-30%") never are. A discounted price showing both the
+    original and the sale price gives the lower one, the price paid.
+    """
+    prices = []
+    numbers = []
+    for match in PRICE_NUMBER_RE.finditer(text or ''):
+        amount = _amount(match.group())
+        numbers.append(amount)
+        currency = _currency_near(text, match.start(), match.end())
+        if currency:
+            prices.append((amount, currency))
+
+    if prices:
+        return min(prices)
+    if numbers:
+        return min(numbers), None
+    return None, None
+
+
+def name_text(value: Any) -> Optional[str]:
+    """A name-like field: plain string or {"name": ...}"""
+    if isinstance(value, dict):
+        value = value.get('name')
+    if isinstance(value, str) and value.strip():
+        return value.strip()
+    return None
+
+
+def _first(value: Any) -> Any:
+    return value[0] if isinstance(value, list) and value else value
+
+
+def _price(value: Any) -> Optional[str]:
+    """Price from an ld+json `offers` or a hydration `price` field"""
+    value = _first(value)
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return format_price(value)
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, dict):
+        currency = value.get('priceCurrency') or value.get('currency')
+        for key in ('promotional', 'price', 'lowPrice', 'original', 'amount', 'value'):
+            if value.get(key) not in (None, ''):
+                amount = value[key]
+                if isinstance(amount, dict):
+                    return _price(amount)
+                return format_price(amount, currency) if currency or not isinstance(amount, str) else amount.strip()
+    return None
+
+
+def _image(value: Dict) -> Optional[str]:
+    image = _first(value.get('image') or value.get('imageUrl') or value.get('thumbnail'))
+    if isinstance(image, dict):
+        image = image.get('url') or image.get('contentUrl') or image.get('uri')
+    if isinstance(image, str) and image:
+        return image
+
+    media = _first(value.get('media'))
+    if isinstance(media, dict):
+        path = media.get('path') or media.get('uri') or media.get('url')
+        if path:
+            return path if path.startswith('http') else MEDIA_URL + path.lstrip('/')
+    return None
+
+
+def _url(value: Dict, base_url: str) -> Optional[str]:
+    url = value.get('url') or value.get('uri') or value.get('@id')
+    if isinstance(url, str) and url and not url.startswith('#'):
+        return urljoin(base_url, url)
+    url_key = value.get('url_key') or value.get('urlKey')
+    if isinstance(url_key, str) and url_key:
+        return urljoin(base_url, url_key if url_key.endswith('.html') else f"{url_key}.html")
+    return None
+
+
+def embedded_product(value: Dict, base_url: str = BASE_URL) -> Optional[Dict]:
+    """Product from an ld+json Product or a hydration-state article, None if it is not one"""
+    name = name_text(value.get('name'))
+    brand = name_text(value.get('brand')) or name_text(value.get('brand_name')) or name_text(value.get('brandName'))
+    if not name or not brand:
+        return None
+
+    is_product = value.get('@type') == 'Product' or 'sku' in value
+    image_url = _image(value)
+    product_url = _url(value, base_url)
+    if not is_product or not image_url or not product_url:
+        return None
+
+    price = _price(value.get('offers')) or _price(value.get('price')) or 'N/A'
+    return product(name, brand, price, clean_image_url(image_url), product_url)
+
+
+def walk_json(value: Any) -> Iterator[Dict]:
+    """Every dict in a JSON document, depth first in document order"""
+    stack = [value]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, dict):
+            yield current
+            stack.extend(reversed(list(current.values())))
+        elif isinstance(current, list):
+            stack.extend(reversed(current))
+
+
+def json_blocks(html: bytes) -> Iterator[Any]:
+    for match in SCRIPT_RE.finditer(html):
+        try:
+            yield json.loads(match.group(1))
+        except ValueError:
+            continue
+
+
+def extract_embedded(html: bytes, base_url: str = BASE_URL) -> List[Dict]:
+    """Products from the page's embedded JSON, in page order, without duplicates"""
+    products = []
+    seen_urls = set()
+
+    for document in json_blocks(html):
+        for value in walk_json(document):
+            found = embedded_product(value, base_url)
+            if found and found['product_url'] not in seen_urls:
+                seen_urls.add(found['product_url'])
+                products.append(found)
+
+    return products
+
+
+def current_price_text(price_elem) -> str:
+    """Displayed price of a card, without the struck-through original price and discount badge of a sale"""
+    parts = [text.strip() for text in price_elem.find_all(string=True)
+             if text.strip() and not text.find_parent(STRUCK_TAGS) and not DISCOUNT_RE.match(text.strip())]
+    return ' '.join(parts) or price_elem.get_text(strip=True)
+
+
+def card_product(card, base_url: str = BASE_URL) -> Optional[Dict]:
+    """Extract product data from a BeautifulSoup product card"""
+    try:
+        # Extract product link
+        link_elem = card.find('a', href=True)
+        if not link_elem:
+            return None
+
+        product_url = urljoin(base_url, link_elem['href'])
+
+        # Extract image
+        img_elem = card.find('img')
+        image_url = img_elem.get('src') or img_elem.get('data-src') if img_elem else None
+
+        if not image_url:
+            return None
+
+        # Extract name
+        name_elem = card.find('h3') or card.find('div', class_='cat_articleName')
+        name = name_elem.get_text(strip=True) if name_elem else "Product"
+
+        # Extract brand
+        brand_elem = card.find('div', class_='cat_brandName') or card.find('h2')
+        brand = brand_elem.get_text(strip=True) if brand_elem else "Zalando"
+
+        # Extract price
+        price_elem = card.find('p', class_='cat_price') or card.find('span', {'data-testid': 'price'})
+        price = current_price_text(price_elem) if price_elem else "N/A"
+
+        return product(name, brand, price, clean_image_url(image_url), product_url)
+
+    except Exception as e:
+        print(f"      ⚠️  Error extracting product: {e}")
+        return None
+
+
+def extract_cards(html, base_url: str = BASE_URL, selector: Optional[str] = None) -> List[Dict]:
+    """Products from the product cards of the DOM (slow path)"""
+    # BeautifulSoup and lxml are only imported when a page has no embedded data
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'lxml')
+    try:
+        if selector:
+            cards = soup.select(selector)
+        else:
+            # Zalando uses data-testid attributes, older layouts the cat_ classes
+            cards = soup.find_all('article', {'data-testid': 'product-card'}) or \
+                soup.find_all('div', class_='cat_articleCard')
+        return [found for found in (card_product(card, base_url) for card in cards) if found]
+    finally:
+        # Release the parsed tree right away
+        soup.decompose()
+
+
+def parse_listing(html, base_url: str = BASE_URL, selector: Optional[str] = None) -> Tuple[List[Dict], str]:
+    """Products of a listing page and the path that found them (JSON or DOM)"""
+    if isinstance(html, str):
+        html = html.encode('utf-8')
+
+    products = extract_embedded(html, base_url)
+    if products:
+        return products, JSON
+
+    return extract_cards(html, base_url, selector), DOM
@@ -0,0 +1,229 @@
+"""
+Run metrics for the Zalando scrapers
+Per-stage timers, counters, HTTP status / byte / retry accounting, emitted as
+JSON lines (one event per stage call), a Prometheus textfile and a run summary.
+Aggregation is a lock + a few additions per call; nothing is written unless a
+metrics directory is configured.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+PREFIX = 'infit_scraper'
+
+# Histogram buckets (seconds) for stage durations
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Durations kept per stage for the summary percentiles
+MAX_SAMPLES = 10000
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def response_bytes(response) -> int:
+    """Body size on the wire of an httpx response, without forcing a streamed body to load"""
+    if getattr(response, 'num_bytes_downloaded', 0):
+        return response.num_bytes_downloaded
+    length = response.headers.get('content-length')
+    if length and length.isdigit():
+        return int(length)
+    content = getattr(response, '_content', None)
+    return len(content) if isinstance(content, bytes) else 0
+
+
+def escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def host_of(url: str) -> str:
+    return (urlparse(url).hostname or '').lower()
+
+
+class StageStats:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.samples: List[float] = []
+
+    def add(self, seconds: float, error: bool):
+        self.count += 1
+        self.errors += error
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.buckets[bisect_left(BUCKETS, seconds)] += 1
+        if len(self.samples) < MAX_SAMPLES:
+            self.samples.append(seconds)
+
+    def percentile(self, q: float) -> float:
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.run_id = uuid.uuid4().hex[:12]
+        self.started = time.time()
+        self.stages: Dict[str, StageStats] = {}
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.gauges: Dict[Tuple[str, Labels], float] = {}
+        self.directory: Optional[Path] = None
+        self.events = None
+
+    def configure(self, directory: Path):
+        """Write events to `directory`/events.jsonl, and the textfile + summary on close()"""
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.events = open(self.directory / 'events.jsonl', 'a', encoding='utf-8')
+
+    def event(self, name: str, **fields):
+        if self.events is None:
+            return
+        line = json.dumps({'ts': round(time.time(), 3), 'run': self.run_id, 'event': name, **fields})
+        with self.lock:
+            self.events.write(line + '\n')
+
+    @contextmanager
+    def timer(self, stage: str, **fields):
+        """Time a block as one call of `stage` (an exception counts as an error and propagates)"""
+        start = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - start, error, **fields)
+
+    def observe(self, stage: str, seconds: float, error: bool = False, **fields):
+        with self.lock:
+            stats = self.stages.get(stage)
+            if stats is None:
+                stats = self.stages[stage] = StageStats()
+            stats.add(seconds, error)
+        if self.events is not None:
+            self.event('stage', stage=stage, seconds=round(seconds, 6), error=error, **fields)
+
+    def count(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, name: str, value: float, **labels):
+        with self.lock:
+            self.gauges[(name, tuple(sorted((k, str(v)) for k, v in labels.items())))] = value
+
+    def http(self, method: str, url: str, response, seconds: float, sent: int = 0):
+        """Account one HTTP exchange: status histogram, bytes each way, latency per host"""
+        host = host_of(url)
+        self.count('http_requests', method=method.upper(), host=host, status=response.status_code)
+        self.count('http_bytes', response_bytes(response), host=host, direction='in')
+        encoding = response.headers.get('content-encoding')
+        content = getattr(response, '_content', None)
+        if encoding and isinstance(content, bytes):
+            # Decoded size of a compressed body (its wire size is in http_bytes)
+            self.count('http_decoded_bytes', len(content), host=host, encoding=encoding)
+        if sent:
+            self.count('http_bytes', sent, host=host, direction='out')
+        self.observe('http', seconds, response.status_code >= 500 or response.status_code == 429,
+                     host=host, status=response.status_code)
+
+    def summary(self) -> Dict:
+        with self.lock:
+            stages = {stage: {
+                'count': stats.count,
+                'errors': stats.errors,
+                'total_seconds': round(stats.total, 3),
+                'p50_ms': round(stats.percentile(0.5) * 1000, 2),
+                'p95_ms': round(stats.percentile(0.95) * 1000, 2),
+                'max_ms': round(stats.max * 1000, 2),
+            } for stage, stats in sorted(self.stages.items())}
+            counters = [{'name': name, **dict(labels), 'value': value}
+                        for (name, labels), value in sorted(self.counters.items())]
+            gauges = [{'name': name, **dict(labels), 'value': value}
+                      for (name, labels), value in sorted(self.gauges.items())]
+
+        return {
+            'run': self.run_id,
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+            'seconds': round(time.time() - self.started, 3),
+            'stages': stages,
+            'counters': counters,
+            'gauges': gauges,
+        }
+
+    def prometheus(self) -> str:
+        """Prometheus text exposition format (node_exporter textfile collector)"""
+        def labels_text(labels) -> str:
+            if not labels:
+                return ''
+            return '{' + ','.join(f'{k}="{escape_label(v)}"' for k, v in labels) + '}'
+
+        lines = []
+        with self.lock:
+            name = f"{PREFIX}_stage_seconds"
+            lines += [f"# HELP {name} Duration of each scraper stage call", f"# TYPE {name} histogram"]
+            for stage, stats in sorted(self.stages.items()):
+                cumulative = 0
+                for bound, bucket in zip(BUCKETS + (float('inf'),), stats.buckets):
+                    cumulative += bucket
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f"{name}_bucket{labels_text((('stage', stage), ('le', le)))} {cumulative}")
+                lines.append(f"{name}_sum{labels_text((('stage', stage),))} {stats.total:.6f}")
+                lines.append(f"{name}_count{labels_text((('stage', stage),))} {stats.count}")
+
+            name = f"{PREFIX}_stage_errors_total"
+            lines += [f"# HELP {name} Stage calls that raised", f"# TYPE {name} counter"]
+            lines += [f"{name}{labels_text((('stage', stage),))} {stats.errors}" for stage, stats in sorted(self.stages.items())]
+
+            for kind, values in (('counter', self.counters), ('gauge', self.gauges)):
+                declared = set()
+                for (metric, labels), value in sorted(values.items()):
+                    name = f"{PREFIX}_{metric}_total" if kind == 'counter' else f"{PREFIX}_{metric}"
+                    if name not in declared:
+                        declared.add(name)
+                        lines.append(f"# TYPE {name} {kind}")
+                    lines.append(f"{name}{labels_text(labels)} {value:g}")
+
+            lines += [f"# TYPE {PREFIX}_last_run_timestamp_seconds gauge", f"{PREFIX}_last_run_timestamp_seconds {time.time():.0f}"]
+
+        return '\n'.join(lines) + '\n'
+
+    def close(self):
+        """Flush events and write scraper.prom + summary.json (atomically) to the metrics directory"""
+        if self.directory is None:
+            return
+
+        for filename, text in (('scraper.prom', self.prometheus()),
+                               ('summary.json', json.dumps(self.summary(), indent=2, ensure_ascii=False))):
+            tmp_path = self.directory / f".{filename}.tmp"
+            tmp_path.write_text(text, encoding='utf-8')
+            os.replace(tmp_path, self.directory / filename)
+
+        with self.lock:
+            if self.events is not None:
+                self.events.close()
+                self.events = None
+
+
+_shared_metrics: Optional[Metrics] = None
+
+
+def get_metrics() -> Metrics:
+    """Process-wide registry, so both scrapers and their helpers report into one run"""
+    global _shared_metrics
+    if _shared_metrics is None:
+        _shared_metrics = Metrics()
+    return _shared_metrics
@@ -0,0 +1,135 @@
+"""
+Bounded-queue streaming pipeline for the Zalando scrapers
+Each stage runs its own worker threads and hands items to the next stage
+through a bounded queue, so a slow stage applies backpressure upstream and
+all stages overlap: the first post goes out while later pages still load.
+"""
+
+import queue
+import threading
+import time
+from typing import Any, Callable, Iterable, List, Optional
+
+from metrics import get_metrics
+
+# End-of-stream marker passed down the queues
+END = object()
+
+
+class Stage:
+    def __init__(self, name: str, fn: Callable[[Any], Iterable], workers: int = 1, queue_size: int = 32,
+                 finish: Callable[[], Iterable] = None, on_error: Callable[[Any, Exception], Iterable] = None):
+        """
+        Args:
+            name: Stage name (metrics and logs)
+            fn: Called with each input item, returns an iterable of outputs (a generator
+                is consumed lazily, so it blocks while the next stage is full); an empty
+                iterable drops the item
+            workers: Threads running `fn` concurrently
+            queue_size: Capacity of the stage's input queue
+            finish: Called once after the last input, returns trailing outputs (e.g. a final flush)
+            on_error: Called with an input `fn` raised on and the error; its outputs skip the
+                later stages and go straight to the pipeline's results (e.g. a failed post)
+        """
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.finish = finish
+        self.on_error = on_error
+
+
+class Pipeline:
+    def __init__(self, stages: List[Stage]):
+        self.stages = stages
+        self.stopped = threading.Event()
+        self.metrics = get_metrics()
+
+    def stop(self):
+        """Stop feeding new source items; items already in flight still go through"""
+        self.stopped.set()
+
+    def _put(self, stage: Optional[Stage], target: queue.Queue, item):
+        start = time.perf_counter()
+        target.put(item)
+        waited = time.perf_counter() - start
+        if waited > 0.001 and stage:
+            # Time spent waiting on a full downstream queue: this stage is ahead of the next one
+            self.metrics.count('pipeline_blocked_seconds', waited, stage=stage.name)
+
+    def _worker(self, stage: Stage, inbox: queue.Queue, outbox: queue.Queue, results: queue.Queue,
+                remaining: List[int], lock: threading.Lock):
+        while True:
+            start = time.perf_counter()
+            item = inbox.get()
+            waited = time.perf_counter() - start
+            if waited > 0.001:
+                self.metrics.count('pipeline_idle_seconds', waited, stage=stage.name)
+
+            if item is END:
+                # Let sibling workers see the marker too
+                inbox.put(END)
+                break
+
+            try:
+                for output in stage.fn(item):
+                    self._put(stage, outbox, output)
+            except Exception as e:
+                self.metrics.count('pipeline_errors', stage=stage.name)
+                print(f"   ⚠️  {stage.name} stage failed: {e}")
+                # Without a callback the item is dropped; the later stages never see it either way
+                for output in (stage.on_error(item, e) if stage.on_error else ()):
+                    results.put(output)
+
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+
+        if last:
+            try:
+                for output in (stage.finish() if stage.finish else ()):
+                    self._put(stage, outbox, output)
+            except Exception as e:
+                self.metrics.count('pipeline_errors', stage=stage.name)
+                print(f"   ⚠️  {stage.name} stage failed while finishing: {e}")
+            self._put(None, outbox, END)
+
+    def run(self, source: Iterable) -> List:
+        """Feed `source` through every stage and return the outputs of the last one"""
+        queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages] + [queue.Queue()]
+        threads = []
+
+        def feed():
+            for item in source:
+                if self.stopped.is_set():
+                    break
+                self._put(None, queues[0], item)
+            queues[0].put(END)
+
+        threads.append(threading.Thread(target=feed, name='pipeline-source', daemon=True))
+
+        for index, stage in enumerate(self.stages):
+            remaining = [stage.workers]
+            lock = threading.Lock()
+            for worker in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=self._worker,
+                    args=(stage, queues[index], queues[index + 1], queues[-1], remaining, lock),
+                    name=f"pipeline-{stage.name}-{worker}",
+                    daemon=True
+                ))
+
+        for thread in threads:
+            thread.start()
+
+        results = []
+        while True:
+            item = queues[-1].get()
+            if item is END:
+                break
+            results.append(item)
+
+        for thread in threads:
+            thread.join()
+
+        return results
@@ -0,0 +1,67 @@
+"""
+Row builders for InFit posts
+Shared by the Zalando scrapers and the async posting engine
+"""
+
+import uuid
+from typing import List, Dict
+
+from dedup_index import product_key
+
+# Namespace of the row ids derived from their outfit id
+ROW_NAMESPACE = uuid.UUID('9c4f2a7e-61d8-4b35-8e0a-d7b3c5f19e42')
+
+
+def row_id(outfit_id: str, *parts) -> str:
+    """Id of a row attached to an outfit, the same every time it is built (replayed inserts upsert it)"""
+    return str(uuid.uuid5(ROW_NAMESPACE, ':'.join(str(part) for part in (outfit_id, *parts))))
+
+
+def outfit_row(product: Dict, user_id: str, image_url: str, outfit_id: str = None) -> Dict:
+    """Build the `outfits` row for a scraped product (with an explicit id when `outfit_id` is given)"""
+    row = {
+        'user_id': user_id,
+        'image_url': image_url,
+        'publisher_height': 180,
+        'publisher_size': 'M',
+        'description': f"{product['name']} - {product['price']}\n\n{product['description']}"
+    }
+    if outfit_id:
+        row['id'] = outfit_id
+    return row
+
+
+def clothing_piece_rows(product: Dict, outfit_id: str) -> List[Dict]:
+    """
+    Build one `clothing_pieces` row per available size
+
+    Row ids include the product, so a near-duplicate linked to an existing
+    outfit (see image_hashes.py) adds its own pieces next to the original ones.
+    """
+    key = product_key(product['product_url'])
+    return [{
+        'id': row_id(outfit_id, 'piece', key, size),
+        'outfit_id': outfit_id,
+        'brand': product['brand'],
+        'product_name': product['name'],
+        'size': size,
+        'category': product['category'],
+        'description': product['description'],
+        'purchase_link': product['product_url']
+    } for size in product['sizes']]
+
+
+def image_variant_rows(outfit_id: str, variants: List[Dict]) -> List[Dict]:
+    """
+    Build `outfit_images` rows for the resized variants of the main image and the gallery images
+
+    Gallery images (from product page enrichment) carry their `display_order`
+    and no width, like the images users add to their own posts.
+    """
+    return [{
+        'id': row_id(outfit_id, 'image', variant.get('display_order', 0), variant['width']),
+        'outfit_id': outfit_id,
+        'image_url': variant['image_url'],
+        'display_order': variant.get('display_order', 0),
+        'width': variant['width']
+    } for variant in variants if variant.get('width') or variant.get('display_order')]
@@ -0,0 +1,366 @@
+"""
+Posting logic shared by the Zalando scrapers, the async posting engine and BulkWriter
+PostBookkeeping keeps the run journal, dedup index and near-duplicate hashes
+up to date around each post; ScraperPosting adds the synchronous upload and
+insert steps (and the create_posts dispatch) both scrapers inherit.
+"""
+
+from typing import List, Dict, Optional, Tuple, TYPE_CHECKING
+
+from post_rows import outfit_row, clothing_piece_rows, image_variant_rows
+from run_journal import RunJournal, OUTFIT_INSERTED
+from dedup_index import DedupIndex
+from product_details import gallery_urls
+from watermarks import Watermarks
+
+# NumPy, Pillow and httpx are imported where they are first needed
+if TYPE_CHECKING:
+    from image_hashes import NearDuplicateIndex
+
+# (product key, outfit id or None while it is being posted, Hamming distance) as returned by NearDuplicateIndex.find
+Match = Tuple[str, Optional[str], int]
+
+
+class PostBookkeeping:
+    """
+    Run bookkeeping around each post
+
+    Expects `dedup`, `journal` and `near_dups` attributes (each None when
+    disabled) and a `metrics` attribute.
+    """
+    dedup: Optional[DedupIndex]
+    journal: Optional[RunJournal]
+    near_dups: Optional['NearDuplicateIndex']
+    # Listing watermarks of incremental runs, advanced as selected products are posted or skipped
+    watermarks: Optional[Watermarks] = None
+
+    def resume(self, product: Dict) -> Tuple[Optional[str], List[Dict]]:
+        """(outfit id if the run journal has the product posted, image variants it already uploaded)"""
+        state, variants, outfit_id = self.journal.checkpoint(product) if self.journal else (None, None, None)
+        if state == OUTFIT_INSERTED:
+            print(f"   ♻️  Already posted in this run: {outfit_id}")
+            return outfit_id, variants or []
+        return None, variants or []
+
+    def match_near_duplicate(self, product: Dict, image_hash: int) -> Optional[Match]:
+        """The posted product whose image is a near-duplicate of this one, or None after adding its hash"""
+        match = self.near_dups.find(image_hash, product)
+        if not match:
+            self.near_dups.add(image_hash, product)
+        return match
+
+    def near_duplicate_action(self, key: str, outfit_id: Optional[str], distance: int) -> Optional[str]:
+        """SKIP or LINK for a near-duplicate of `key`, None while that product is still being posted"""
+        if not outfit_id:
+            print(f"      🪞 Near-duplicate of {key} (distance {distance}), which is still being posted")
+            return None
+        return self.near_dups.action
+
+    def near_duplicate_done(self, product: Dict, key: str, outfit_id: str, distance: int) -> str:
+        """Record a near-duplicate as posted under the existing outfit once it was skipped or linked"""
+        from image_hashes import LINK
+
+        if self.near_dups.action == LINK:
+            print(f"      🔗 Near-duplicate of {key} (distance {distance}), linked to post {outfit_id}")
+        else:
+            print(f"      🪞 Near-duplicate of {key} (distance {distance}), skipped")
+
+        self.metrics.count('near_duplicates', action=self.near_dups.action)
+        if self.dedup is not None:
+            self.dedup.mark_posted(product, outfit_id)
+        if self.journal:
+            self.journal.outfit_inserted(product, outfit_id)
+        if self.watermarks:
+            self.watermarks.done(product)
+        return outfit_id
+
+    def image_uploaded(self, product: Dict, variants: List[Dict]):
+        """Checkpoint uploaded variants, so a resumed run goes straight to the insert"""
+        if variants and self.journal:
+            self.journal.image_uploaded(product, variants)
+
+    def posted(self, product: Dict, outfit_id: str) -> str:
+        """Record a product whose outfit rows were written"""
+        if self.dedup is not None:
+            self.dedup.mark_posted(product, outfit_id)
+        if self.journal:
+            self.journal.outfit_inserted(product, outfit_id)
+        if self.near_dups:
+            self.near_dups.posted(product, outfit_id)
+        if self.watermarks:
+            self.watermarks.done(product)
+        return outfit_id
+
+    def failed(self, product: Dict, error: Exception):
+        """Note why a product failed; the journal keeps its state, so it is retried on resume"""
+        if self.journal:
+            self.journal.failed(product, error)
+
+
+class ScraperPosting(PostBookkeeping):
+    """
+    Upload and insert steps of the synchronous scrapers
+
+    Besides the bookkeeping attributes, expects `supabase`, `supabase_url`,
+    `supabase_key`, `bot_user_id`, `image_store`, `session`, `rate_limiter`,
+    `transcoder` and `http_cache`.
+    """
+    # Extra headers for image downloads in async mode
+    headers: Optional[Dict] = None
+
+    def upload_image(self, image_url: str, product_name: str) -> Optional[str]:
+        """Download an image and store it in Supabase Storage under its content hash"""
+        variants = self.upload_image_variants(image_url)
+        return variants[0]['image_url'] if variants else None
+
+    def download_image(self, image_url: str) -> bytes:
+        """Download an image (through the HTTP cache and rate limiter)"""
+        with self.metrics.timer('image_download'):
+            response = self.rate_limiter.request(self.session, 'GET', image_url, timeout=30)
+            response.raise_for_status()
+        return response.content
+
+    def upload_image_variants(self, image_url: str, transcode: bool = True, data: bytes = None) -> List[Dict]:
+        """
+        Download an image and store it in Supabase Storage
+
+        With a transcoder (and `transcode`), each resized variant is uploaded and
+        returned largest first as {'width', 'image_url'}; otherwise the original
+        is uploaded as is (width None), streamed from the CDN without being held
+        in memory. `data` skips the download when the image was already fetched.
+        Returns an empty list on error.
+        """
+        try:
+            if data is None and (not self.transcoder or not transcode):
+                with self.metrics.timer('image_transfer'):
+                    return [{'width': None, 'image_url': self.image_store.transfer(image_url)}]
+
+            if data is None:
+                data = self.download_image(image_url)
+
+            if not self.transcoder or not transcode:
+                # Upload to Supabase (skipped if the same bytes are already stored)
+                return [{'width': None, 'image_url': self.image_store.put(data)}]
+
+            with self.metrics.timer('transcode'):
+                variants = self.transcoder.transcode(data)
+
+            return [{
+                'width': variant['width'],
+                'image_url': self.image_store.put(variant['data'], variant['content_type'], variant['extension'])
+            } for variant in variants]
+
+        except Exception as e:
+            print(f"      ❌ Error uploading image: {e}")
+            return []
+
+    def upload_product_image(self, product: Dict) -> Tuple[Optional[str], List[Dict]]:
+        """
+        Upload a product's image unless the run journal already has it
+
+        Returns (outfit id if the product was already posted in this run, or
+        is a near-duplicate of a posted product, uploaded image variants); the
+        variants list is empty on error.
+        """
+        posted, variants = self.resume(product)
+        if posted or variants:
+            return posted, variants
+
+        # Upload image (and its resized variants)
+        print(f"   📸 Uploading image...")
+        data = None
+        if self.near_dups:
+            try:
+                data = self.download_image(product['image_url'])
+                with self.metrics.timer('image_hash'):
+                    image_hash = self.near_dups.hash(data)
+            except Exception as e:
+                print(f"      ❌ Error hashing image: {e}")
+                return None, []
+
+            match = self.match_near_duplicate(product, image_hash)
+            if match:
+                return self.handle_near_duplicate(product, *match), []
+
+        variants = self.upload_image_variants(product['image_url'], data=data)
+        if variants:
+            variants += self.upload_gallery(product)
+        self.image_uploaded(product, variants)
+        return None, variants
+
+    def handle_near_duplicate(self, product: Dict, key: str, outfit_id: Optional[str], distance: int) -> Optional[str]:
+        """
+        Skip a product whose image is a near-duplicate of a posted one, or link it to that post
+
+        Linking adds the product's clothing pieces (its sizes and purchase link)
+        to the existing outfit. Returns the existing outfit id, or None while the
+        match is still being posted (the product stays pending in the journal).
+        """
+        from image_hashes import LINK
+
+        action = self.near_duplicate_action(key, outfit_id, distance)
+        if not action:
+            return None
+
+        if action == LINK:
+            try:
+                with self.metrics.timer('db_insert'), self.rate_limiter.guard(self.supabase_url):
+                    self.supabase.table('clothing_pieces').upsert(
+                        clothing_piece_rows(product, outfit_id), on_conflict='id', ignore_duplicates=True
+                    ).execute()
+            except Exception as e:
+                print(f"      ❌ Error linking near-duplicate: {e}")
+                self.failed(product, e)
+                return None
+
+        return self.near_duplicate_done(product, key, outfit_id, distance)
+
+    def upload_gallery(self, product: Dict) -> List[Dict]:
+        """Upload the other gallery images of an enriched product, as originals tagged with their display order"""
+        gallery = []
+        for order, image_url in enumerate(gallery_urls(product), 1):
+            uploaded = self.upload_image_variants(image_url, transcode=False)
+            if uploaded:
+                gallery.append({**uploaded[0], 'display_order': order})
+        return gallery
+
+    def create_post(self, product: Dict, dry_run: bool = False) -> Optional[str]:
+        """Create a post from product data"""
+        try:
+            if dry_run:
+                print(f"   🔍 [DRY RUN] Would create post: {product['brand']} - {product['name']}")
+                return None
+
+            posted, variants = self.upload_product_image(product)
+            if posted or not variants:
+                return posted
+
+            return self.insert_post(product, variants)
+
+        except Exception as e:
+            print(f"   ❌ Error creating post: {e}")
+            self.failed(product, e)
+            return None
+
+    def insert_post(self, product: Dict, variants: List[Dict]) -> Optional[str]:
+        """
+        Insert the outfit, clothing pieces and image variant rows of an uploaded product
+
+        Rows are upserted on ids derived from the outfit id (and, with a run
+        journal, the outfit id from the run and product), so replaying an
+        interrupted insert does not create a second post.
+        """
+        image_url = variants[0]['image_url']
+        outfit_id = self.journal.outfit_id(product) if self.journal else None
+
+        # Create outfit post
+        print(f"   📝 Creating post...")
+        with self.metrics.timer('db_insert'):
+            with self.rate_limiter.guard(self.supabase_url):
+                if outfit_id:
+                    self.supabase.table('outfits').upsert(
+                        outfit_row(product, self.bot_user_id, image_url, outfit_id), on_conflict='id', ignore_duplicates=True
+                    ).execute()
+                else:
+                    outfit_result = self.supabase.table('outfits').insert(
+                        outfit_row(product, self.bot_user_id, image_url)
+                    ).execute()
+
+                    if not outfit_result.data:
+                        return None
+
+                    outfit_id = outfit_result.data[0]['id']
+
+            # Add clothing pieces
+            with self.rate_limiter.guard(self.supabase_url):
+                self.supabase.table('clothing_pieces').upsert(
+                    clothing_piece_rows(product, outfit_id), on_conflict='id', ignore_duplicates=True
+                ).execute()
+
+            # Record resized variants of the main image
+            variant_rows = image_variant_rows(outfit_id, variants[1:])
+            if variant_rows:
+                with self.rate_limiter.guard(self.supabase_url):
+                    self.supabase.table('outfit_images').upsert(variant_rows, on_conflict='id', ignore_duplicates=True).execute()
+
+        self.posted(product, outfit_id)
+        print(f"   ✅ Post created: {outfit_id}")
+        return outfit_id
+
+    def create_posts(self, products: List[Dict], dry_run: bool = False, concurrency: int = 1,
+                     storage_concurrency: int = 4, rest_concurrency: int = 8, batch_size: int = 1):
+        """
+        Create multiple posts
+
+        Args:
+            products: Products returned by scrape_category
+            dry_run: Only print what would be posted
+            concurrency: Products in flight at once (> 1 switches to the async engine)
+            storage_concurrency: Concurrent Storage uploads in async mode
+            rest_concurrency: Concurrent PostgREST calls in async mode
+            batch_size: Products per batched insert (> 1 uses BulkWriter, ~2 round trips per batch)
+        """
+        from bulk_writer import BulkWriter
+
+        print(f"\n🚀 Creating {len(products)} posts...")
+
+        success = 0
+        errors = 0
+
+        writer = None
+        if batch_size > 1 and not dry_run:
+            writer = BulkWriter(self.supabase, self.supabase_url, self.bot_user_id, self.rate_limiter,
+                                batch_size=batch_size, dedup=self.dedup, journal=self.journal,
+                                near_dups=self.near_dups, watermarks=self.watermarks)
+
+        if concurrency > 1 and not dry_run:
+            from async_poster import run_async_posts
+
+            print(f"⚡ Async mode: {concurrency} in flight, {storage_concurrency} uploads, {rest_concurrency} REST calls")
+            success, errors = run_async_posts(
+                self.supabase_url,
+                self.supabase_key,
+                self.bot_user_id,
+                products,
+                headers=self.headers,
+                rate_limiter=self.rate_limiter,
+                dedup=self.dedup,
+                transcoder=self.transcoder,
+                writer=writer,
+                http_cache=self.http_cache,
+                journal=self.journal,
+                near_dups=self.near_dups,
+                watermarks=self.watermarks,
+                concurrency=concurrency,
+                storage_concurrency=storage_concurrency,
+                rest_concurrency=rest_concurrency
+            )
+        elif writer:
+            print(f"📦 Batched inserts: {batch_size} products per request")
+            results = []
+            for product in products:
+                posted, variants = self.upload_product_image(product)
+                if posted:
+                    results.append(posted)
+                elif variants:
+                    results.extend(writer.add(product, variants))
+                else:
+                    errors += 1
+            results.extend(writer.flush())
+
+            success = sum(1 for result in results if result)
+            errors += len(results) - success
+        else:
+            for product in products:
+                result = self.create_post(product, dry_run)
+                if result or dry_run:
+                    success += 1
+                else:
+                    errors += 1
+
+        self.metrics.count('posts_created', success)
+        self.metrics.count('posts_failed', errors)
+
+        print(f"\n📊 Summary:")
+        print(f"   ✅ Success: {success}")
+        print(f"   ❌ Errors: {errors}")
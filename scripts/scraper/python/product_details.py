@@ -0,0 +1,254 @@
+"""
+Product page enrichment for the Zalando scrapers
+Listing pages only carry a name, a brand, a price string and one image. The
+product page's embedded JSON has the real available sizes, the category, the
+whole image gallery and a numeric price; ProductEnricher fetches those pages
+on a small thread pool while the listing crawl goes on.
+"""
+
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from catalog_snapshots import PAGE, SnapshotWriter
+from run_journal import RunJournal
+from watermarks import Watermarks
+from listing_parser import MEDIA_URL, clean_image_url, format_price, json_blocks, name_text, walk_json
+from metrics import get_metrics
+
+# Gallery images kept per product (main image included)
+MAX_IMAGES = 8
+
+# Stock values meaning a size cannot be bought
+SOLD_OUT_MARKERS = ('outofstock', 'out_of_stock', 'soldout', 'sold_out', 'unavailable', 'discontinued')
+STOCK_KEYS = ('availability', 'stock', 'stockStatus', 'quantity', 'available', 'isAvailable')
+
+
+def _in_stock(value: Dict) -> bool:
+    """Whether an offer / size entry can be bought (entries without stock information are)"""
+    candidates = [value] + [nested for nested in value.values() if isinstance(nested, dict)]
+    for candidate in candidates:
+        for key in STOCK_KEYS:
+            stock = candidate.get(key)
+            if isinstance(stock, dict):
+                stock = stock.get('quantity', stock.get('status'))
+            if stock is None:
+                continue
+            if isinstance(stock, bool):
+                return stock
+            if isinstance(stock, (int, float)):
+                return stock > 0
+            text = str(stock).lower().replace(' ', '')
+            return not any(marker in text for marker in SOLD_OUT_MARKERS)
+    return True
+
+
+def _number(value: Any) -> Optional[float]:
+    try:
+        return float(str(value).replace(',', '.').replace(' ', '').strip())
+    except ValueError:
+        return None
+
+
+def _images(value: Dict) -> List[str]:
+    """Image URLs of a Product (`image`) or hydration article (`media` / `images`)"""
+    images = []
+    for key in ('image', 'images', 'media'):
+        entries = value.get(key)
+        for entry in entries if isinstance(entries, list) else [entries]:
+            if isinstance(entry, dict):
+                entry = entry.get('url') or entry.get('contentUrl') or entry.get('uri') or entry.get('path')
+            if isinstance(entry, str) and entry:
+                images.append(entry if entry.startswith('http') else MEDIA_URL + entry.lstrip('/'))
+    return images
+
+
+def _is_product(value: Dict) -> bool:
+    return value.get('@type') == 'Product' or 'sku' in value
+
+
+def parse_product_page(html) -> Dict:
+    """
+    Details from a product page's embedded JSON
+
+    Only the page's own product is read: the first Product (or hydration
+    article) of the page, and any later object with the same SKU.
+    Recommendations and "similar items" have their own sizes and offers and
+    are ignored.
+
+    Returns a dict with `sizes` (available sizes in page order; None if the
+    page lists none, [] if every size is sold out), `category`, `images`
+    (gallery, main image first), `price_value` and `currency` (None when not
+    found).
+    """
+    if isinstance(html, str):
+        html = html.encode('utf-8')
+
+    breadcrumb: List[str] = []
+    main: List[Dict] = []
+    read = set()
+
+    for document in json_blocks(html):
+        for value in walk_json(document):
+            if value.get('@type') == 'BreadcrumbList':
+                names = [name_text(item.get('name') or item.get('item')) for item in value.get('itemListElement') or []
+                         if isinstance(item, dict)]
+                breadcrumb = [name for name in names if name]
+            elif _is_product(value) and (not main or value.get('sku') and value.get('sku') == main[0].get('sku')):
+                # The page's own product comes first; later ones are recommendations
+                main.append(value)
+
+    sizes: List[str] = []
+    listed_sizes = False
+    category = None
+    images: List[str] = []
+    price_value = None
+    currency = None
+
+    for product in main:
+        category = category or name_text(product.get('category'))
+        images = images or _images(product)
+
+        for value in walk_json(product):
+            # Objects nested in an earlier one (its offers) are read once
+            if id(value) in read:
+                continue
+            read.add(id(value))
+
+            size = value.get('size') or value.get('sizeName')
+            if isinstance(size, str) and size.strip():
+                listed_sizes = True
+                if _in_stock(value) and size.strip() not in sizes:
+                    sizes.append(size.strip())
+
+            if price_value is None and (value.get('@type') in ('Offer', 'AggregateOffer') or 'priceCurrency' in value):
+                price_value = _number(value.get('price') or value.get('lowPrice') or '')
+                currency = value.get('priceCurrency') or currency
+
+    # Breadcrumbs end with the product itself: the category is the entry before it
+    if not category and len(breadcrumb) > 1:
+        category = breadcrumb[-2]
+
+    gallery = []
+    for image in images:
+        image = clean_image_url(image)
+        if image not in gallery:
+            gallery.append(image)
+
+    return {
+        'sizes': sizes if listed_sizes else None,
+        'category': category,
+        'images': gallery[:MAX_IMAGES],
+        'price_value': price_value,
+        'currency': currency,
+    }
+
+
+def apply_details(product: Dict, details: Dict) -> Dict:
+    """Copy of `product` with the details found on its page (listing values kept for the others)"""
+    enriched = dict(product)
+    if details.get('sizes') is not None:
+        enriched['sizes'] = details['sizes']
+    if details.get('category'):
+        enriched['category'] = details['category']
+    if details.get('images'):
+        enriched['images'] = details['images']
+    if details.get('price_value') is not None:
+        enriched['price_value'] = details['price_value']
+        enriched['currency'] = details.get('currency') or 'EUR'
+        enriched['price'] = format_price(details['price_value'], enriched['currency'])
+    return enriched
+
+
+def gallery_urls(product: Dict) -> List[str]:
+    """Enriched gallery images other than the main image (compared without their resize parameters)"""
+    main = product['image_url'].split('?')[0]
+    return [image for image in product.get('images') or [] if image.split('?')[0] != main]
+
+
+class ProductEnricher:
+    def __init__(self, session, rate_limiter, workers: int = 4):
+        """
+        Args:
+            session: HttpSession (a CachedSession serves repeated product pages locally)
+            rate_limiter: HostRateLimiter shared with the scraper
+            workers: Product pages fetched concurrently
+        """
+        self.session = session
+        self.rate_limiter = rate_limiter
+        self.workers = max(1, workers)
+        self.metrics = get_metrics()
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='enrich')
+        # Products dropped as sold out: they were selected, so a run posts that many fewer than its limit
+        self.sold_out = 0
+        self.lock = threading.Lock()
+        # Catalog snapshot of the run, set by the CLI: every product page seen is recorded, sold-out ones included
+        self.catalog: Optional[SnapshotWriter] = None
+        # Listing watermarks of incremental runs, set by the CLI: a sold-out product counts as seen
+        self.watermarks: Optional[Watermarks] = None
+
+    def enrich(self, product: Dict, journal: RunJournal = None) -> Optional[Dict]:
+        """
+        Product with its page's details, None if every size is sold out
+
+        A page that cannot be fetched or parsed leaves the listing data as is.
+        A sold-out product is closed as skipped in `journal`, so the run can
+        finish and --resume does not fetch its page again.
+        """
+        try:
+            with self.metrics.timer('enrich'):
+                response = self.rate_limiter.request(self.session, 'GET', product['product_url'], timeout=30)
+                response.raise_for_status()
+                details = parse_product_page(response.content)
+        except Exception as e:
+            print(f"      ⚠️  Could not enrich {product['name']}: {e}")
+            self.metrics.count('products_enriched', result='failed')
+            return product
+
+        enriched = apply_details(product, details)
+        if self.catalog:
+            self.catalog.record([enriched], source=PAGE)
+
+        if details['sizes'] == []:
+            print(f"      📭 Sold out, skipped: {product['brand']} - {product['name']}")
+            self.metrics.count('products_enriched', result='sold_out')
+            with self.lock:
+                self.sold_out += 1
+            if journal:
+                journal.skipped(product, 'sold out')
+            if self.watermarks:
+                self.watermarks.done(product)
+            return None
+
+        self.metrics.count('products_enriched', result='ok')
+        return enriched
+
+    def enrich_iter(self, products: Iterable[Dict], journal: RunJournal = None) -> Iterator[Dict]:
+        """
+        Enrich products as they arrive (e.g. from iter_category), keeping their order
+
+        Up to twice `workers` product pages are in flight while `products` keeps
+        being consumed, so the listing crawl and the product pages overlap.
+        Sold-out products are dropped (and closed in `journal`).
+        """
+        window = deque()
+        for product in products:
+            window.append(self.executor.submit(self.enrich, product, journal))
+            if len(window) >= self.workers * 2:
+                enriched = window.popleft().result()
+                if enriched:
+                    yield enriched
+
+        while window:
+            enriched = window.popleft().result()
+            if enriched:
+                yield enriched
+
+    def enrich_all(self, products: List[Dict], journal: RunJournal = None) -> List[Dict]:
+        return list(self.enrich_iter(products, journal))
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        if self.sold_out:
+            print(f"📭 {self.sold_out} selected products were sold out: this run posts that many fewer than its limit")
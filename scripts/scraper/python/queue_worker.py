@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Queue worker for the Zalando scraper
+Leases listing-page tasks from the job queue (see job_queue.py) and posts
+their new products, until the batch is finished. Start as many as the rate
+limits allow, on one machine (--processes) or on several sharing the queue
+file (see job_queue.py for the storage this needs): the host budgets of rate_limiter.py are split between the live
+workers, so adding workers scales until those budgets are used up.
+
+Each task posts through its own run journal (kept next to the queue file):
+a task retried after a crash resumes it instead of posting twice.
+
+    python job_queue.py enqueue --category mode-femme mode-homme --pages 10
+    python queue_worker.py --processes 4
+"""
+
+import multiprocessing
+import threading
+import time
+from pathlib import Path
+from typing import Dict
+
+from job_queue import DEFAULT_LEASE_SECONDS, DEFAULT_PATH, JobQueue, Task, worker_name
+from run_journal import RunJournal, DONE_STATES, OUTFIT_INSERTED
+
+# Seconds between two looks at the queue while other workers hold its last tasks (--poll)
+POLL_SECONDS = 5.0
+
+
+class Lease:
+    """Renews a task's lease (and the worker's heartbeat) in the background while the task runs"""
+
+    def __init__(self, queue: JobQueue, task: Task, owner: str, lease_seconds: float):
+        self.queue = queue
+        self.task = task
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        self.lost = False
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._renew, name='lease', daemon=True)
+
+    def _renew(self):
+        while not self.stopped.wait(self.lease_seconds / 3):
+            self.queue.heartbeat(self.owner)
+            if not self.queue.renew(self.task, self.owner, self.lease_seconds):
+                print(f"⚠️  Lost the lease on task #{self.task.id}, another worker will redo it")
+                self.lost = True
+                return
+
+    def __enter__(self) -> 'Lease':
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+
+def run_task(scraper, queue: JobQueue, task: Task, owner: str, dry_run: bool, batch_size: int) -> Dict:
+    """
+    Scrape and post one listing page, returns the task result
+
+    Raises if some products could not be posted: the task is retried and
+    resumes its journal, so only those are posted again.
+    """
+    journal = None
+    if not dry_run:
+        # Not the scrapers' journal.sqlite: this one may sit on shared storage, without WAL
+        journal_path = queue.path.parent / 'queue_journal.sqlite'
+        if task.run_id:
+            journal = RunJournal(task.run_id, journal_path, shared=True)
+            journal.set_status('running')
+        else:
+            journal = RunJournal.start('queue', task.params, journal_path, shared=True)
+            queue.attach_run(task, owner, journal.run_id)
+    scraper.journal = journal
+
+    try:
+        resumed = journal.pending() if journal else []
+        # Dry runs post nothing, so they claim nothing either
+        claim = None if dry_run else lambda keys: queue.claim(task, keys)
+        products = scraper.scrape_page(task.category, task.filters, task.page, task.limit, claim=claim)
+        end = products is None
+        products = resumed + (products or [])
+        if products and scraper.enricher:
+            products = scraper.enricher.enrich_all(products, journal)
+        if products:
+            scraper.create_posts(products, dry_run, batch_size=batch_size)
+
+        if not journal:
+            return {'end': end, 'posted': 0, 'selected': len(products)}
+
+        journal.finish()
+        counts = journal.counts()
+        unposted = sum(n for state, n in counts.items() if state not in DONE_STATES)
+        if unposted:
+            raise RuntimeError(f"{unposted} products not posted")
+        return {'end': end, 'posted': counts.get(OUTFIT_INSERTED, 0), 'selected': sum(counts.values())}
+    finally:
+        scraper.journal = None
+        if journal:
+            journal.close()
+
+
+def work(options: Dict) -> Dict:
+    """Worker loop: lease, run, report, until no task of the batch is left; returns what it did"""
+    # Imported here so --help and the parent of --processes start without the scraper's dependencies
+    from zalando_scraper import ZalandoScraper
+    from metrics import get_metrics
+
+    if options['metrics_dir']:
+        get_metrics().configure(options['metrics_dir'])
+
+    scraper = ZalandoScraper(dedup=not options['no_dedup'], cache_size_mb=options['cache_size'],
+                             dry_run=options['dry_run'])
+    if options['enrich']:
+        from product_details import ProductEnricher
+        scraper.enricher = ProductEnricher(scraper.session, scraper.rate_limiter, workers=options['enrich_workers'])
+
+    queue = JobQueue(options['queue'])
+    owner = worker_name()
+    lease_seconds = options['lease']
+    stats = {'worker': owner, 'done': 0, 'failed': 0, 'posted': 0}
+
+    queue.heartbeat(owner)
+    try:
+        while True:
+            # Every live worker takes an equal part of each host budget
+            scraper.rate_limiter.set_share(queue.live_workers(lease_seconds))
+            task = queue.lease(owner, lease_seconds, options['batch'])
+            if task is None:
+                if not queue.unfinished(options['batch']):
+                    break
+                # Tasks leased by others may still fail and come back, or wait for their retry delay
+                queue.heartbeat(owner)
+                time.sleep(options['poll'])
+                continue
+
+            print(f"\n🧾 Task #{task.id}: {task.category} page {task.page} (attempt {task.attempts})")
+            with Lease(queue, task, owner, lease_seconds) as lease:
+                try:
+                    result = run_task(scraper, queue, task, owner, options['dry_run'], options['batch_size'])
+                except Exception as e:
+                    status = queue.fail(task, owner, f"{type(e).__name__}: {e}")
+                    stats['failed'] += 1
+                    print(f"❌ Task #{task.id} failed: {e}" + (f" ({status})" if status else ''))
+                    continue
+
+            if lease.lost or not queue.complete(task, owner, result):
+                continue
+            stats['done'] += 1
+            stats['posted'] += result['posted']
+            if result['end']:
+                skipped = queue.end_of_listing(task)
+                print(f"🏁 End of {task.category} at page {task.page}, {skipped} later pages skipped")
+    finally:
+        queue.retire(owner)
+        queue.close()
+        if scraper.enricher:
+            scraper.enricher.close()
+        if options['metrics_dir']:
+            get_metrics().close()
+
+    print(f"\n👷 {owner}: {stats['done']} tasks done, {stats['failed']} failed, {stats['posted']} products posted")
+    return stats
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Work through the scrape job queue (see job_queue.py)')
+    parser.add_argument('--queue', type=Path, default=DEFAULT_PATH, help='Queue file shared by the workers')
+    parser.add_argument('--batch', help='Only work on this batch (default: every batch)')
+    parser.add_argument('--processes', type=int, default=1, help='Worker processes started on this machine')
+    parser.add_argument('--lease', type=float, default=DEFAULT_LEASE_SECONDS,
+                        help='Seconds a task stays with a worker that stopped renewing it')
+    parser.add_argument('--poll', type=float, default=POLL_SECONDS,
+                        help='Seconds between two looks at the queue while other workers hold its last tasks')
+    parser.add_argument('--dry-run', action='store_true', help='Test mode without creating posts')
+    parser.add_argument('--no-dedup', action='store_true', help='Do not skip already posted products')
+    parser.add_argument('--cache-size', type=int, default=512, help='On-disk HTTP cache size in MB (0 disables the cache)')
+    parser.add_argument('--batch-size', type=int, default=1, help='Products per batched database insert (> 1 enables batching)')
+    parser.add_argument('--enrich', action='store_true',
+                        help='Fetch product pages for real sizes, category, gallery images and numeric price')
+    parser.add_argument('--enrich-workers', type=int, default=4, help='Product pages fetched in parallel (with --enrich)')
+    parser.add_argument('--metrics-dir', help='Write metrics to this directory (one subdirectory per process)')
+    args = parser.parse_args()
+
+    print(f"👷 InFit queue worker: {args.processes} process(es) on {args.queue}"
+          f"{' (🔍 DRY RUN)' if args.dry_run else ''}")
+    options = {
+        'queue': args.queue,
+        'batch': args.batch,
+        'lease': args.lease,
+        'poll': args.poll,
+        'dry_run': args.dry_run,
+        'no_dedup': args.no_dedup,
+        'cache_size': args.cache_size,
+        'batch_size': args.batch_size,
+        'enrich': args.enrich,
+        'enrich_workers': args.enrich_workers,
+        'metrics_dir': args.metrics_dir,
+    }
+
+    if args.processes <= 1:
+        work(options)
+        return
+
+    # Spawned, not forked: each worker builds its own client, pools and SQLite connections
+    context = multiprocessing.get_context('spawn')
+    per_process = [{**options, 'metrics_dir': args.metrics_dir and str(Path(args.metrics_dir) / f"worker-{i}")}
+                   for i in range(args.processes)]
+    with context.Pool(args.processes) as pool:
+        results = pool.map(work, per_process)
+    print(f"\n✅ {sum(r['done'] for r in results)} tasks done, {sum(r['failed'] for r in results)} failed, "
+          f"{sum(r['posted'] for r in results)} products posted")
+
+
+if __name__ == '__main__':
+    main()
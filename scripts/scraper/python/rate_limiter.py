@@ -0,0 +1,394 @@
+"""
+Host-aware rate limiting for the Zalando scrapers
+One token bucket per host (Zalando, image CDN, Supabase) with adaptive
+backoff on 429/503 responses and support for Retry-After, plus a circuit
+breaker per host and hedging of slow GETs (see resilience.py)
+"""
+
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from metrics import get_metrics, host_of
+from resilience import (HEDGE_METHODS, OUTAGE_STATUSES, CircuitBreaker, LatencyTracker, hedged, hedged_async,
+                        is_outage)
+
+# (requests per second, burst) matched against the end of the host name
+HOST_RATES: Dict[str, Tuple[float, int]] = {
+    'zalando.fr': (2.0, 4),
+    'ztat.net': (10.0, 20),
+    'supabase.co': (20.0, 40),
+}
+DEFAULT_RATE: Tuple[float, int] = (5.0, 10)
+
+THROTTLE_STATUSES = (429, 503)
+
+# Methods a throttled request is retried for unless the caller says otherwise (`idempotent`)
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (delay in seconds or HTTP date)"""
+    if not value:
+        return None
+
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def sent_bytes(kwargs: Dict) -> int:
+    """Size of a raw or streamed request body (uploads), 0 for JSON/form bodies and async streams"""
+    body = kwargs.get('content') or kwargs.get('data')
+    if body is None or isinstance(body, (str, dict, list, tuple)):
+        return 0
+    try:
+        # Streamed bodies (image_transfer.FileWindow) report their size through __len__
+        return len(body)
+    except TypeError:
+        return 0
+
+
+def replayable(kwargs: Dict) -> bool:
+    """
+    Whether a request's body can be sent again
+
+    Bytes, text, JSON and re-iterable bodies (image_transfer.FileWindow and
+    AsyncFileWindow reopen their file on each iteration) can; iterators,
+    generators and file objects were consumed by the first attempt.
+    """
+    body = kwargs.get('content') if kwargs.get('content') is not None else kwargs.get('data')
+    if body is None or isinstance(body, (bytes, str, dict, list, tuple)):
+        return True
+    return not any(hasattr(body, name) for name in ('__next__', '__anext__', 'read'))
+
+
+def retryable(method: str, idempotent: Optional[bool], kwargs: Dict) -> bool:
+    """Whether a throttled request may be sent again: an idempotent method, or one the caller vouches for"""
+    if idempotent is None:
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+    return idempotent and replayable(kwargs)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int, min_rate: float = None, max_backoff: float = 60.0):
+        """
+        Args:
+            rate: Sustained requests per second
+            burst: Requests allowed back to back after an idle period
+            min_rate: Floor for the adaptive rate (defaults to a tenth of `rate`)
+            max_backoff: Upper bound for exponential backoff without Retry-After
+        """
+        self.base_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate or rate / 10
+        self.burst = burst
+        self.max_backoff = max_backoff
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.failures = 0
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token and return how long the caller must wait before using it"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(delay, self.paused_until - now)
+
+    def try_take(self) -> bool:
+        """Take a token only if one is available right now (for optional requests such as hedges)"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1 or now < self.paused_until:
+                return False
+            self.tokens -= 1
+            return True
+
+    def pause_remaining(self) -> float:
+        """Seconds left in a backoff pause set after the token was reserved"""
+        with self.lock:
+            return max(0.0, self.paused_until - time.monotonic())
+
+    def throttled(self, retry_after: Optional[float] = None) -> float:
+        """Register a 429/503: halve the rate and pause the bucket, returns the pause"""
+        with self.lock:
+            self.failures += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+
+            if retry_after is None:
+                retry_after = min(self.max_backoff, 2 ** (self.failures - 1))
+
+            self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+            self.tokens = min(self.tokens, 0.0)
+            return retry_after
+
+    def succeeded(self):
+        """Register a successful response: slowly recover towards the base rate"""
+        with self.lock:
+            self.failures = 0
+            if self.rate < self.base_rate:
+                self.rate = min(self.base_rate, self.rate + self.base_rate * 0.1)
+
+    def set_base_rate(self, rate: float, burst: int):
+        """Change the sustained rate, keeping any adaptive slowdown in proportion"""
+        with self.lock:
+            self.rate = min(rate, self.rate * rate / self.base_rate)
+            self.base_rate = rate
+            self.min_rate = rate / 10
+            self.burst = burst
+            self.tokens = min(self.tokens, float(burst))
+
+
+class HostRateLimiter:
+    def __init__(self, rates: Dict[str, Tuple[float, int]] = None, default: Tuple[float, int] = DEFAULT_RATE):
+        self.rates = rates if rates is not None else dict(HOST_RATES)
+        self.default = default
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        # Recent latencies per endpoint, for hedging
+        self.latency = LatencyTracker()
+        # Processes sharing the host budgets (queue workers, see job_queue.py); each gets an equal part
+        self.share = 1
+        self.lock = threading.Lock()
+
+    def _key(self, url: str) -> Tuple[str, Tuple[float, int]]:
+        host = (urlparse(url).hostname or url).lower()
+        for suffix, rate in self.rates.items():
+            if host == suffix or host.endswith('.' + suffix):
+                # All hosts of a family (img01.ztat.net, img02.ztat.net, ...) share one bucket
+                return suffix, rate
+        return host, self.default
+
+    def _budget(self, rate: float, burst: int) -> Tuple[float, int]:
+        return rate / self.share, max(1, burst // self.share)
+
+    def bucket(self, url: str) -> TokenBucket:
+        """Token bucket responsible for the host of `url`"""
+        key, limits = self._key(url)
+        with self.lock:
+            if key not in self.buckets:
+                self.buckets[key] = TokenBucket(*self._budget(*limits))
+            return self.buckets[key]
+
+    def breaker(self, url: str) -> CircuitBreaker:
+        """Circuit breaker of the host family of `url`"""
+        key, _ = self._key(url)
+        with self.lock:
+            if key not in self.breakers:
+                self.breakers[key] = CircuitBreaker(key)
+            return self.breakers[key]
+
+    def endpoint(self, method: str, url: str, stream: bool = False) -> str:
+        """Latency key of a request: method, host family and first path segment (ids collapsed)"""
+        key, _ = self._key(url)
+        segment = urlparse(url).path.strip('/').split('/')[0]
+        if any(char.isdigit() for char in segment):
+            segment = '*'
+        # A streamed response returns after its headers: its own latencies
+        return f"{method} {key}/{segment}{' stream' if stream else ''}"
+
+    def set_share(self, processes: int):
+        """Split every host budget between `processes` processes running at once, so together they stay within it"""
+        with self.lock:
+            if max(1, processes) == self.share:
+                return
+            self.share = max(1, processes)
+            for key, bucket in self.buckets.items():
+                bucket.set_base_rate(*self._budget(*self.rates.get(key, self.default)))
+
+    def acquire(self, url: str):
+        """Block until a request to `url` is allowed (waiting out an open circuit breaker first)"""
+        self.breaker(url).wait()
+        bucket = self.bucket(url)
+        delay = bucket.reserve()
+        if delay > 0:
+            get_metrics().count('rate_limit_wait_seconds', delay, host=host_of(url))
+        while delay > 0:
+            time.sleep(delay)
+            delay = bucket.pause_remaining()
+
+    async def acquire_async(self, url: str):
+        """Wait (without blocking the event loop) until a request to `url` is allowed"""
+        await self.breaker(url).wait_async()
+        bucket = self.bucket(url)
+        delay = bucket.reserve()
+        if delay > 0:
+            get_metrics().count('rate_limit_wait_seconds', delay, host=host_of(url))
+        while delay > 0:
+            await asyncio.sleep(delay)
+            delay = bucket.pause_remaining()
+
+    @contextmanager
+    def guard(self, url: str):
+        """
+        Rate-limit a call made through another client (supabase-py) like acquire()
+
+        A transport error raised inside counts against the host's breaker; the
+        responses themselves reach record() through watch().
+        """
+        self.acquire(url)
+        try:
+            yield
+        except Exception as e:
+            self._failed(url, e)
+            raise
+
+    def watch(self, client):
+        """Feed every response of an httpx.Client the limiter does not send itself to record() (status and Retry-After)"""
+        def record(response):
+            self.record(str(response.request.url), response.status_code, response.headers)
+
+        client.event_hooks['response'].append(record)
+
+    def record(self, url: str, status_code: int, headers=None) -> Optional[float]:
+        """Feed a response back into the bucket and breaker, returns the backoff if the host throttled us"""
+        bucket = self.bucket(url)
+        if status_code in OUTAGE_STATUSES:
+            self.breaker(url).failure()
+        else:
+            self.breaker(url).success()
+
+        if status_code in THROTTLE_STATUSES:
+            retry_after = parse_retry_after((headers or {}).get('Retry-After'))
+            return bucket.throttled(retry_after)
+
+        bucket.succeeded()
+        return None
+
+    def _failed(self, url: str, error: Exception):
+        """A request raised: an outage for the host's breaker, or no verdict on it"""
+        if is_outage(error):
+            self.breaker(url).failure()
+        else:
+            self.breaker(url).release()
+
+    def _measured(self, endpoint: str, response, seconds: float):
+        # Cached responses and errors say nothing about how fast the endpoint answers
+        if response.status_code < 500 and not getattr(response, 'from_cache', False):
+            self.latency.record(endpoint, seconds)
+
+    def request(self, session, method: str, url: str, max_retries: int = 3, idempotent: bool = None, **kwargs):
+        """
+        Perform a rate-limited request with an HttpSession (see http_transport.py)
+
+        Throttled responses (429/503) are retried up to `max_retries` times after
+        the backoff; the last response is returned either way. Only idempotent
+        methods are retried, plus requests the caller marks `idempotent` (an
+        upsert with explicit ids, a content-addressed upload), and never one
+        whose body cannot be sent again (see replayable()). A fresh response
+        from a caching session (see http_cache.py) is returned without waiting
+        for a token. A GET or HEAD still unanswered at its endpoint's p95 is
+        hedged (see resilience.py).
+        """
+        metrics = get_metrics()
+        cached = session.cached_response(method, url) if hasattr(session, 'cached_response') else None
+        if cached is not None:
+            metrics.count('http_cache_hits', host=host_of(url))
+            return cached
+
+        endpoint = self.endpoint(method, url, kwargs.get('stream', False))
+        hedge_after = self.latency.hedge_delay(endpoint) if method in HEDGE_METHODS else None
+        if not retryable(method, idempotent, kwargs):
+            max_retries = 0
+        for attempt in range(max_retries + 1):
+            self.acquire(url)
+            start = time.perf_counter()
+            try:
+                if hedge_after is None:
+                    response = session.request(method, url, **kwargs)
+                else:
+                    response, outcome = hedged(lambda: session.request(method, url, **kwargs), hedge_after,
+                                               self.bucket(url).try_take)
+                    if outcome:
+                        metrics.count('hedged_requests', endpoint=endpoint, winner=outcome)
+            except Exception as e:
+                self._failed(url, e)
+                raise
+            self._measured(endpoint, response, time.perf_counter() - start)
+            metrics.http(method, url, response, time.perf_counter() - start, sent_bytes(kwargs))
+            backoff = self.record(url, response.status_code, response.headers)
+
+            if backoff is None or attempt == max_retries:
+                return response
+            if kwargs.get('stream'):
+                # Unread, a streamed response would keep its pooled connection
+                response.close()
+
+            metrics.count('http_retries', host=host_of(url))
+            print(f"      ⏸️  {urlparse(url).hostname} throttled ({response.status_code}), retrying in {backoff:.1f}s")
+
+        return response
+
+    async def request_async(self, client, method: str, url: str, max_retries: int = 3, stream: bool = False,
+                            idempotent: bool = None, **kwargs):
+        """
+        Async counterpart of request() for an httpx.AsyncClient (same retry rules)
+
+        With stream=True the body is not read: the caller consumes it and must
+        close the response (aclose()).
+        """
+        metrics = get_metrics()
+
+        async def send():
+            if stream:
+                return await client.send(client.build_request(method, url, **kwargs), stream=True)
+            return await client.request(method, url, **kwargs)
+
+        endpoint = self.endpoint(method, url, stream)
+        hedge_after = self.latency.hedge_delay(endpoint) if method in HEDGE_METHODS else None
+        if not retryable(method, idempotent, kwargs):
+            max_retries = 0
+        for attempt in range(max_retries + 1):
+            await self.acquire_async(url)
+            start = time.perf_counter()
+            try:
+                if hedge_after is None:
+                    response = await send()
+                else:
+                    response, outcome = await hedged_async(send, hedge_after, self.bucket(url).try_take)
+                    if outcome:
+                        metrics.count('hedged_requests', endpoint=endpoint, winner=outcome)
+            except Exception as e:
+                self._failed(url, e)
+                raise
+            self._measured(endpoint, response, time.perf_counter() - start)
+            metrics.http(method, url, response, time.perf_counter() - start, sent_bytes(kwargs))
+            backoff = self.record(url, response.status_code, response.headers)
+
+            if backoff is None or attempt == max_retries:
+                return response
+            if stream:
+                await response.aclose()
+
+            metrics.count('http_retries', host=host_of(url))
+            print(f"      ⏸️  {urlparse(url).hostname} throttled ({response.status_code}), retrying in {backoff:.1f}s")
+
+        return response
+
+
+_shared_limiter: Optional[HostRateLimiter] = None
+
+
+def get_rate_limiter() -> HostRateLimiter:
+    """Process-wide limiter, so every scraper in a run shares the same host budgets"""
+    global _shared_limiter
+    if _shared_limiter is None:
+        _shared_limiter = HostRateLimiter()
+    return _shared_limiter
@@ -0,0 +1,275 @@
+"""
+Tail-latency control for the Zalando scrapers
+Per-endpoint latency tracking, hedged requests and per-host circuit
+breakers, applied by HostRateLimiter (see rate_limiter.py) to every request
+it sends.
+
+- Each endpoint (method, host family, first path segment) keeps its recent
+  latencies. Once it has enough of them, a GET or HEAD still unanswered at
+  the endpoint's p95 is sent a second time and the first answer wins.
+- A host family whose requests keep failing (connection errors, timeouts,
+  5xx) opens its breaker: requests to it wait instead of each burning its
+  timeout, so the pipeline stages that need it pause. One probe goes through
+  per cooldown and traffic resumes as soon as a probe succeeds. A host still
+  down after MAX_PAUSE_SECONDS fails fast with CircuitOpen.
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeout, wait
+from typing import Callable, Deque, Dict, Optional
+
+from metrics import get_metrics
+
+# Latencies kept per endpoint, and how many are needed before hedging
+LATENCY_WINDOW = 200
+MIN_SAMPLES = 20
+HEDGE_QUANTILE = 0.95
+# Never hedge sooner than this (a fast endpoint gains nothing from a second request)
+MIN_HEDGE_DELAY = 0.05
+HEDGE_METHODS = ('GET', 'HEAD')
+
+# Consecutive failures opening a breaker, and how long it stays open before a probe (doubled per failed probe)
+FAILURE_THRESHOLD = 5
+COOLDOWN_SECONDS = 10.0
+MAX_COOLDOWN_SECONDS = 120.0
+# Requests wait at most this long after a breaker opened, then fail fast until a probe succeeds
+MAX_PAUSE_SECONDS = 300.0
+# A probe whose outcome was never reported (e.g. a Supabase client call) counts as failed after this
+PROBE_TIMEOUT_SECONDS = 60.0
+# Waiting requests look at the breaker at least this often (a probe may close it at any time)
+WAIT_POLL_SECONDS = 0.5
+
+OUTAGE_STATUSES = (500, 502, 503, 504)
+
+CLOSED = 'closed'
+OPEN = 'open'
+
+
+class CircuitOpen(Exception):
+    """Raised instead of sending a request to a host that has been down for too long"""
+
+
+def is_outage(error: BaseException) -> bool:
+    """True for errors saying the host is unreachable or not answering (not for bad requests)"""
+    import httpx
+
+    return isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError))
+
+
+class LatencyTracker:
+    def __init__(self, window: int = LATENCY_WINDOW, min_samples: int = MIN_SAMPLES):
+        """
+        Args:
+            window: Most recent latencies kept per endpoint
+            min_samples: Latencies needed before an endpoint has a quantile
+        """
+        self.window = window
+        self.min_samples = min_samples
+        self.samples: Dict[str, Deque[float]] = {}
+        self.lock = threading.Lock()
+
+    def record(self, endpoint: str, seconds: float):
+        with self.lock:
+            if endpoint not in self.samples:
+                self.samples[endpoint] = deque(maxlen=self.window)
+            self.samples[endpoint].append(seconds)
+
+    def quantile(self, endpoint: str, q: float = HEDGE_QUANTILE) -> Optional[float]:
+        """Latency quantile of an endpoint, None until it has `min_samples` latencies"""
+        with self.lock:
+            samples = self.samples.get(endpoint)
+            if not samples or len(samples) < self.min_samples:
+                return None
+            ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def hedge_delay(self, endpoint: str) -> Optional[float]:
+        """Seconds after which a request to `endpoint` is hedged, None if it is not yet known"""
+        p95 = self.quantile(endpoint)
+        return None if p95 is None else max(MIN_HEDGE_DELAY, p95)
+
+
+class CircuitBreaker:
+    def __init__(self, host: str, threshold: int = FAILURE_THRESHOLD, cooldown: float = COOLDOWN_SECONDS,
+                 max_pause: float = MAX_PAUSE_SECONDS):
+        """
+        Args:
+            host: Host family the breaker protects (for logs and metrics)
+            threshold: Consecutive failures that open the breaker
+            cooldown: Seconds before the first probe once open
+            max_pause: Seconds requests wait for the host to come back before failing fast
+        """
+        self.host = host
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.max_pause = max_pause
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.retry_at = 0.0
+        self.probe_until = 0.0
+        self.metrics = get_metrics()
+        self.lock = threading.Lock()
+
+    def _next(self) -> Optional[float]:
+        """None if a request may go now (possibly as the probe), else seconds to wait; raises CircuitOpen"""
+        with self.lock:
+            if self.state == CLOSED:
+                return None
+            now = time.monotonic()
+            if self.probe_until and now >= self.probe_until:
+                # The probe never reported back: count it as failed
+                self._probe_failed(now)
+            if not self.probe_until and now >= self.retry_at:
+                self.probe_until = now + PROBE_TIMEOUT_SECONDS
+                return None
+            if now - self.opened_at >= self.max_pause:
+                self.metrics.count('circuit_rejected', host=self.host)
+                raise CircuitOpen(f"{self.host} is down (circuit open for {now - self.opened_at:.0f}s)")
+            wake = self.probe_until if self.probe_until else self.retry_at
+            return max(0.05, min(wake, self.opened_at + self.max_pause, now + WAIT_POLL_SECONDS) - now)
+
+    def wait(self):
+        """Block while the breaker is open (the caller may be let through as the probe)"""
+        delay = self._next()
+        if delay is not None:
+            self.metrics.count('circuit_waits', host=self.host)
+        while delay is not None:
+            time.sleep(delay)
+            delay = self._next()
+
+    async def wait_async(self):
+        delay = self._next()
+        if delay is not None:
+            self.metrics.count('circuit_waits', host=self.host)
+        while delay is not None:
+            await asyncio.sleep(delay)
+            delay = self._next()
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            if self.state == CLOSED:
+                return
+            self.state = CLOSED
+            self.cooldown = self.base_cooldown
+            self.probe_until = 0.0
+            down = time.monotonic() - self.opened_at
+        print(f"      ✅ {self.host} is back after {down:.0f}s, resuming")
+        self.metrics.count('circuit_closed', host=self.host)
+
+    def failure(self):
+        with self.lock:
+            now = time.monotonic()
+            if self.state == OPEN:
+                if self.probe_until:
+                    self._probe_failed(now)
+                return
+            self.failures += 1
+            if self.failures < self.threshold:
+                return
+            self.state = OPEN
+            self.opened_at = now
+            self.retry_at = now + self.cooldown
+        print(f"      ⛔ {self.host} is failing ({self.failures} errors in a row), pausing its requests")
+        self.metrics.count('circuit_opened', host=self.host)
+
+    def _probe_failed(self, now: float):
+        # Called with the lock held
+        self.probe_until = 0.0
+        self.cooldown = min(MAX_COOLDOWN_SECONDS, self.cooldown * 2)
+        self.retry_at = now + self.cooldown
+
+    def release(self):
+        """A request ended without saying whether the host is up (e.g. a bad request): let another probe go"""
+        with self.lock:
+            self.probe_until = 0.0
+
+
+_hedge_pool: Optional[ThreadPoolExecutor] = None
+_hedge_lock = threading.Lock()
+
+
+def hedge_pool() -> ThreadPoolExecutor:
+    """Threads running hedged requests (the first attempt and its hedge), shared by the process"""
+    global _hedge_pool
+    with _hedge_lock:
+        if _hedge_pool is None:
+            _hedge_pool = ThreadPoolExecutor(max_workers=64, thread_name_prefix='hedge')
+        return _hedge_pool
+
+
+def _close(response):
+    try:
+        response.close()
+    except Exception:
+        pass
+
+
+def _discard(future):
+    """Close the response of a request that lost the race, whenever it completes"""
+    if not future.cancelled() and future.exception() is None:
+        _close(future.result())
+
+
+def hedged(send: Callable[[], object], delay: float, may_hedge: Callable[[], bool]):
+    """
+    Response of `send()`, sent again if it has not answered after `delay` seconds
+
+    The first successful response wins and the other one is closed. The hedge
+    is only sent if `may_hedge()` agrees (a spare rate-limit token). Returns
+    (response, outcome): outcome is None if no hedge was sent, else which
+    request won, 'first' or 'hedge'.
+    """
+    pool = hedge_pool()
+    first = pool.submit(send)
+    try:
+        return first.result(timeout=delay), None
+    except FutureTimeout:
+        pass
+    if not may_hedge():
+        return first.result(), None
+
+    second = pool.submit(send)
+    pending, error = {first, second}, None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        winners = [future for future in done if future.exception() is None]
+        if winners:
+            winner = first if first in winners else winners[0]
+            for future in done:
+                if future is not winner and future.exception() is None:
+                    _close(future.result())
+            for future in pending:
+                future.add_done_callback(_discard)
+            return winner.result(), 'hedge' if winner is second else 'first'
+        error = next(iter(done)).exception()
+    raise error
+
+
+async def hedged_async(send: Callable, delay: float, may_hedge: Callable[[], bool]):
+    """hedged() for coroutines: `send` is called to create each attempt, the loser is cancelled or closed"""
+    first = asyncio.ensure_future(send())
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    if done or not may_hedge():
+        return await first, None
+
+    second = asyncio.ensure_future(send())
+    pending, error = {first, second}, None
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        winners = [task for task in done if task.exception() is None]
+        if winners:
+            winner = first if first in winners else winners[0]
+            for task in done:
+                if task is not winner and task.exception() is None:
+                    await task.result().aclose()
+            for task in pending:
+                task.cancel()
+            return winner.result(), 'hedge' if winner is second else 'first'
+        error = next(iter(done)).exception()
+    raise error
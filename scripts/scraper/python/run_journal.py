@@ -0,0 +1,214 @@
+"""
+Run journal for the Zalando scrapers
+Records each product's progress through a run (extracted, image uploaded,
+outfit inserted, or skipped when it turns out not to be postable) in a SQLite file, so a run that dies halfway can be resumed
+with --resume and only the remaining work is done again.
+
+Outfit ids are derived from the run and the product key, and every row is
+written with an upsert that ignores duplicates: replaying a step that already
+reached the database (but not the journal) cannot post the same product twice.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from dedup_index import CACHE_DIR, product_key
+
+DEFAULT_PATH = CACHE_DIR / 'journal.sqlite'
+
+# Product states, in order
+EXTRACTED = 'extracted'
+IMAGE_UPLOADED = 'image_uploaded'
+OUTFIT_INSERTED = 'outfit_inserted'
+# Dropped after selection (e.g. sold out on its product page): closed, like a posted product
+SKIPPED = 'skipped'
+DONE_STATES = (OUTFIT_INSERTED, SKIPPED)
+
+# Finished runs older than this are dropped when a new run starts
+KEEP_SECONDS = 30 * 24 * 3600
+
+# Namespace of the outfit ids derived from (run id, product key)
+OUTFIT_NAMESPACE = uuid.UUID('5b0e6f1c-3d7a-4c1e-9a53-2f6d8e4b7c90')
+
+
+class RunJournal:
+    def __init__(self, run_id: str, path: Path = DEFAULT_PATH, shared: bool = False):
+        """
+        Args:
+            run_id: Run the journal records (see start() and resume())
+            path: SQLite file shared by every run
+            shared: The file sits on storage shared by several hosts (queue workers): rollback journal instead of WAL
+        """
+        self.run_id = run_id
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.execute(f"PRAGMA journal_mode={'DELETE' if shared else 'WAL'}")
+        # A checkpoint lost to a power cut is replayed safely, no need to fsync every one
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT PRIMARY KEY,
+                scraper TEXT,
+                params TEXT,
+                status TEXT,
+                started_at REAL,
+                updated_at REAL
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS items (
+                run_id TEXT,
+                key TEXT,
+                category TEXT,
+                product TEXT,
+                state TEXT,
+                variants TEXT,
+                outfit_id TEXT,
+                error TEXT,
+                seq INTEGER,
+                updated_at REAL,
+                PRIMARY KEY (run_id, key)
+            )
+        """)
+        self.conn.commit()
+
+    @classmethod
+    def start(cls, scraper: str, params: Dict, path: Path = DEFAULT_PATH, shared: bool = False) -> 'RunJournal':
+        """Open a journal for a new run"""
+        journal = cls(uuid.uuid4().hex[:12], path, shared)
+        now = time.time()
+        with journal.lock:
+            expired = "SELECT run_id FROM runs WHERE status = 'finished' AND updated_at < ?"
+            journal.conn.execute(f'DELETE FROM items WHERE run_id IN ({expired})', (now - KEEP_SECONDS,))
+            journal.conn.execute(f'DELETE FROM runs WHERE run_id IN ({expired})', (now - KEEP_SECONDS,))
+            journal.conn.execute('INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?)',
+                                 (journal.run_id, scraper, json.dumps(params, sort_keys=True), 'running', now, now))
+            journal.conn.commit()
+        return journal
+
+    @classmethod
+    def resume(cls, scraper: str, params: Dict, path: Path = DEFAULT_PATH) -> 'RunJournal':
+        """Reopen the last unfinished run of `scraper`, or start a new one if there is none"""
+        journal = cls('', path)
+        with journal.lock:
+            row = journal.conn.execute(
+                "SELECT run_id, params FROM runs WHERE scraper = ? AND status != 'finished' "
+                "ORDER BY started_at DESC LIMIT 1",
+                (scraper,)
+            ).fetchone()
+        if row is None:
+            journal.close()
+            print("📒 No unfinished run to resume, starting a new one")
+            return cls.start(scraper, params, path)
+
+        journal.run_id = row[0]
+        if json.loads(row[1] or '{}') != params:
+            print(f"⚠️  Resuming run {journal.run_id}, started with other options: {row[1]}")
+        journal.set_status('running')
+
+        counts = journal.counts()
+        print(f"📒 Resuming run {journal.run_id}: " + ', '.join(f"{n} {state}" for state, n in counts.items()))
+        return journal
+
+    def set_status(self, status: str):
+        with self.lock:
+            self.conn.execute('UPDATE runs SET status = ?, updated_at = ? WHERE run_id = ?',
+                              (status, time.time(), self.run_id))
+            self.conn.commit()
+
+    def finish(self):
+        """Close the run: finished if every product was posted, otherwise left resumable"""
+        pending = sum(n for state, n in self.counts().items() if state not in DONE_STATES)
+        self.set_status('incomplete' if pending else 'finished')
+        if pending:
+            print(f"📒 {pending} products not posted, continue with --resume (run {self.run_id})")
+
+    def outfit_id(self, product: Dict) -> str:
+        """Outfit id of a product in this run, the same on every replay"""
+        return str(uuid.uuid5(OUTFIT_NAMESPACE, f"{self.run_id}:{product_key(product['product_url'])}"))
+
+    def extracted(self, product: Dict, category: str = None):
+        """Record a product selected for posting (no-op if already journaled)"""
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO items VALUES (?, ?, ?, ?, ?, NULL, NULL, NULL, "
+                "(SELECT COUNT(*) FROM items WHERE run_id = ?), ?)",
+                (self.run_id, product_key(product['product_url']), category, json.dumps(product, ensure_ascii=False),
+                 EXTRACTED, self.run_id, time.time())
+            )
+            self.conn.commit()
+
+    def image_uploaded(self, product: Dict, variants: List[Dict]):
+        self._update(product, state=IMAGE_UPLOADED, variants=json.dumps(variants), error=None)
+
+    def outfit_inserted(self, product: Dict, outfit_id: str):
+        self._update(product, state=OUTFIT_INSERTED, outfit_id=outfit_id, error=None)
+
+    def skipped(self, product: Dict, reason: str):
+        """Close a selected product that will not be posted (not retried on resume)"""
+        self._update(product, state=SKIPPED, error=reason)
+
+    def failed(self, product: Dict, error: str):
+        """Keep the product's state (it is retried on resume) and note why it failed"""
+        self._update(product, error=str(error)[:500])
+
+    def _update(self, product: Dict, **columns):
+        # Products handed straight to create_posts were never journaled as extracted
+        self.extracted(product)
+        assignments = ', '.join(f"{column} = ?" for column in columns)
+        with self.lock:
+            self.conn.execute(
+                f"UPDATE items SET {assignments}, updated_at = ? WHERE run_id = ? AND key = ?",
+                (*columns.values(), time.time(), self.run_id, product_key(product['product_url']))
+            )
+            self.conn.commit()
+
+    def checkpoint(self, product: Dict) -> Tuple[Optional[str], Optional[List[Dict]], Optional[str]]:
+        """(state, uploaded variants, outfit id) of a product in this run, all None if unknown"""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT state, variants, outfit_id FROM items WHERE run_id = ? AND key = ?',
+                (self.run_id, product_key(product['product_url']))
+            ).fetchone()
+        if row is None:
+            return None, None, None
+        return row[0], json.loads(row[1]) if row[1] else None, row[2]
+
+    def pending(self) -> List[Dict]:
+        """Products of this run not posted yet, in extraction order"""
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT product FROM items WHERE run_id = ? AND state NOT IN (?, ?) ORDER BY seq',
+                (self.run_id, *DONE_STATES)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def keys(self) -> set:
+        """Product keys already journaled in this run"""
+        with self.lock:
+            rows = self.conn.execute('SELECT key FROM items WHERE run_id = ?', (self.run_id,))
+            return {row[0] for row in rows}
+
+    def selected(self, category: str) -> int:
+        """Products of `category` already selected in this run (they count towards its limit)"""
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM items WHERE run_id = ? AND category = ?',
+                                     (self.run_id, category)).fetchone()[0]
+
+    def counts(self) -> Dict[str, int]:
+        with self.lock:
+            rows = self.conn.execute('SELECT state, COUNT(*) FROM items WHERE run_id = ? GROUP BY state',
+                                     (self.run_id,))
+            return {state: n for state, n in rows}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
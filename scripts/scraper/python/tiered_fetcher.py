@@ -0,0 +1,205 @@
+"""
+Tiered listing fetcher for the Zalando scrapers
+Tries the plain HTTP path first and falls back to a real browser only when
+no product cards come back or a bot wall is detected. The tier that worked
+is remembered per URL pattern (with expiry) so later runs go straight to it.
+Browsers come from a driver_pool.DriverPool, so parallel fetchers never
+share a WebDriver.
+"""
+
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+from dedup_index import CACHE_DIR
+from listing_parser import extract_embedded
+from metrics import get_metrics
+
+DEFAULT_PATH = CACHE_DIR / 'fetch_strategy.json'
+
+HTTP = 'http'
+BROWSER = 'browser'
+
+CARD_MARKERS = ('data-testid="product-card"', 'cat_articleCard')
+BOT_WALL_MARKERS = (
+    'captcha', 'px-captcha', 'perimeterx', 'access denied', 'are you a robot', 'akamai',
+    '_incapsula_', 'cf-chl', 'request unsuccessful', 'bot detection',
+)
+BOT_WALL_STATUSES = (403, 429)
+
+# Browser loads tried per page (a crashed or hung browser is replaced in between)
+BROWSER_ATTEMPTS = 2
+
+
+def url_pattern(url: str) -> str:
+    """Strategy key for a URL: host + first path segment (the category)"""
+    parsed = urlparse(url)
+    segments = [segment for segment in parsed.path.split('/') if segment]
+    host = (parsed.hostname or '').lower()
+    return f"{host}/{segments[0]}" if segments else host
+
+
+def has_product_cards(html: bytes) -> bool:
+    """Product cards in the markup, or products in the embedded JSON"""
+    return any(marker.encode() in html for marker in CARD_MARKERS) or bool(extract_embedded(html))
+
+
+def is_bot_wall(status_code: int, html: bytes) -> bool:
+    if status_code in BOT_WALL_STATUSES:
+        return True
+    head = html[:50000].lower()
+    return not has_product_cards(html) and any(marker.encode() in head for marker in BOT_WALL_MARKERS)
+
+
+class FetchResult:
+    """Minimal response object (status_code, content, raise_for_status) for either tier"""
+
+    def __init__(self, status_code: int, content: bytes, tier: str):
+        self.status_code = status_code
+        self.content = content
+        self.tier = tier
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"{self.status_code} error from the {self.tier} fetcher")
+
+
+class StrategyMemory:
+    """Remembers which tier worked for each URL pattern, persisted as JSON"""
+
+    def __init__(self, path: Path = DEFAULT_PATH, ttl: float = 12 * 3600):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        try:
+            self.entries: Dict[str, Dict] = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get(self, url: str) -> Optional[str]:
+        with self.lock:
+            entry = self.entries.get(url_pattern(url))
+        if entry and entry['expires'] > time.time():
+            return entry['tier']
+        return None
+
+    def remember(self, url: str, tier: str):
+        with self.lock:
+            self.entries[url_pattern(url)] = {'tier': tier, 'expires': time.time() + self.ttl}
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.path.write_text(json.dumps(self.entries, indent=2))
+
+
+class TieredFetcher:
+    def __init__(self, session, rate_limiter, memory: StrategyMemory = None, headless: bool = True,
+                 lean: bool = True, timeout: int = 60, browsers: int = 1):
+        """
+        Args:
+            session: HTTP session for the fast tier (the scraper's HttpSession)
+            rate_limiter: HostRateLimiter shared with the scraper
+            memory: Per-pattern strategy memory (defaults to .cache/fetch_strategy.json)
+            headless: Run the fallback browser without a window
+            lean: Block images/fonts/trackers in the fallback browser
+            timeout: HTTP timeout in seconds
+            browsers: Fallback browsers at most (threads needing one while all are busy wait)
+        """
+        self.session = session
+        self.rate_limiter = rate_limiter
+        self.memory = memory or StrategyMemory()
+        self.headless = headless
+        self.lean = lean
+        self.timeout = timeout
+        self.browsers = max(1, browsers)
+        self.pool = None
+        self.stats = {HTTP: 0, BROWSER: 0}
+        self.metrics = get_metrics()
+        self.lock = threading.Lock()
+
+    def fetch_http(self, url: str) -> FetchResult:
+        response = self.rate_limiter.request(self.session, 'GET', url, timeout=self.timeout)
+        return FetchResult(response.status_code, response.content, HTTP)
+
+    def _driver_pool(self):
+        # Selenium is only imported when a page actually needs the browser
+        from driver_pool import DriverPool
+
+        with self.lock:
+            if self.pool is None:
+                print("🌐 Starting fallback browser...")
+                self.pool = DriverPool(size=self.browsers, headless=self.headless, lean=self.lean)
+            return self.pool
+
+    def fetch_browser(self, url: str, target: Optional[int] = None) -> FetchResult:
+        """Load a page in a pooled browser (one that crashed or hung is replaced, not reused)"""
+        from driver_pool import load_listing
+
+        pool = self._driver_pool()
+        self.rate_limiter.acquire(url)
+        with pool.driver() as driver:
+            _, page_source = load_listing(driver, url, target)
+
+        content = page_source.encode('utf-8')
+        return FetchResult(200 if has_product_cards(content) else 404, content, BROWSER)
+
+    def _try_browser(self, url: str, target: Optional[int]) -> Optional[FetchResult]:
+        """fetch_browser() with a retry on a fresh browser, None if every attempt failed"""
+        for attempt in range(1, BROWSER_ATTEMPTS + 1):
+            try:
+                return self.fetch_browser(url, target)
+            except Exception as e:
+                print(f"   ⚠️  Browser fetch failed (attempt {attempt}/{BROWSER_ATTEMPTS}): {e}")
+                self.metrics.count('browser_fetch_errors')
+        return None
+
+    def _count(self, tier: str):
+        with self.lock:
+            self.stats[tier] += 1
+        self.metrics.count('listing_tier', tier=tier)
+
+    def fetch(self, url: str, target: Optional[int] = None, allow_empty: bool = False) -> FetchResult:
+        """
+        Fetch a listing page with the cheapest tier that returns product cards
+
+        Args:
+            url: Listing page URL
+            target: Number of cards wanted (the browser tier stops scrolling there)
+            allow_empty: An HTTP page without cards is a valid answer (e.g. past the last page)
+                         unless it looks like a bot wall
+
+        A browser that keeps failing does not raise: the HTTP tier's answer is
+        returned instead, so the caller decides what an empty page means.
+        """
+        if self.memory.get(url) == BROWSER:
+            result = self._try_browser(url, target)
+            if result and has_product_cards(result.content):
+                self._count(BROWSER)
+                return result
+
+        result = self.fetch_http(url)
+        if result.status_code < 400 and has_product_cards(result.content):
+            self.memory.remember(url, HTTP)
+            self._count(HTTP)
+            return result
+
+        # An empty page past the end of a listing is not a reason to start a browser
+        if result.status_code == 404 or (allow_empty and not is_bot_wall(result.status_code, result.content)):
+            return result
+
+        print(f"🧱 HTTP tier got no product cards ({result.status_code}), falling back to the browser")
+        self.metrics.count('browser_fallbacks')
+        browser_result = self._try_browser(url, target)
+        if browser_result and has_product_cards(browser_result.content):
+            self.memory.remember(url, BROWSER)
+            self._count(BROWSER)
+            return browser_result
+
+        return result
+
+    def close(self):
+        with self.lock:
+            pool, self.pool = self.pool, None
+        if pool:
+            pool.close()
@@ -0,0 +1,108 @@
+"""
+Per-listing watermarks for incremental scraping
+Remembers which products each listing (category + filters) has already shown.
+Listings are walked newest first, so the crawl can stop at the first page made
+only of known products: a daily run costs the day's new products, not the
+size of the category. A selected product only becomes known once it was
+posted or skipped, so one whose post failed is retried by the next run.
+"""
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+from dedup_index import CACHE_DIR, CHUNK_SIZE, product_key
+
+DEFAULT_PATH = CACHE_DIR / 'watermarks.sqlite'
+
+# Products not seen again for this long are forgotten (they left the listing)
+KEEP_SECONDS = 90 * 24 * 3600
+
+
+class Watermarks:
+    def __init__(self, path: Path = DEFAULT_PATH, record: bool = True):
+        """
+        Args:
+            path: SQLite file shared by every listing
+            record: Whether mark() records anything (off for dry runs, which must not move the watermark)
+        """
+        self.path = Path(path)
+        self.record = record
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.lock = threading.Lock()
+        # Listing of each selected product whose outcome is not known yet (key -> scope)
+        self.pending: Dict[str, str] = {}
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS seen (
+                scope TEXT,
+                key TEXT,
+                first_seen REAL,
+                last_seen REAL,
+                PRIMARY KEY (scope, key)
+            )
+        """)
+        self.conn.execute('DELETE FROM seen WHERE last_seen < ?', (time.time() - KEEP_SECONDS,))
+        self.conn.commit()
+
+    def size(self, scope: str) -> int:
+        """Products known for a listing (0 before its first run)"""
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM seen WHERE scope = ?', (scope,)).fetchone()[0]
+
+    def known_keys(self, scope: str, keys: Iterable[str]) -> set:
+        """Subset of `keys` the listing already showed (one query per chunk)"""
+        keys = list(keys)
+        found = set()
+
+        with self.lock:
+            for start in range(0, len(keys), CHUNK_SIZE):
+                chunk = keys[start:start + CHUNK_SIZE]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self.conn.execute(f'SELECT key FROM seen WHERE scope = ? AND key IN ({placeholders})',
+                                         [scope, *chunk])
+                found.update(row[0] for row in rows)
+
+        return found
+
+    def caught_up(self, scope: str, products: List[Dict]) -> bool:
+        """True if every product of a page was already seen on this listing"""
+        if not products:
+            return False
+        keys = {product_key(product['product_url']) for product in products}
+        return len(self.known_keys(scope, keys)) == len(keys)
+
+    def mark(self, scope: str, products: Iterable[Dict]):
+        """Record products as seen on a listing"""
+        now = time.time()
+        rows = [(scope, product_key(product['product_url']), now, now) for product in products]
+        if not rows or not self.record:
+            return
+
+        with self.lock:
+            self.conn.executemany(
+                'INSERT INTO seen VALUES (?, ?, ?, ?) ON CONFLICT (scope, key) DO UPDATE SET last_seen = excluded.last_seen',
+                rows
+            )
+            self.conn.commit()
+
+    def selected(self, scope: str, products: Iterable[Dict]):
+        """Remember the listing products were selected from, done() marks them seen"""
+        with self.lock:
+            for product in products:
+                self.pending[product_key(product['product_url'])] = scope
+
+    def done(self, product: Dict):
+        """Mark a selected product as seen on its listing once posted or skipped (a failed one stays unknown)"""
+        with self.lock:
+            scope = self.pending.pop(product_key(product['product_url']), None)
+        if scope:
+            self.mark(scope, [product])
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -6,14 +6,32 @@ Scrapes product data from Zalando and creates posts in InFit
 
 import os
 import sys
-import time
-import json
-import requests
-from bs4 import BeautifulSoup
-from typing import List, Dict, Optional
+import threading
+from typing import List, Dict, Optional, Iterator, Tuple, TYPE_CHECKING
 from dotenv import load_dotenv
-from supabase import create_client, Client
-from urllib.parse import urljoin
+
+from rate_limiter import get_rate_limiter
+from dedup_index import DedupIndex, product_key
+from image_store import ImageStore
+from bulk_writer import BulkWriter
+from posting import ScraperPosting
+from metrics import get_metrics
+from tiered_fetcher import TieredFetcher
+from listing_parser import parse_listing, JSON
+from pipeline import Pipeline, Stage
+from run_journal import RunJournal
+from watermarks import Watermarks
+from catalog_snapshots import SnapshotWriter
+from product_details import ProductEnricher
+from bot_user import cached_bot_user, remember_bot_user, find_or_create_bot_user
+
+# Heavy dependencies (supabase, httpx, Pillow, NumPy) are imported where they are first needed,
+# so --help and dry runs start without them
+if TYPE_CHECKING:
+    from supabase import Client
+    from http_cache import HttpCache
+    from image_transcode import Transcoder
+    from image_hashes import NearDuplicateIndex
 
 # Load environment variables from project root
 import os
@@ -25,82 +43,126 @@ env_path = project_root / '.env.local'
 
 load_dotenv(env_path)
 
-class ZalandoScraper:
-    def __init__(self):
+class ZalandoScraper(ScraperPosting):
+    def __init__(self, dedup: bool = True, cache_size_mb: int = 512, dry_run: bool = False):
+        """
+        Args:
+            dedup: Skip products the local dedup index has already posted
+            cache_size_mb: On-disk HTTP cache size (0 disables the cache)
+            dry_run: Nothing will be posted, Supabase credentials are not required
+        """
+        from http_cache import HttpCache, CachedSession
+        from http_transport import ACCEPT_ENCODING, HttpSession
+        
         self.base_url = "https://www.zalando.fr"
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
             'Accept-Language': 'fr-FR,fr;q=0.9,en-US;q=0.8,en;q=0.7',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
+            'Accept-Encoding': ACCEPT_ENCODING,
             'Upgrade-Insecure-Requests': '1'
         }
-        self.session = requests.Session()
-        self.session.headers.update(self.headers)
         
-        # Initialize Supabase
-        supabase_url = os.getenv('NEXT_PUBLIC_SUPABASE_URL')
-        supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
+        # Listing pages and images are cached on disk and revalidated (0 MB disables the cache)
+        self.http_cache: Optional['HttpCache'] = HttpCache(max_bytes=cache_size_mb * 1024 * 1024) if cache_size_mb > 0 else None
+        # Pooled keep-alive / HTTP/2 connections shared with every scraper in this process (see http_transport.py)
+        self.session = CachedSession(self.http_cache, self.headers) if self.http_cache else HttpSession(self.headers)
+        
+        # Per-host token buckets and run metrics, shared with every scraper in this process
+        self.rate_limiter = get_rate_limiter()
+        self.metrics = get_metrics()
+        
+        # Local index of already posted products (None disables dedup)
+        self.dedup: Optional[DedupIndex] = DedupIndex() if dedup else None
         
-        if not supabase_url or not supabase_key:
+        # Supabase credentials (the client, image store and bot user are set up on first use, see below)
+        self.supabase_url = os.getenv('NEXT_PUBLIC_SUPABASE_URL')
+        self.supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
+        
+        if not dry_run and (not self.supabase_url or not self.supabase_key):
             raise ValueError("Missing Supabase credentials in .env.local")
         
-        self.supabase: Client = create_client(supabase_url, supabase_key)
-        self.bot_user_id = None
-    
-    def init_bot_user(self) -> str:
-        """Initialize or get the bot user"""
-        print("🔧 Initializing bot user...")
+        self.lazy_lock = threading.RLock()
+        self._supabase: Optional['Client'] = None
+        self._image_store: Optional[ImageStore] = None
+        self._bot_user_id: Optional[str] = None
+        self.transcoder: Optional['Transcoder'] = None
         
-        # Check if bot exists
-        result = self.supabase.table('profiles').select('id').eq('username', 'InFit_Official').execute()
-        
-        if result.data:
-            self.bot_user_id = result.data[0]['id']
-            print(f"✅ Bot user found: {self.bot_user_id}")
-            return self.bot_user_id
-        
-        # Create bot user
-        auth_result = self.supabase.auth.admin.create_user({
-            'email': 'bot@infit.app',
-            'email_confirm': True,
-            'user_metadata': {
-                'username': 'InFit_Official'
-            }
-        })
-        
-        user_id = auth_result.user.id
-        
-        # Create profile
-        self.supabase.table('profiles').insert({
-            'id': user_id,
-            'username': 'InFit_Official',
-            'height': 180
-        }).execute()
-        
-        self.bot_user_id = user_id
-        print(f"✅ Bot user created: {self.bot_user_id}")
-        return user_id
+        # Optional HTTP-then-browser fetch layer for listing pages (see tiered_fetcher.py)
+        self.fetcher: Optional[TieredFetcher] = None
+        
+        # Checkpoints of the current run (None for dry runs, see run_journal.py)
+        self.journal: Optional[RunJournal] = None
+        
+        # Products each listing already showed, set for incremental runs (see watermarks.py)
+        self.watermarks: Optional[Watermarks] = None
+        
+        # Append-only snapshot of every listing product seen, for price and stock diffs (see catalog_snapshots.py)
+        self.catalog: Optional[SnapshotWriter] = None
+        
+        # Optional product page fetcher for real sizes, category, gallery and price (see product_details.py)
+        self.enricher: Optional[ProductEnricher] = None
+        
+        # Perceptual hashes of posted images, set to catch the same garment under another URL (see image_hashes.py)
+        self.near_dups: Optional['NearDuplicateIndex'] = None
+    
+    @property
+    def supabase(self) -> 'Client':
+        """Supabase client, created on first use (dry runs never build one)"""
+        with self.lazy_lock:
+            if self._supabase is None:
+                if not self.supabase_url or not self.supabase_key:
+                    raise ValueError("Missing Supabase credentials in .env.local")
+                from supabase import create_client
+                self._supabase = create_client(self.supabase_url, self.supabase_key)
+                # supabase-py sends its own requests: their 429/503 and Retry-After still slow the Supabase bucket
+                self.rate_limiter.watch(self._supabase.postgrest.session)
+                self.rate_limiter.watch(self._supabase.storage.session)
+            return self._supabase
+    
+    @property
+    def image_store(self) -> ImageStore:
+        with self.lazy_lock:
+            if self._image_store is None:
+                self._image_store = ImageStore(self.supabase, self.supabase_url, self.session, self.rate_limiter,
+                                               supabase_key=self.supabase_key)
+            return self._image_store
     
-    def scrape_category(self, category: str = "homme", filters: Dict = None, limit: int = 10) -> List[Dict]:
+    @property
+    def bot_user_id(self) -> str:
+        """Profile the posts are created for, looked up the first time a post needs it"""
+        with self.lazy_lock:
+            if self._bot_user_id is None:
+                self.init_bot_user()
+            return self._bot_user_id
+    
+    def init_bot_user(self, refresh: bool = False) -> str:
         """
-        Scrape products from a Zalando category
+        Initialize or get the bot user
         
-        Args:
-            category: Category to scrape (homme, femme, enfant, mode-femme, mode-homme)
-            filters: Optional filters (activation_date, price_to, order, brand, etc.)
-            limit: Maximum number of products to scrape
+        The id comes from the local cache (see bot_user.py) unless it is missing,
+        due for a check or `refresh` is set; only then is `profiles` queried.
         """
-        print(f"\n🛍️  Scraping Zalando - Category: {category}")
+        user_id = None if refresh else cached_bot_user(self.supabase_url)
+        if user_id:
+            self._bot_user_id = user_id
+            print(f"✅ Bot user (cached): {user_id}")
+            return user_id
+        
+        print("🔧 Initializing bot user...")
+        user_id, created = find_or_create_bot_user(self.supabase)
+        remember_bot_user(self.supabase_url, user_id)
         
-        # Build URL with filters
+        self._bot_user_id = user_id
+        print(f"✅ Bot user {'created' if created else 'found'}: {user_id}")
+        return user_id
+    
+    def build_category_url(self, category: str, filters: Dict = None, page: int = 1) -> str:
+        """Build a listing URL for a category, its filters and a page number"""
         url = f"{self.base_url}/{category}/"
+        params = []
         
         if filters:
-            # Add filters to URL
-            params = []
-            
             # New arrivals filter (0-7 days, 0-14 days, etc.)
             if 'activation_date' in filters:
                 params.append(f"activation_date={filters['activation_date']}")
@@ -118,204 +180,397 @@ class ZalandoScraper:
             # Brand filter
             if 'brand' in filters:
                 params.append(f"brand={filters['brand']}")
-            
-            if params:
-                url += "?" + "&".join(params)
         
-        print(f"📍 URL: {url}")
+        # Zalando paginates listings with ?p=N (page 1 has no parameter)
+        if page > 1:
+            params.append(f"p={page}")
+        
+        if params:
+            url += "?" + "&".join(params)
+        
+        return url
+    
+    def iter_category(self, category: str = "homme", filters: Dict = None, limit: int = 10,
+                      max_pages: int = 200) -> Iterator[Dict]:
+        """
+        Crawl a Zalando category page by page, yielding products as they are extracted
+        
+        The crawl stops as soon as `limit` products were yielded, a page has no
+        product cards, a page only repeats products already seen, or `max_pages`
+        is reached. With watermarks (incremental mode) it also stops at the first
+        page whose products were all seen by earlier runs. Only one listing page
+        is held in memory at a time.
+        
+        Args:
+            category: Category to scrape (homme, femme, enfant, mode-femme, mode-homme)
+            filters: Optional filters (activation_date, price_to, order, brand, etc.)
+            limit: Maximum number of products to yield
+            max_pages: Safety cap on the number of listing pages fetched
+        """
+        print(f"\n🛍️  Scraping Zalando - Category: {category}")
+        print(f"📍 URL: {self.build_category_url(category, filters)}")
         
         if filters:
             print(f"🔍 Filters applied:")
             for key, value in filters.items():
                 print(f"   - {key}: {value}")
         
-        try:
-            print(f"⏳ Fetching page...")
-            response = self.session.get(url, timeout=60)
-            response.raise_for_status()
-            print(f"✅ Page loaded ({len(response.content)} bytes)")
-            
-            soup = BeautifulSoup(response.content, 'lxml')
-            
-            # Find product cards (Zalando uses data-testid attributes)
-            product_cards = soup.find_all('article', {'data-testid': 'product-card'}, limit=limit * 2)
-            
-            if not product_cards:
-                # Try alternative selectors
-                product_cards = soup.find_all('div', class_='cat_articleCard', limit=limit * 2)
-            
-            print(f"📦 Found {len(product_cards)} product cards")
-            
-            products = []
-            for i, card in enumerate(product_cards[:limit]):
-                print(f"   {i+1}/{limit} - Extracting product data...")
-                product = self._extract_product_data(card)
-                
-                if product:
-                    products.append(product)
-                    print(f"      ✅ {product['name']} - {product['price']}")
+        seen_urls = set()
+        count = 0
+        scope = self.build_category_url(category, filters)
+        
+        for page in range(1, max_pages + 1):
+            try:
+                content = self.fetch_listing_page(category, filters, page, limit)
+                if content is None:
+                    return
+                products = self.extract_products(content)
+            except Exception as e:
+                print(f"❌ Error scraping category: {e}")
+                return
+            
+            if not products:
+                return
+            
+            if self.catalog:
+                self.catalog.record(products, category)
+            
+            page_products = self._unseen(products, seen_urls)
+            if not page_products:
+                print(f"🏁 Page {page} only repeats known products, end of listing")
+                return
+            
+            if self._caught_up(scope, page_products):
+                print(f"🏁 Page {page} only holds products seen by earlier runs, {category} is up to date")
+                return
+            
+            # Drop already posted products in one query, before any image or DB call
+            page_products = self._drop_posted(page_products, scope)
+            
+            for product in page_products:
+                count += 1
+                print(f"   {count}/{limit} ✅ {product['name']} - {product['price']}")
+                if self.journal:
+                    self.journal.extracted(product, category)
+                if self.watermarks:
+                    self.watermarks.selected(scope, [product])
+                yield product
                 
-                # Rate limiting
-                time.sleep(1)
-            
-            return products
-            
-        except Exception as e:
-            print(f"❌ Error scraping category: {e}")
-            return []
+                if count >= limit:
+                    return
     
-    def _extract_product_data(self, card) -> Optional[Dict]:
-        """Extract product data from a product card"""
-        try:
-            # Extract product link
-            link_elem = card.find('a', href=True)
-            if not link_elem:
-                return None
-            
-            product_url = urljoin(self.base_url, link_elem['href'])
-            
-            # Extract image
-            img_elem = card.find('img')
-            image_url = img_elem.get('src') or img_elem.get('data-src') if img_elem else None
-            
-            if not image_url:
-                return None
-            
-            # Extract name
-            name_elem = card.find('h3') or card.find('div', class_='cat_articleName')
-            name = name_elem.get_text(strip=True) if name_elem else "Product"
-            
-            # Extract brand
-            brand_elem = card.find('div', class_='cat_brandName') or card.find('h2')
-            brand = brand_elem.get_text(strip=True) if brand_elem else "Zalando"
-            
-            # Extract price
-            price_elem = card.find('p', class_='cat_price') or card.find('span', {'data-testid': 'price'})
-            price = price_elem.get_text(strip=True) if price_elem else "N/A"
-            
-            # Clean image URL (remove size parameters to get high quality)
-            if image_url and 'zalando' in image_url:
-                image_url = image_url.split('?')[0]
-            
-            return {
-                'name': name,
-                'brand': brand,
-                'price': price,
-                'image_url': image_url,
-                'product_url': product_url,
-                'sizes': ['S', 'M', 'L', 'XL'],  # Default sizes
-                'description': f"{brand} - {name}",
-                'category': 'Vêtement'
-            }
-            
-        except Exception as e:
-            print(f"      ⚠️  Error extracting product: {e}")
+    def fetch_listing_page(self, category: str, filters: Dict, page: int, limit: int = None) -> Optional[bytes]:
+        """Fetch one listing page, returns its HTML or None past the last page"""
+        url = self.build_category_url(category, filters, page)
+        
+        print(f"⏳ Fetching {category} page {page}...")
+        with self.metrics.timer('fetch_listing'):
+            if self.fetcher:
+                response = self.fetcher.fetch(url, target=limit, allow_empty=page > 1)
+            else:
+                response = self.rate_limiter.request(self.session, 'GET', url, timeout=60)
+        if page > 1 and response.status_code == 404:
+            print(f"🏁 No page {page}, end of listing")
             return None
+        response.raise_for_status()
+        print(f"✅ Page loaded ({len(response.content)} bytes{', from cache' if getattr(response, 'from_cache', False) else ''})")
+        return response.content
     
-    def upload_image(self, image_url: str, product_name: str) -> Optional[str]:
-        """Download and upload image to Supabase Storage"""
-        try:
-            # Download image
-            response = self.session.get(image_url, timeout=30)
-            response.raise_for_status()
-            
-            # Generate filename
-            filename = f"scraped/{int(time.time())}-{product_name.replace(' ', '-').lower()[:50]}.jpg"
-            
-            # Upload to Supabase
-            result = self.supabase.storage.from_('outfits').upload(
-                filename,
-                response.content,
-                {'content-type': 'image/jpeg'}
-            )
-            
-            # Get public URL
-            public_url = self.supabase.storage.from_('outfits').get_public_url(filename)
-            
-            return public_url
-            
-        except Exception as e:
-            print(f"      ❌ Error uploading image: {e}")
-            return None
+    def extract_products(self, content: bytes) -> List[Dict]:
+        """Products of a listing page: embedded JSON first, product-card DOM walk only if the page has none"""
+        with self.metrics.timer('parse'):
+            products, source = parse_listing(content, self.base_url)
+        self.metrics.count('listing_pages', source=source)
+        self.metrics.count('products_found', len(products))
+        
+        print(f"📦 Found {len(products)} products ({'embedded JSON' if source == JSON else 'product cards'})")
+        return products
     
-    def create_post(self, product: Dict, dry_run: bool = False) -> Optional[str]:
-        """Create a post from product data"""
-        try:
-            if dry_run:
-                print(f"   🔍 [DRY RUN] Would create post: {product['brand']} - {product['name']}")
-                return None
-            
-            # Upload image
-            print(f"   📸 Uploading image...")
-            image_url = self.upload_image(product['image_url'], product['name'])
-            
-            if not image_url:
-                return None
-            
-            # Create outfit post
-            print(f"   📝 Creating post...")
-            outfit_result = self.supabase.table('outfits').insert({
-                'user_id': self.bot_user_id,
-                'image_url': image_url,
-                'publisher_height': 180,
-                'publisher_size': 'M',
-                'description': f"{product['name']} - {product['price']}\n\n{product['description']}"
-            }).execute()
-            
-            if not outfit_result.data:
-                return None
-            
-            outfit_id = outfit_result.data[0]['id']
-            
-            # Add clothing pieces
-            clothing_pieces = [{
-                'outfit_id': outfit_id,
-                'brand': product['brand'],
-                'product_name': product['name'],
-                'size': size,
-                'category': product['category'],
-                'description': product['description'],
-                'purchase_link': product['product_url']
-            } for size in product['sizes']]
-            
-            self.supabase.table('clothing_pieces').insert(clothing_pieces).execute()
-            
-            print(f"   ✅ Post created: {outfit_id}")
-            return outfit_id
-            
-        except Exception as e:
-            print(f"   ❌ Error creating post: {e}")
-            return None
+    def _unseen(self, products: List[Dict], seen_urls: set) -> List[Dict]:
+        """Products whose URL is not in `seen_urls` (which is updated)"""
+        unseen = []
+        for product in products:
+            if product['product_url'] not in seen_urls:
+                seen_urls.add(product['product_url'])
+                unseen.append(product)
+        return unseen
     
-    def create_posts(self, products: List[Dict], dry_run: bool = False):
-        """Create multiple posts"""
-        print(f"\n🚀 Creating {len(products)} posts...")
+    def _caught_up(self, scope: str, products: List[Dict]) -> bool:
+        """True in incremental mode when every product of a page was seen on this listing before"""
+        if not self.watermarks or not self.watermarks.caught_up(scope, products):
+            return False
+        self.metrics.count('incremental_stops')
+        return True
+    
+    def _drop_posted(self, products: List[Dict], scope: str = None) -> List[Dict]:
+        """
+        Drop already posted products (one dedup index query) and products already journaled in this run
         
-        success = 0
-        errors = 0
+        In incremental mode the already posted products are recorded as seen on
+        the listing `scope` right away, the journaled ones (like those the
+        caller selects) once their post is done.
+        """
+        fresh = products
+        if self.dedup is not None:
+            fresh = self.dedup.filter_new(fresh)
+            if len(fresh) < len(products):
+                print(f"♻️  Skipped {len(products) - len(fresh)} already posted products")
+                self.metrics.count('products_already_posted', len(products) - len(fresh))
+                if self.watermarks and scope:
+                    kept = {product['product_url'] for product in fresh}
+                    self.watermarks.mark(scope, [product for product in products if product['product_url'] not in kept])
         
-        for product in products:
-            result = self.create_post(product, dry_run)
-            if result or dry_run:
-                success += 1
-            else:
-                errors += 1
-            
-            time.sleep(1)  # Rate limiting
+        if self.journal:
+            journaled = self.journal.keys()
+            in_run = [product for product in fresh if product_key(product['product_url']) in journaled]
+            if in_run:
+                fresh = [product for product in fresh if product_key(product['product_url']) not in journaled]
+                if self.watermarks and scope:
+                    self.watermarks.selected(scope, in_run)
+        return fresh
+    
+    def scrape_category(self, category: str = "homme", filters: Dict = None, limit: int = 10,
+                        max_pages: int = 200) -> List[Dict]:
+        """
+        Scrape products from a Zalando category
+        
+        Collects iter_category into a list, following pagination until `limit`
+        products were found. With an enricher, product pages are fetched while
+        the next listing pages load.
+        """
+        products = self.iter_category(category, filters, limit, max_pages)
+        if self.enricher:
+            products = self.enricher.enrich_iter(products, self.journal)
+        return list(products)
+    
+    def scrape_page(self, category: str, filters: Dict = None, page: int = 1, limit: int = None,
+                    claim=None) -> Optional[List[Dict]]:
+        """
+        Products of one listing page not posted yet, None past the end of the listing
+        
+        The unit of work of queue workers (see queue_worker.py): the queue holds
+        one task per page, so there is no pagination or watermark here.
+        
+        Args:
+            limit: Products selected at most (all new ones if None)
+            claim: Called with the selected products' keys, returns those this
+                page may post (products claimed by another page of the batch are left to it)
+        """
+        content = self.fetch_listing_page(category, filters, page, limit)
+        if content is None:
+            return None
+        products = self.extract_products(content)
+        if not products:
+            return None
+        
+        if self.catalog:
+            self.catalog.record(products, category)
+        
+        selected = self._drop_posted(self._unseen(products, set()))[:limit]
+        if claim and selected:
+            held = claim([product_key(product['product_url']) for product in selected])
+            if len(held) < len(selected):
+                print(f"🔒 {len(selected) - len(held)} products already taken by another page")
+            selected = [product for product in selected if product_key(product['product_url']) in held]
+        
+        for i, product in enumerate(selected):
+            print(f"   {i + 1}/{len(selected)} ✅ {product['name']} - {product['price']}")
+            if self.journal:
+                self.journal.extracted(product, category)
+        return selected
+        
+    def stream_posts(self, categories: List[str], filters: Dict = None, limit: int = 10, max_pages: int = 200,
+                     dry_run: bool = False, fetch_workers: int = 1, image_workers: int = 4, batch_size: int = 1,
+                     queue_size: int = 16) -> Tuple[int, int]:
+        """
+        Scrape and post through a streaming pipeline: fetch → extract → dedup → [enrich] → image → write
+        
+        Stages run concurrently and exchange items through bounded queues, so the
+        first post goes out while later pages are still loading and the total time
+        tends towards the slowest stage instead of the sum of all of them.
+        
+        Args:
+            categories: Categories to scrape (`limit` products each)
+            filters: Optional filters (see build_category_url)
+            limit: Maximum number of products posted per category
+            max_pages: Safety cap on listing pages per category
+            dry_run: Only print what would be posted
+            fetch_workers: Categories fetched in parallel
+            image_workers: Images downloaded/uploaded in parallel
+            batch_size: Products per batched insert (> 1 uses BulkWriter)
+            queue_size: Capacity of each stage's input queue
+        
+        Returns:
+            (success, errors)
+        """
+        print(f"\n🌊 Streaming {', '.join(categories)}: {fetch_workers} fetcher(s), {image_workers} image worker(s), "
+              f"batches of {batch_size}")
+        
+        # Products a resumed run already selected count towards the limit
+        selected = {category: self.journal.selected(category) if self.journal else 0 for category in categories}
+        seen_urls = {category: set() for category in categories}
+        
+        # Categories that need no more pages (end of listing or limit reached)
+        done = {category for category in categories if selected[category] >= limit}
+        
+        def fetch(category):
+            for page in range(1, max_pages + 1):
+                if pipeline.stopped.is_set() or category in done:
+                    return
+                content = self.fetch_listing_page(category, filters, page, limit)
+                if content is None:
+                    return
+                yield category, page, content
+        
+        def extract(item):
+            category, page, content = item
+            products = self.extract_products(content)
+            if not products:
+                done.add(category)
+            return [(category, page, products)] if products else []
+        
+        def select(item):
+            category, page, products = item
+            if category in done:
+                return
+            
+            if self.catalog:
+                self.catalog.record(products, category)
+            
+            unseen = self._unseen(products, seen_urls[category])
+            if not unseen:
+                print(f"🏁 {category} page {page} only repeats known products, end of listing")
+                done.add(category)
+                return
+            
+            scope = self.build_category_url(category, filters)
+            if self._caught_up(scope, unseen):
+                print(f"🏁 {category} page {page} only holds products seen by earlier runs, up to date")
+                done.add(category)
+                return
+            
+            for product in self._drop_posted(unseen, scope):
+                selected[category] += 1
+                print(f"   {selected[category]}/{limit} ✅ {product['name']} - {product['price']}")
+                if self.journal:
+                    self.journal.extracted(product, category)
+                if self.watermarks:
+                    self.watermarks.selected(scope, [product])
+                yield product
+                
+                if selected[category] >= limit:
+                    done.add(category)
+                    if len(done) == len(categories):
+                        pipeline.stop()
+                    return
+        
+        def transfer_image(product):
+            return [(product, *self.upload_product_image(product))]
+        
+        writer = None
+        if batch_size > 1 and not dry_run:
+            writer = BulkWriter(self.supabase, self.supabase_url, self.bot_user_id, self.rate_limiter,
+                                batch_size=batch_size, dedup=self.dedup, journal=self.journal,
+                                near_dups=self.near_dups, watermarks=self.watermarks)
+        
+        def write(item):
+            product, posted, variants = item
+            if posted or not variants:
+                return [posted]
+            if writer:
+                return writer.add(product, variants)
+            try:
+                return [self.insert_post(product, variants)]
+            except Exception as e:
+                print(f"   ❌ Error creating post: {e}")
+                self.failed(product, e)
+                return [None]
+        
+        def enrich(product):
+            enriched = self.enricher.enrich(product, self.journal)
+            return [enriched] if enriched else []
+        
+        def stage_failed(item, error):
+            # A product whose enrich, image or write stage raised counts as an error, like a failed insert
+            product = item[0] if isinstance(item, tuple) else item
+            self.failed(product, error)
+            return [None]
+        
+        def dry_run_post(product):
+            print(f"   🔍 [DRY RUN] Would create post: {product['brand']} - {product['name']}")
+            return [True]
+        
+        stages = [
+            Stage('fetch', fetch, workers=fetch_workers, queue_size=len(categories)),
+            Stage('extract', extract, queue_size=queue_size),
+            Stage('dedup', select, queue_size=queue_size),
+        ]
+        if self.enricher:
+            stages.append(Stage('enrich', enrich, workers=self.enricher.workers, queue_size=queue_size,
+                                on_error=stage_failed))
+        if dry_run:
+            stages.append(Stage('dry_run', dry_run_post, queue_size=queue_size))
+        else:
+            stages += [
+                Stage('image', transfer_image, workers=image_workers, queue_size=queue_size, on_error=stage_failed),
+                Stage('write', write, queue_size=queue_size, finish=writer.flush if writer else None,
+                      on_error=stage_failed),
+            ]
+        
+        pipeline = Pipeline(stages)
+        results = pipeline.run(categories)
+        
+        success = sum(1 for result in results if result)
+        errors = len(results) - success
+        
+        self.metrics.count('posts_created', success if not dry_run else 0)
+        self.metrics.count('posts_failed', errors)
         
         print(f"\n📊 Summary:")
         print(f"   ✅ Success: {success}")
         print(f"   ❌ Errors: {errors}")
-
+        return success, errors
 
 def main():
     import argparse
     
     parser = argparse.ArgumentParser(description='Zalando Scraper for InFit')
-    parser.add_argument('--category', default='mode-femme', help='Category to scrape (mode-femme, mode-homme, enfant)')
+    parser.add_argument('--category', nargs='+', default=['mode-femme'], help='Categories to scrape (mode-femme, mode-homme, enfant)')
     parser.add_argument('--brand', help='Filter by brand')
     parser.add_argument('--limit', type=int, default=5, help='Number of products to scrape')
+    parser.add_argument('--max-pages', type=int, default=200, help='Maximum number of listing pages to crawl')
     parser.add_argument('--dry-run', action='store_true', help='Test mode without creating posts')
+    parser.add_argument('--tiered', action='store_true', help='Fall back to a headless browser when plain HTTP gets no product cards')
+    parser.add_argument('--show-browser', action='store_true', help='Show the fallback browser window (with --tiered)')
+    parser.add_argument('--no-dedup', action='store_true', help='Do not skip products that were already posted')
+    parser.add_argument('--warm-dedup', action='store_true', help='Seed the dedup index from clothing_pieces.purchase_link first')
+    parser.add_argument('--transcode', action='store_true', help='Upload resized WebP/JPEG variants instead of the original image')
+    parser.add_argument('--transcode-workers', type=int, help='Processes used for transcoding (default: CPU count)')
+    parser.add_argument('--image-format', choices=['webp', 'jpeg'], default='webp', help='Format of transcoded variants')
+    parser.add_argument('--metrics-dir', help='Write events.jsonl, scraper.prom and summary.json to this directory')
+    parser.add_argument('--cache-size', type=int, default=512, help='On-disk HTTP cache size in MB (0 disables the cache)')
+    parser.add_argument('--batch-size', type=int, default=1, help='Products per batched database insert (> 1 enables batching)')
+    parser.add_argument('--concurrency', type=int, default=1, help='Products posted in parallel (> 1 enables async mode)')
+    parser.add_argument('--storage-concurrency', type=int, default=4, help='Max parallel Storage uploads in async mode')
+    parser.add_argument('--stream', action='store_true', help='Overlap scraping and posting in a bounded-queue pipeline')
+    parser.add_argument('--fetch-workers', type=int, default=1, help='Categories fetched in parallel (with --stream)')
+    parser.add_argument('--image-workers', type=int, default=4, help='Images transferred in parallel (with --stream)')
+    parser.add_argument('--queue-size', type=int, default=16, help='Items buffered between pipeline stages (with --stream)')
+    parser.add_argument('--rest-concurrency', type=int, default=8, help='Max parallel database calls in async mode')
+    parser.add_argument('--resume', action='store_true', help='Continue the last unfinished run from its checkpoints')
+    parser.add_argument('--enrich', action='store_true',
+                        help='Fetch product pages for real sizes, category, gallery images and numeric price')
+    parser.add_argument('--enrich-workers', type=int, default=4, help='Product pages fetched in parallel (with --enrich)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Walk listings newest first and stop at the first page already seen by earlier runs')
+    parser.add_argument('--near-dup', choices=['skip', 'link'],
+                        help='Hash each image and skip near-duplicates of posted images, or link them to the existing post')
+    parser.add_argument('--near-dup-threshold', type=int,
+                        help='Maximum differing bits (out of 64) for two images to be near-duplicates (default: 6)')
+    parser.add_argument('--near-dup-hash', choices=['phash', 'dhash'], default='phash',
+                        help='Perceptual hash used with --near-dup (each has its own index)')
+    parser.add_argument('--no-snapshot', action='store_true',
+                        help='Do not write the catalog snapshot of this run (see catalog_snapshots.py)')
     
     # Zalando specific filters
     parser.add_argument('--new-arrivals', type=int, help='New arrivals in last X days (e.g., 7, 14, 30)')
@@ -329,13 +584,37 @@ def main():
     print("🤖 InFit Zalando Scraper")
     print("=" * 50)
     print(f"Mode: {'🔍 DRY RUN' if args.dry_run else '🚀 PRODUCTION'}")
-    print(f"Category: {args.category}")
+    print(f"Categories: {', '.join(args.category)}")
     print(f"Limit: {args.limit}")
     print("=" * 50)
     
+    if args.metrics_dir:
+        get_metrics().configure(args.metrics_dir)
+    
     try:
-        scraper = ZalandoScraper()
-        scraper.init_bot_user()
+        # No Supabase client or bot user lookup yet: both are set up when the first post needs them
+        scraper = ZalandoScraper(dedup=not args.no_dedup, cache_size_mb=args.cache_size, dry_run=args.dry_run)
+        
+        if args.warm_dedup and scraper.dedup is not None:
+            scraper.dedup.warm_from_supabase(scraper.supabase)
+        
+        if args.transcode and not args.dry_run:
+            from image_transcode import Transcoder
+            scraper.transcoder = Transcoder(workers=args.transcode_workers, image_format=args.image_format)
+        
+        if args.tiered:
+            # One fallback browser per parallel fetcher at most
+            scraper.fetcher = TieredFetcher(scraper.session, scraper.rate_limiter, headless=not args.show_browser,
+                                            browsers=args.fetch_workers if args.stream else 1)
+        
+        if args.enrich:
+            scraper.enricher = ProductEnricher(scraper.session, scraper.rate_limiter, workers=args.enrich_workers)
+        
+        if args.near_dup and not args.dry_run:
+            from image_hashes import NearDuplicateIndex
+            scraper.near_dups = NearDuplicateIndex(args.near_dup_hash, args.near_dup_threshold, args.near_dup)
+            print(f"🪞 Near-duplicate images ({args.near_dup_hash}, ≤ {scraper.near_dups.threshold} bits): {args.near_dup}, "
+                  f"{scraper.near_dups.size} hashes indexed")
         
         # Build filters
         filters = {}
@@ -355,18 +634,104 @@ def main():
         if args.order:
             filters['order'] = args.order
         
-        products = scraper.scrape_category(args.category, filters, args.limit)
+        if args.incremental:
+            # Newest first: everything after the first fully known page was seen before
+            if args.order and args.order != 'newest':
+                print(f"⚠️  --incremental sorts by newest, ignoring --order {args.order}")
+            filters['order'] = 'newest'
+            scraper.watermarks = Watermarks(record=not args.dry_run)
         
-        if products:
-            scraper.create_posts(products, args.dry_run)
+        # Journal every product's progress so an interrupted run can be resumed
+        resumed = []
+        if not args.dry_run:
+            params = {'categories': args.category, 'filters': filters, 'limit': args.limit}
+            scraper.journal = RunJournal.resume('requests', params) if args.resume else RunJournal.start('requests', params)
+            resumed = scraper.journal.pending()
+        
+        # Snapshot every product seen, dry runs included (a resumed run appends to its own snapshot)
+        if not args.no_snapshot:
+            scraper.catalog = SnapshotWriter(scraper.journal.run_id if scraper.journal else None)
+            if scraper.enricher:
+                scraper.enricher.catalog = scraper.catalog
+        
+        if scraper.enricher:
+            scraper.enricher.watermarks = scraper.watermarks
+        
+        if resumed and scraper.enricher:
+            resumed = scraper.enricher.enrich_all(resumed, scraper.journal)
+        
+        if resumed and args.stream:
+            # Finish what the interrupted run had started before streaming the rest
+            scraper.create_posts(resumed, batch_size=args.batch_size)
+            resumed = []
+        
+        if args.stream:
+            scraper.stream_posts(
+                args.category,
+                filters,
+                args.limit,
+                args.max_pages,
+                dry_run=args.dry_run,
+                fetch_workers=args.fetch_workers,
+                image_workers=args.image_workers,
+                batch_size=args.batch_size,
+                queue_size=args.queue_size
+            )
+            products = None
         else:
+            products = resumed
+            for category in args.category:
+                remaining = args.limit - (scraper.journal.selected(category) if scraper.journal else 0)
+                if remaining > 0:
+                    products.extend(scraper.scrape_category(category, filters, remaining, args.max_pages))
+        
+        if scraper.fetcher:
+            print(f"\n🧭 Listing pages fetched: {scraper.fetcher.stats['http']} over HTTP, "
+                  f"{scraper.fetcher.stats['browser']} with the browser")
+            scraper.fetcher.close()
+        
+        if products:
+            scraper.create_posts(
+                products,
+                args.dry_run,
+                concurrency=args.concurrency,
+                storage_concurrency=args.storage_concurrency,
+                rest_concurrency=args.rest_concurrency,
+                batch_size=args.batch_size
+            )
+        elif products is not None:
             print("\n⚠️  No products found")
+        
+        if scraper.journal:
+            scraper.journal.finish()
+        
+        if scraper.transcoder:
+            scraper.transcoder.close()
+        
+        if scraper.enricher:
+            scraper.enricher.close()
+        
+        if scraper.near_dups:
+            scraper.near_dups.close()
+        
+        if scraper.catalog:
+            scraper.catalog.close()
+        
+        if scraper.http_cache:
+            stats = scraper.http_cache.stats
+            print(f"💾 HTTP cache: {stats['hits']} hits, {stats['revalidated']} revalidated, {stats['misses']} downloads")
+            for name, value in stats.items():
+                scraper.metrics.gauge('http_cache_responses', value, result=name)
             
     except Exception as e:
         print(f"\n❌ Error: {e}")
         import traceback
         traceback.print_exc()
         sys.exit(1)
+    finally:
+        if args.metrics_dir:
+            get_metrics().close()
+            print(f"📈 Metrics written to {args.metrics_dir}")
 
 
 if __name__ == '__main__':
@@ -4,22 +4,32 @@ Zalando Scraper using Selenium (real browser)
 More reliable than requests but slower
 """
 
+import itertools
 import os
 import sys
-import time
+import threading
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterator, Tuple, TYPE_CHECKING
 
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
-from bs4 import BeautifulSoup
 from dotenv import load_dotenv
-from supabase import create_client, Client
+
+from rate_limiter import get_rate_limiter
+from dedup_index import DedupIndex, product_key
+from image_store import ImageStore
+from posting import ScraperPosting
+from metrics import get_metrics
+from listing_parser import parse_listing, JSON
+from run_journal import RunJournal
+from product_details import ProductEnricher
+from catalog_snapshots import SnapshotWriter
+from bot_user import cached_bot_user, remember_bot_user, find_or_create_bot_user
+
+# Selenium, supabase, httpx, Pillow and NumPy are imported where they are first needed
+if TYPE_CHECKING:
+    from supabase import Client
+    from http_cache import HttpCache
+    from image_transcode import Transcoder
+    from image_hashes import NearDuplicateIndex
 
 # Load environment variables from project root
 project_root = Path(__file__).parent.parent.parent.parent
@@ -27,49 +37,94 @@ env_path = project_root / '.env.local'
 load_dotenv(env_path)
 
 
-class ZalandoSeleniumScraper:
-    def __init__(self, headless: bool = True):
-        """Initialize Selenium scraper"""
+class ZalandoSeleniumScraper(ScraperPosting):
+    def __init__(self, headless: bool = True, dedup: bool = True, lean: bool = False, cache_size_mb: int = 512,
+                 dry_run: bool = False):
+        """Initialize Selenium scraper (`dry_run` does not require Supabase credentials)"""
+        from http_cache import HttpCache, CachedSession
+        from http_transport import HttpSession
+        
         self.base_url = "https://www.zalando.fr"
         self.headless = headless
+        self.lean = lean
         self.driver = None
         
-        # Initialize Supabase
-        supabase_url = os.getenv('NEXT_PUBLIC_SUPABASE_URL')
-        supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
+        # Per-host token buckets and run metrics, shared with every scraper in this process
+        self.rate_limiter = get_rate_limiter()
+        self.metrics = get_metrics()
+        
+        # Images are cached on disk and revalidated (0 MB disables the cache)
+        self.http_cache: Optional['HttpCache'] = HttpCache(max_bytes=cache_size_mb * 1024 * 1024) if cache_size_mb > 0 else None
+        # Pooled keep-alive / HTTP/2 connections shared with every scraper in this process (see http_transport.py)
+        self.session = CachedSession(self.http_cache) if self.http_cache else HttpSession()
         
-        if not supabase_url or not supabase_key:
+        # Local index of already posted products (None disables dedup)
+        self.dedup: Optional[DedupIndex] = DedupIndex() if dedup else None
+        
+        # Supabase credentials (the client, image store and bot user are set up on first use)
+        self.supabase_url = os.getenv('NEXT_PUBLIC_SUPABASE_URL')
+        self.supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
+        
+        if not dry_run and (not self.supabase_url or not self.supabase_key):
             raise ValueError("Missing Supabase credentials in .env.local")
         
-        self.supabase: Client = create_client(supabase_url, supabase_key)
-        self.bot_user_id = None
+        self.lazy_lock = threading.RLock()
+        self._supabase: Optional['Client'] = None
+        self._image_store: Optional[ImageStore] = None
+        self._bot_user_id: Optional[str] = None
+        self.transcoder: Optional['Transcoder'] = None
+        
+        # Checkpoints of the current run (None for dry runs, see run_journal.py)
+        self.journal: Optional[RunJournal] = None
+        
+        # Optional product page fetcher for real sizes, category, gallery and price (see product_details.py)
+        self.enricher: Optional[ProductEnricher] = None
+        
+        # Append-only snapshot of every listing product seen, for price and stock diffs (see catalog_snapshots.py)
+        self.catalog: Optional[SnapshotWriter] = None
+        
+        # Perceptual hashes of posted images, set to catch the same garment under another URL (see image_hashes.py)
+        self.near_dups: Optional['NearDuplicateIndex'] = None
+    
+    @property
+    def supabase(self) -> 'Client':
+        """Supabase client, created on first use (dry runs never build one)"""
+        with self.lazy_lock:
+            if self._supabase is None:
+                if not self.supabase_url or not self.supabase_key:
+                    raise ValueError("Missing Supabase credentials in .env.local")
+                from supabase import create_client
+                self._supabase = create_client(self.supabase_url, self.supabase_key)
+                # supabase-py sends its own requests: their 429/503 and Retry-After still slow the Supabase bucket
+                self.rate_limiter.watch(self._supabase.postgrest.session)
+                self.rate_limiter.watch(self._supabase.storage.session)
+            return self._supabase
+    
+    @property
+    def image_store(self) -> ImageStore:
+        with self.lazy_lock:
+            if self._image_store is None:
+                self._image_store = ImageStore(self.supabase, self.supabase_url, self.session, self.rate_limiter,
+                                               supabase_key=self.supabase_key)
+            return self._image_store
+    
+    @property
+    def bot_user_id(self) -> str:
+        """Profile the posts are created for, looked up the first time a post needs it"""
+        with self.lazy_lock:
+            if self._bot_user_id is None:
+                self.init_bot_user()
+            return self._bot_user_id
     
     def init_driver(self):
         """Initialize Chrome driver"""
         if self.driver:
             return
         
-        print("🌐 Initializing Chrome driver...")
-        
-        chrome_options = Options()
-        if self.headless:
-            chrome_options.add_argument('--headless=new')
-        
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--disable-dev-shm-usage')
-        chrome_options.add_argument('--disable-blink-features=AutomationControlled')
-        chrome_options.add_argument('--user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
-        
-        # Disable automation flags
-        chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
-        chrome_options.add_experimental_option('useAutomationExtension', False)
-        
-        service = Service(ChromeDriverManager().install())
-        self.driver = webdriver.Chrome(service=service, options=chrome_options)
-        
-        # Remove webdriver property
-        self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+        from driver_pool import create_driver
         
+        print("🌐 Initializing Chrome driver...")
+        self.driver = create_driver(self.headless, lean=self.lean)
         print("✅ Chrome driver ready")
     
     def close_driver(self):
@@ -79,34 +134,106 @@ class ZalandoSeleniumScraper:
             self.driver = None
             print("🔒 Browser closed")
     
-    def init_bot_user(self) -> str:
-        """Initialize or get the bot user"""
+    def init_bot_user(self, refresh: bool = False) -> str:
+        """Initialize or get the bot user (from the local cache unless it is due for a check, see bot_user.py)"""
+        user_id = None if refresh else cached_bot_user(self.supabase_url)
+        if user_id:
+            self._bot_user_id = user_id
+            print(f"✅ Bot user (cached): {user_id}")
+            return user_id
+        
         print("🔧 Initializing bot user...")
+        user_id, created = find_or_create_bot_user(self.supabase)
+        remember_bot_user(self.supabase_url, user_id)
         
-        result = self.supabase.table('profiles').select('id').eq('username', 'InFit_Official').execute()
+        self._bot_user_id = user_id
+        print(f"✅ Bot user {'created' if created else 'found'}: {user_id}")
+        return user_id
+    
+    def build_category_url(self, category: str, filters: Dict = None, page: int = 1) -> str:
+        """Build a listing URL for a category, its filters and a page number"""
+        url = f"{self.base_url}/{category}/"
+        params = []
+        if filters:
+            if 'activation_date' in filters:
+                params.append(f"activation_date={filters['activation_date']}")
+            if 'price_to' in filters:
+                params.append(f"price_to={filters['price_to']}")
+            if 'order' in filters:
+                params.append(f"order={filters['order']}")
+        if page > 1:
+            params.append(f"p={page}")
+        if params:
+            url += "?" + "&".join(params)
+        return url
+    
+    def scrape_page(self, driver, url: str, target: Optional[int] = None) -> List[Dict]:
+        """
+        Load one listing page in `driver` and extract its products (driver errors propagate)
         
-        if result.data:
-            self.bot_user_id = result.data[0]['id']
-            print(f"✅ Bot user found: {self.bot_user_id}")
-            return self.bot_user_id
+        `target` is the number of cards wanted; scrolling stops once it is reached.
+        """
+        from driver_pool import TimeoutException, load_listing
         
-        auth_result = self.supabase.auth.admin.create_user({
-            'email': 'bot@infit.app',
-            'email_confirm': True,
-            'user_metadata': {'username': 'InFit_Official'}
-        })
+        # Load page (an open breaker, see resilience.py, pauses here instead of every page timing out)
+        print(f"⏳ Loading {url}")
+        self.rate_limiter.acquire(url)
+        breaker = self.rate_limiter.breaker(url)
+        try:
+            with self.metrics.timer('browser_load'):
+                selector, page_source = load_listing(driver, url, target)
+        except TimeoutException:
+            breaker.failure()
+            raise
+        except Exception:
+            breaker.release()
+            raise
+        breaker.success()
         
-        user_id = auth_result.user.id
+        # Embedded JSON first, rendered product cards only if the page has none
+        with self.metrics.timer('parse'):
+            products, source = parse_listing(page_source, self.base_url, selector)
+        self.metrics.count('listing_pages', source=source)
+        self.metrics.count('products_found', len(products))
         
-        self.supabase.table('profiles').insert({
-            'id': user_id,
-            'username': 'InFit_Official',
-            'height': 180
-        }).execute()
+        print(f"📦 Found {len(products)} products on {url} ({'embedded JSON' if source == JSON else 'product cards'})")
         
-        self.bot_user_id = user_id
-        print(f"✅ Bot user created: {self.bot_user_id}")
-        return user_id
+        return products
+    
+    def _select_products(self, products: List[Dict], limit: int, category: str = None,
+                         seen_urls: set = None) -> List[Dict]:
+        """
+        Drop duplicates and already posted products, then keep the first `limit` (journaled under `category`)
+        
+        `seen_urls` carries the URLs of earlier pages of the same listing (it is updated).
+        """
+        if self.catalog:
+            self.catalog.record(products, category)
+        
+        seen_urls = set() if seen_urls is None else seen_urls
+        products = [p for p in products if not (p['product_url'] in seen_urls or seen_urls.add(p['product_url']))]
+        
+        # A resumed run already selected some products: they are posted from the journal and count towards the limit
+        if self.journal:
+            journaled = self.journal.keys()
+            products = [p for p in products if product_key(p['product_url']) not in journaled]
+            limit -= self.journal.selected(category)
+        
+        # Drop already posted products in one query, before any image or DB call
+        if self.dedup is not None:
+            fresh = self.dedup.filter_new(products)
+            if len(fresh) < len(products):
+                print(f"♻️  Skipped {len(products) - len(fresh)} already posted products")
+                self.metrics.count('products_already_posted', len(products) - len(fresh))
+            products = fresh
+        
+        products = products[:max(0, limit)]
+        for i, product in enumerate(products):
+            print(f"   {i+1}/{limit} ✅ {product['name']} - {product['price']}")
+            if self.journal:
+                self.journal.extracted(product, category)
+        
+        return products
     
     def scrape_category(self, category: str = "mode-femme", filters: Dict = None, limit: int = 10) -> List[Dict]:
         """Scrape products using Selenium"""
@@ -114,65 +241,11 @@ class ZalandoSeleniumScraper:
         
         print(f"\n🛍️  Scraping Zalando - Category: {category}")
         
-        # Build URL
-        url = f"{self.base_url}/{category}/"
-        if filters:
-            params = []
-            if 'activation_date' in filters:
-                params.append(f"activation_date={filters['activation_date']}")
-            if 'price_to' in filters:
-                params.append(f"price_to={filters['price_to']}")
-            if 'order' in filters:
-                params.append(f"order={filters['order']}")
-            if params:
-                url += "?" + "&".join(params)
-        
+        url = self.build_category_url(category, filters)
         print(f"📍 URL: {url}")
         
         try:
-            # Load page
-            print("⏳ Loading page...")
-            self.driver.get(url)
-            
-            # Wait for products to load
-            print("⏳ Waiting for products...")
-            wait = WebDriverWait(self.driver, 20)
-            
-            # Try multiple selectors
-            try:
-                wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, 'article[data-testid="product-card"]')))
-                selector = 'article[data-testid="product-card"]'
-            except:
-                try:
-                    wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, '.cat_articleCard')))
-                    selector = '.cat_articleCard'
-                except:
-                    selector = 'article'
-            
-            # Scroll to load more products
-            print("📜 Scrolling to load products...")
-            for _ in range(3):
-                self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                time.sleep(2)
-            
-            # Get page source and parse with BeautifulSoup
-            soup = BeautifulSoup(self.driver.page_source, 'lxml')
-            product_cards = soup.select(selector)[:limit * 2]
-            
-            print(f"📦 Found {len(product_cards)} product cards")
-            
-            products = []
-            for i, card in enumerate(product_cards[:limit]):
-                print(f"   {i+1}/{limit} - Extracting product data...")
-                product = self._extract_product_data(card)
-                
-                if product:
-                    products.append(product)
-                    print(f"      ✅ {product['name']} - {product['price']}")
-                
-                time.sleep(1)
-            
-            return products
+            return self._select_products(self.scrape_page(self.driver, url, target=limit), limit, category)
             
         except Exception as e:
             print(f"❌ Error scraping: {e}")
@@ -180,149 +253,82 @@ class ZalandoSeleniumScraper:
             traceback.print_exc()
             return []
     
-    def _extract_product_data(self, card) -> Optional[Dict]:
-        """Extract product data from card"""
-        try:
-            # Extract link
-            link = card.find('a', href=True)
-            if not link:
-                return None
-            product_url = link['href']
-            if not product_url.startswith('http'):
-                product_url = self.base_url + product_url
-            
-            # Extract image
-            img = card.find('img')
-            image_url = img.get('src') or img.get('data-src') if img else None
-            if not image_url:
-                return None
-            
-            # Clean image URL
-            if '?' in image_url:
-                image_url = image_url.split('?')[0]
-            
-            # Extract name
-            name_elem = card.find('h3') or card.find('div', class_='cat_articleName')
-            name = name_elem.get_text(strip=True) if name_elem else "Product"
-            
-            # Extract brand
-            brand_elem = card.find('div', class_='cat_brandName') or card.find('h2')
-            brand = brand_elem.get_text(strip=True) if brand_elem else "Zalando"
-            
-            # Extract price
-            price_elem = card.find('p', class_='cat_price') or card.find('span', {'data-testid': 'price'})
-            price = price_elem.get_text(strip=True) if price_elem else "N/A"
-            
-            return {
-                'name': name,
-                'brand': brand,
-                'price': price,
-                'image_url': image_url,
-                'product_url': product_url,
-                'sizes': ['S', 'M', 'L', 'XL'],
-                'description': f"{brand} - {name}",
-                'category': 'Vêtement'
-            }
-            
-        except Exception as e:
-            print(f"      ⚠️  Error extracting: {e}")
-            return None
-    
-    def upload_image(self, image_url: str, product_name: str) -> Optional[str]:
-        """Download and upload image"""
-        try:
-            import requests
-            response = requests.get(image_url, timeout=30)
-            response.raise_for_status()
-            
-            filename = f"scraped/{int(time.time())}-{product_name.replace(' ', '-').lower()[:50]}.jpg"
-            
-            self.supabase.storage.from_('outfits').upload(
-                filename,
-                response.content,
-                {'content-type': 'image/jpeg'}
-            )
-            
-            public_url = self.supabase.storage.from_('outfits').get_public_url(filename)
-            return public_url
-            
-        except Exception as e:
-            print(f"      ❌ Error uploading image: {e}")
-            return None
-    
-    def create_post(self, product: Dict, dry_run: bool = False) -> Optional[str]:
-        """Create a post"""
-        try:
-            if dry_run:
-                print(f"   🔍 [DRY RUN] Would create: {product['brand']} - {product['name']} - {product['price']}")
-                return None
-            
-            print(f"   📸 Uploading image...")
-            image_url = self.upload_image(product['image_url'], product['name'])
-            if not image_url:
-                return None
-            
-            print(f"   📝 Creating post...")
-            outfit_result = self.supabase.table('outfits').insert({
-                'user_id': self.bot_user_id,
-                'image_url': image_url,
-                'publisher_height': 180,
-                'publisher_size': 'M',
-                'description': f"{product['name']} - {product['price']}\n\n{product['description']}"
-            }).execute()
-            
-            if not outfit_result.data:
-                return None
-            
-            outfit_id = outfit_result.data[0]['id']
-            
-            clothing_pieces = [{
-                'outfit_id': outfit_id,
-                'brand': product['brand'],
-                'product_name': product['name'],
-                'size': size,
-                'category': product['category'],
-                'description': product['description'],
-                'purchase_link': product['product_url']
-            } for size in product['sizes']]
-            
-            self.supabase.table('clothing_pieces').insert(clothing_pieces).execute()
-            
-            print(f"   ✅ Post created: {outfit_id}")
-            return outfit_id
-            
-        except Exception as e:
-            print(f"   ❌ Error creating post: {e}")
-            return None
+    def iter_categories(self, categories: List[str], filters: Dict = None, limit: int = 10, drivers: int = 2,
+                        pages: int = 1, recycle_after: int = 20) -> Iterator[Tuple[str, List[Dict]]]:
+        """
+        Scrape several categories in parallel on a pool of Chrome drivers, yielding pages as they come in
+        
+        Every (category, page) pair is a task; tasks are spread across `drivers`
+        browsers that are reused between tasks, replaced when they crash or hang
+        and restarted after `recycle_after` pages. Yields (category, products
+        selected from one page) in task order while later pages still load, at
+        most `limit` products per category.
+        """
+        from driver_pool import DriverPool
+        
+        tasks = [(category, page) for category in categories for page in range(1, pages + 1)]
+        print(f"\n🛍️  Scraping {len(categories)} categories ({len(tasks)} pages) on {drivers} drivers")
+        
+        def scrape_task(driver, task):
+            category, page = task
+            return self.scrape_page(driver, self.build_category_url(category, filters, page))
+        
+        seen_urls = {category: set() for category in categories}
+        taken = {category: 0 for category in categories}
+        
+        with DriverPool(size=min(drivers, len(tasks)), headless=self.headless, recycle_after=recycle_after,
+                        lean=self.lean) as pool:
+            for (category, page), products in zip(tasks, pool.imap(scrape_task, tasks)):
+                print(f"\n📂 {category}, page {page}")
+                # The journal counts the products of earlier pages itself (see _select_products)
+                remaining = limit if self.journal else limit - taken[category]
+                selected = self._select_products(products or [], remaining, category, seen_urls[category])
+                taken[category] += len(selected)
+                yield category, selected
     
-    def create_posts(self, products: List[Dict], dry_run: bool = False):
-        """Create multiple posts"""
-        print(f"\n🚀 Creating {len(products)} posts...")
-        
-        success = 0
-        errors = 0
-        
-        for product in products:
-            result = self.create_post(product, dry_run)
-            if result or dry_run:
-                success += 1
-            else:
-                errors += 1
-            time.sleep(1)
-        
-        print(f"\n📊 Summary:")
-        print(f"   ✅ Success: {success}")
-        print(f"   ❌ Errors: {errors}")
+    def scrape_categories(self, categories: List[str], filters: Dict = None, limit: int = 10, drivers: int = 2,
+                          pages: int = 1, recycle_after: int = 20) -> Dict[str, List[Dict]]:
+        """Collect iter_categories into a dict of category -> products (at most `limit` each)"""
+        by_category = {category: [] for category in categories}
+        for category, products in self.iter_categories(categories, filters, limit, drivers, pages, recycle_after):
+            by_category[category].extend(products)
+        return by_category
 
 
 def main():
     import argparse
     
     parser = argparse.ArgumentParser(description='Zalando Selenium Scraper')
-    parser.add_argument('--category', default='mode-femme', help='Category')
-    parser.add_argument('--limit', type=int, default=5, help='Number of products')
+    parser.add_argument('--category', nargs='+', default=['mode-femme'], help='Category (several are scraped in parallel)')
+    parser.add_argument('--limit', type=int, default=5, help='Number of products (per category)')
+    parser.add_argument('--drivers', type=int, default=1, help='Chrome instances in the driver pool')
+    parser.add_argument('--pages', type=int, default=1, help='Listing pages per category')
+    parser.add_argument('--recycle-after', type=int, default=20, help='Pages before a pooled driver is restarted')
     parser.add_argument('--dry-run', action='store_true', help='Test mode')
+    parser.add_argument('--no-dedup', action='store_true', help='Do not skip already posted products')
+    parser.add_argument('--warm-dedup', action='store_true', help='Seed the dedup index from clothing_pieces first')
+    parser.add_argument('--transcode', action='store_true', help='Upload resized WebP/JPEG variants instead of the original image')
+    parser.add_argument('--transcode-workers', type=int, help='Processes used for transcoding (default: CPU count)')
+    parser.add_argument('--image-format', choices=['webp', 'jpeg'], default='webp', help='Format of transcoded variants')
+    parser.add_argument('--metrics-dir', help='Write events.jsonl, scraper.prom and summary.json to this directory')
+    parser.add_argument('--cache-size', type=int, default=512, help='On-disk HTTP cache size in MB (0 disables the cache)')
+    parser.add_argument('--batch-size', type=int, default=1, help='Products per batched database insert (> 1 enables batching)')
+    parser.add_argument('--concurrency', type=int, default=1, help='Posts in parallel (> 1 enables async mode)')
+    parser.add_argument('--storage-concurrency', type=int, default=4, help='Max parallel uploads (async mode)')
+    parser.add_argument('--rest-concurrency', type=int, default=8, help='Max parallel DB calls (async mode)')
     parser.add_argument('--show-browser', action='store_true', help='Show browser window')
+    parser.add_argument('--lean', action='store_true', help='Block images, fonts, media and trackers while loading listings')
+    parser.add_argument('--resume', action='store_true', help='Continue the last unfinished run from its checkpoints')
+    parser.add_argument('--enrich', action='store_true',
+                        help='Fetch product pages for real sizes, category, gallery images and numeric price')
+    parser.add_argument('--enrich-workers', type=int, default=4, help='Product pages fetched in parallel (with --enrich)')
+    parser.add_argument('--near-dup', choices=['skip', 'link'],
+                        help='Hash each image and skip near-duplicates of posted images, or link them to the existing post')
+    parser.add_argument('--near-dup-threshold', type=int,
+                        help='Maximum differing bits (out of 64) for two images to be near-duplicates (default: 6)')
+    parser.add_argument('--near-dup-hash', choices=['phash', 'dhash'], default='phash',
+                        help='Perceptual hash used with --near-dup')
+    parser.add_argument('--no-snapshot', action='store_true', help='Do not write the catalog snapshot of this run')
     parser.add_argument('--new-arrivals', type=int, help='New arrivals (days)')
     parser.add_argument('--price-to', type=int, help='Max price')
     parser.add_argument('--order', help='Sort order')
@@ -333,13 +339,29 @@ def main():
     print("=" * 50)
     print(f"Mode: {'🔍 DRY RUN' if args.dry_run else '🚀 PRODUCTION'}")
     print(f"Browser: {'👁️  Visible' if args.show_browser else '🕶️  Headless'}")
-    print(f"Category: {args.category}")
+    print(f"Category: {', '.join(args.category)}")
     print(f"Limit: {args.limit}")
     print("=" * 50)
     
+    if args.metrics_dir:
+        get_metrics().configure(args.metrics_dir)
+    
+    scraper = None
+    pages = None
     try:
-        scraper = ZalandoSeleniumScraper(headless=not args.show_browser)
-        scraper.init_bot_user()
+        scraper = ZalandoSeleniumScraper(headless=not args.show_browser, dedup=not args.no_dedup, lean=args.lean,
+                                         cache_size_mb=args.cache_size, dry_run=args.dry_run)
+        
+        if args.warm_dedup and scraper.dedup is not None:
+            scraper.dedup.warm_from_supabase(scraper.supabase)
+        
+        if args.transcode and not args.dry_run:
+            from image_transcode import Transcoder
+            scraper.transcoder = Transcoder(workers=args.transcode_workers, image_format=args.image_format)
+        
+        if args.near_dup and not args.dry_run:
+            from image_hashes import NearDuplicateIndex
+            scraper.near_dups = NearDuplicateIndex(args.near_dup_hash, args.near_dup_threshold, args.near_dup)
         
         filters = {}
         if args.new_arrivals:
@@ -349,20 +371,86 @@ def main():
         if args.order:
             filters['order'] = args.order
         
-        products = scraper.scrape_category(args.category, filters, args.limit)
+        # Journal every product's progress so an interrupted run can be resumed
+        resumed = []
+        if not args.dry_run:
+            params = {'categories': args.category, 'filters': filters, 'limit': args.limit, 'pages': args.pages}
+            scraper.journal = RunJournal.resume('selenium', params) if args.resume else RunJournal.start('selenium', params)
+            resumed = scraper.journal.pending()
+        
+        # Snapshot every product seen, dry runs included (a resumed run appends to its own snapshot)
+        if not args.no_snapshot:
+            scraper.catalog = SnapshotWriter(scraper.journal.run_id if scraper.journal else None)
+        
+        if len(args.category) == 1 and args.drivers == 1 and args.pages == 1:
+            crawled = scraper.scrape_category(args.category[0], filters, args.limit)
+        else:
+            pages = scraper.iter_categories(
+                args.category,
+                filters,
+                args.limit,
+                drivers=args.drivers,
+                pages=args.pages,
+                recycle_after=args.recycle_after
+            )
+            crawled = (product for _, page in pages for product in page)
+        products = itertools.chain(resumed, crawled)
+        
+        if args.enrich:
+            # Product pages over plain HTTP while the browsers load the next listing pages
+            scraper.enricher = ProductEnricher(scraper.session, scraper.rate_limiter, workers=args.enrich_workers)
+            scraper.enricher.catalog = scraper.catalog
+            print("\n🔎 Enriching products from their pages as the listings come in...")
+            products = scraper.enricher.enrich_iter(products, scraper.journal)
+        products = list(products)
+        
+        if scraper.enricher:
+            scraper.enricher.close()
         
         if products:
-            scraper.create_posts(products, args.dry_run)
+            scraper.create_posts(
+                products,
+                args.dry_run,
+                concurrency=args.concurrency,
+                storage_concurrency=args.storage_concurrency,
+                rest_concurrency=args.rest_concurrency,
+                batch_size=args.batch_size
+            )
         else:
             print("\n⚠️  No products found")
         
-        scraper.close_driver()
+        if scraper.journal:
+            scraper.journal.finish()
+        
+        if scraper.transcoder:
+            scraper.transcoder.close()
+        
+        if scraper.near_dups:
+            scraper.near_dups.close()
+        
+        if scraper.catalog:
+            scraper.catalog.close()
+        
+        if scraper.http_cache:
+            stats = scraper.http_cache.stats
+            print(f"💾 HTTP cache: {stats['hits']} hits, {stats['revalidated']} revalidated, {stats['misses']} downloads")
+            for name, value in stats.items():
+                scraper.metrics.gauge('http_cache_responses', value, result=name)
         
     except Exception as e:
         print(f"\n❌ Error: {e}")
         import traceback
         traceback.print_exc()
         sys.exit(1)
+    finally:
+        # No Chrome process may outlive the run, even a failed one: leave the driver pool, quit the single driver
+        if pages is not None:
+            pages.close()
+        if scraper:
+            scraper.close_driver()
+        if args.metrics_dir:
+            get_metrics().close()
+            print(f"📈 Metrics written to {args.metrics_dir}")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,7 @@
+-- Add width column to outfit_images for resized variants of the main image
+-- Gallery images keep width NULL; variants uploaded by the scraper carry their pixel width
+ALTER TABLE public.outfit_images
+ADD COLUMN IF NOT EXISTS width INTEGER;
+
+-- Index for picking a variant by width
+CREATE INDEX IF NOT EXISTS idx_outfit_images_width ON public.outfit_images(outfit_id, width);
@@ -23,6 +23,7 @@ export interface OutfitImage {
   outfit_id: string
   image_url: string
   display_order: number
+  width?: number | null
 }
 
 export interface Outfit {